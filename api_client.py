@@ -0,0 +1,431 @@
+"""
+Python client for the AI Code Generator API
+CodeGeneratorClient is the blocking client (requests) and
+AsyncCodeGeneratorClient the asyncio one (httpx, optional). Both keep
+pooled keep-alive connections, apply connect/read timeouts to every call
+and retry 429 and 503 responses with jittered exponential backoff. When the
+server sends Retry-After (admission control does), the client waits that
+long plus jitter instead.
+
+    with CodeGeneratorClient("http://localhost:3000/api") as client:
+        result = client.generate("Crie um contador em React")
+        for event, data in client.generate_stream("Crie uma API de tarefas", project_type='backend'):
+            ...
+        results = client.generate_many(["prompt 1", "prompt 2"], concurrency=4)
+
+request()/get()/post() return the raw response for any final status; the
+endpoint helpers raise APIError for error statuses.
+"""
+
+import asyncio
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = "http://localhost:3000/api"
+RETRY_STATUSES = frozenset({429, 503})
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+
+class APIError(Exception):
+    """An error status from the API, with its JSON error message when there is one"""
+
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """When and how long to wait before retrying a request
+
+    Statuses in `statuses` are retried for every method: the API rejects them
+    before doing any work. Connection errors are only retried for idempotent
+    methods, since a POST may already have started a generation.
+    """
+
+    def __init__(self, max_attempts=4, backoff_s=0.5, max_backoff_s=30.0, statuses=RETRY_STATUSES,
+                 max_retry_after_s=60.0):
+        self.max_attempts = max_attempts
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.statuses = statuses
+        self.max_retry_after_s = max_retry_after_s
+
+    def should_retry_status(self, attempt, status):
+        return attempt + 1 < self.max_attempts and status in self.statuses
+
+    def should_retry_error(self, attempt, method):
+        return attempt + 1 < self.max_attempts and method.upper() in IDEMPOTENT_METHODS
+
+    def delay(self, attempt, retry_after=None):
+        """Full-jitter backoff, or Retry-After plus up to 20% jitter so waiters do not return in lockstep"""
+        if retry_after is not None:
+            retry_after = min(retry_after, self.max_retry_after_s)
+            return retry_after + random.uniform(0, retry_after * 0.2 or self.backoff_s)
+        return random.uniform(0, min(self.max_backoff_s, self.backoff_s * 2 ** attempt))
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+
+class SSEParser:
+    """Incremental Server-Sent Events parser: feed() lines, get (event, data) back"""
+
+    def __init__(self):
+        self.event = 'message'
+        self.data = []
+
+    def feed(self, line):
+        """Consume one line; returns (event, data) when it completes an event, else None"""
+        if line == '':
+            return self.flush()
+        if line.startswith(':'):
+            return None
+        if line.startswith('event:'):
+            self.event = line[len('event:'):].strip()
+        elif line.startswith('data:'):
+            self.data.append(line[len('data:'):].lstrip(' '))
+        return None
+
+    def flush(self):
+        event, data = self.event, self.data
+        self.event, self.data = 'message', []
+        return (event, '\n'.join(data)) if data else None
+
+
+def parse_sse(lines):
+    """Yield (event, data) pairs from an iterator of Server-Sent Event lines"""
+    parser = SSEParser()
+    for line in lines:
+        event = parser.feed(line)
+        if event:
+            yield event
+    event = parser.flush()
+    if event:
+        yield event
+
+
+def generate_payload(message=None, project_type='component', conversation_id=None, template_id=None, cache=None,
+                     new_session=False):
+    """Request body for /generate and /generate/stream
+
+    The server keeps a session only for requests with a conversation_id, or
+    with new_session to start one (its id comes back as conversationId).
+    """
+    payload = {'projectType': project_type}
+    if message is not None:
+        payload['message'] = message
+    if conversation_id:
+        payload['conversationId'] = conversation_id
+    elif new_session:
+        payload['newSession'] = True
+    if template_id:
+        payload['templateId'] = template_id
+    if cache:
+        payload['cache'] = cache
+    return payload
+
+
+def error_from_response(status, text, headers):
+    try:
+        message = json.loads(text).get('error') or text
+    except (ValueError, AttributeError):
+        message = text
+    return APIError(status, message, parse_retry_after(headers.get('Retry-After')))
+
+
+class CodeGeneratorClient:
+    """Blocking client; safe to share between threads (one pooled session)"""
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, timeout=120.0, connect_timeout=5.0, retry=None, pool_size=32,
+                 session=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, timeout)
+        self.retry = retry or RetryPolicy()
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.stats = {'requests': 0, 'retries': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def url(self, path):
+        return path if path.startswith(('http://', 'https://')) else f"{self.base_url}{path}"
+
+    def request(self, method, path, retry=None, **kwargs):
+        """Send a request, retrying per the retry policy; returns the final response"""
+        retry = retry or self.retry
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            self.stats['requests'] += 1
+            try:
+                response = self.session.request(method, self.url(path), **kwargs)
+            except requests.ConnectionError:
+                if not retry.should_retry_error(attempt, method):
+                    raise
+                wait = retry.delay(attempt)
+            else:
+                if not retry.should_retry_status(attempt, response.status_code):
+                    return response
+                wait = retry.delay(attempt, parse_retry_after(response.headers.get('Retry-After')))
+                response.close()
+            self.stats['retries'] += 1
+            attempt += 1
+            time.sleep(wait)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def _json(self, response):
+        if response.status_code >= 400:
+            raise error_from_response(response.status_code, response.text, response.headers)
+        return response.json()
+
+    def health(self):
+        return self._json(self.get('/'))
+
+    def generate(self, message=None, project_type='component', conversation_id=None, template_id=None, cache=None,
+                 new_session=False):
+        """POST /generate; returns the result (success, explanation, code, files, model, ...)"""
+        payload = generate_payload(message, project_type, conversation_id, template_id, cache, new_session)
+        return self._json(self.post('/generate', json=payload))
+
+    def generate_stream(self, message=None, project_type='component', conversation_id=None, template_id=None,
+                        cache=None, new_session=False):
+        """POST /generate/stream; yields (event, data) with data decoded from JSON
+
+        Events: model, explanation, code_start, code, code_end, then done
+        (the full result) or error.
+        """
+        payload = generate_payload(message, project_type, conversation_id, template_id, cache, new_session)
+        with self.post('/generate/stream', json=payload, stream=True) as response:
+            if response.status_code != 200:
+                raise error_from_response(response.status_code, response.text, response.headers)
+            for event, data in parse_sse(response.iter_lines(decode_unicode=True)):
+                yield event, json.loads(data)
+
+    def generate_many(self, prompts, project_type='component', concurrency=8, cache=None):
+        """Generate many prompts concurrently; returns results in order, with APIError for failures
+
+        prompts are strings or dicts of generate() keyword arguments.
+        """
+        def one(prompt):
+            kwargs = prompt if isinstance(prompt, dict) else {'message': prompt}
+            try:
+                return self.generate(**{'project_type': project_type, 'cache': cache, **kwargs})
+            except APIError as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(one, prompts))
+
+    def batch(self, items, concurrency=None, cache=None):
+        """POST /generate/batch; yields each item result as it finishes, then the summary line"""
+        body = {'items': items, **({'concurrency': concurrency} if concurrency else {}), **({'cache': cache} if cache else {})}
+        with self.post('/generate/batch', json=body, stream=True) as response:
+            if response.status_code != 200:
+                raise error_from_response(response.status_code, response.text, response.headers)
+            for line in response.iter_lines(decode_unicode=True):
+                if line:
+                    yield json.loads(line)
+
+    def preview(self, code):
+        return self._json(self.post('/preview', json={'code': code}))
+
+    def conversations(self, limit=None, before=None, summary=False):
+        """One page of history; returns (conversations, next cursor or None)"""
+        params = {key: value for key, value in
+                  (('limit', limit), ('before', before), ('view', 'summary' if summary else None)) if value}
+        response = self.get('/conversations', params=params)
+        return self._json(response), response.headers.get('X-Next-Cursor')
+
+    def conversation(self, conversation_id):
+        return self._json(self.get(f"/conversations/{conversation_id}"))
+
+    def templates(self):
+        return self._json(self.get('/templates'))
+
+    def metrics(self):
+        response = self.get('/metrics')
+        if response.status_code >= 400:
+            raise error_from_response(response.status_code, response.text, response.headers)
+        return response.text
+
+
+class AsyncCodeGeneratorClient:
+    """asyncio client with the same interface, built on httpx (pip install httpx)"""
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, timeout=120.0, connect_timeout=5.0, retry=None, pool_size=32):
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError("AsyncCodeGeneratorClient needs httpx (pip install httpx)")
+        self.httpx = httpx
+        self.base_url = base_url.rstrip('/')
+        self.retry = retry or RetryPolicy()
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+        self.stats = {'requests': 0, 'retries': 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def url(self, path):
+        return path if path.startswith(('http://', 'https://')) else f"{self.base_url}{path}"
+
+    async def _send(self, method, path, retry=None, stream=False, **kwargs):
+        retry = retry or self.retry
+        attempt = 0
+        while True:
+            self.stats['requests'] += 1
+            request = self.client.build_request(method, self.url(path), **kwargs)
+            try:
+                response = await self.client.send(request, stream=stream)
+            except self.httpx.TransportError:
+                if not retry.should_retry_error(attempt, method):
+                    raise
+                wait = retry.delay(attempt)
+            else:
+                if not retry.should_retry_status(attempt, response.status_code):
+                    return response
+                wait = retry.delay(attempt, parse_retry_after(response.headers.get('Retry-After')))
+                await response.aclose()
+            self.stats['retries'] += 1
+            attempt += 1
+            await asyncio.sleep(wait)
+
+    async def request(self, method, path, retry=None, **kwargs):
+        """Send a request, retrying per the retry policy; returns the final response"""
+        return await self._send(method, path, retry=retry, **kwargs)
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    def _json(self, response):
+        if response.status_code >= 400:
+            raise error_from_response(response.status_code, response.text, response.headers)
+        return response.json()
+
+    async def _raise_stream_error(self, response):
+        await response.aread()
+        await response.aclose()
+        raise error_from_response(response.status_code, response.text, response.headers)
+
+    async def health(self):
+        return self._json(await self.get('/'))
+
+    async def generate(self, message=None, project_type='component', conversation_id=None, template_id=None,
+                       cache=None, new_session=False):
+        payload = generate_payload(message, project_type, conversation_id, template_id, cache, new_session)
+        return self._json(await self.post('/generate', json=payload))
+
+    async def generate_stream(self, message=None, project_type='component', conversation_id=None,
+                              template_id=None, cache=None, new_session=False):
+        """Async iterator of (event, data) from /generate/stream"""
+        payload = generate_payload(message, project_type, conversation_id, template_id, cache, new_session)
+        response = await self._send('POST', '/generate/stream', json=payload, stream=True)
+        if response.status_code != 200:
+            await self._raise_stream_error(response)
+        parser = SSEParser()
+        try:
+            async for line in response.aiter_lines():
+                event = parser.feed(line.rstrip('\r'))
+                if event:
+                    yield event[0], json.loads(event[1])
+            event = parser.flush()
+            if event:
+                yield event[0], json.loads(event[1])
+        finally:
+            await response.aclose()
+
+    async def generate_many(self, prompts, project_type='component', concurrency=8, cache=None):
+        """Generate many prompts with at most `concurrency` in flight; APIError in place of failures"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(prompt):
+            kwargs = prompt if isinstance(prompt, dict) else {'message': prompt}
+            async with semaphore:
+                try:
+                    return await self.generate(**{'project_type': project_type, 'cache': cache, **kwargs})
+                except APIError as e:
+                    return e
+
+        return await asyncio.gather(*(one(prompt) for prompt in prompts))
+
+    async def batch(self, items, concurrency=None, cache=None):
+        """Async iterator over /generate/batch item results, then the summary line"""
+        body = {'items': items, **({'concurrency': concurrency} if concurrency else {}), **({'cache': cache} if cache else {})}
+        response = await self._send('POST', '/generate/batch', json=body, stream=True)
+        if response.status_code != 200:
+            await self._raise_stream_error(response)
+        try:
+            async for line in response.aiter_lines():
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            await response.aclose()
+
+    async def preview(self, code):
+        return self._json(await self.post('/preview', json={'code': code}))
+
+    async def conversations(self, limit=None, before=None, summary=False):
+        params = {key: value for key, value in
+                  (('limit', limit), ('before', before), ('view', 'summary' if summary else None)) if value}
+        response = await self.get('/conversations', params=params)
+        return self._json(response), response.headers.get('X-Next-Cursor')
+
+    async def conversation(self, conversation_id):
+        return self._json(await self.get(f"/conversations/{conversation_id}"))
+
+    async def templates(self):
+        return self._json(await self.get('/templates'))
+
+    async def metrics(self):
+        response = await self.get('/metrics')
+        if response.status_code >= 400:
+            raise error_from_response(response.status_code, response.text, response.headers)
+        return response.text
@@ -1,28 +1,485 @@
-import { MongoClient } from 'mongodb'
+import { createHash } from 'crypto'
+import { gunzipSync, gzipSync } from 'zlib'
 import { v4 as uuidv4 } from 'uuid'
 import { NextResponse } from 'next/server'
 import OpenAI from 'openai'
 import { GoogleGenerativeAI } from '@google/generative-ai'
+import { CircuitBreaker } from '@/lib/circuit-breaker'
+import { LatencyTracker, ProviderTimeoutError, SCHEDULING_MODES, scheduleProviders } from '@/lib/provider-scheduler'
+import { LruCache, ResponseCache, generationCacheKey } from '@/lib/response-cache'
+import { FencedBlockParser, parseFencedBlocks } from '@/lib/code-parser'
+import { WriteBehindQueue, flushOnShutdown } from '@/lib/write-behind'
+import { buildContextWindow, estimateTokens, summarizeTurns } from '@/lib/context-window'
+import { Registry, RequestTiming, registerProcessMetrics } from '@/lib/metrics'
+import { SingleFlight, SingleFlightTimeoutError } from '@/lib/single-flight'
+import { AdmissionController, AdmissionRejectedError, ConcurrencyLimiter } from '@/lib/admission'
+import { TEMPLATES, findTemplate, templatePromptHash } from '@/lib/templates'
+import { createStorage } from '@/lib/storage'
+import { createRequestCapture } from '@/lib/request-capture'
 
-// MongoDB connection
-let client
-let db
+// Metrics served at /api/metrics (Prometheus text format). Gauges backed by
+// other components (cache, write-behind queues, breakers) are read at scrape time.
+const metrics = new Registry()
+registerProcessMetrics(metrics)
+const httpRequests = metrics.counter('http_requests_total', 'API requests by route, method and status')
+const httpDuration = metrics.histogram('http_request_duration_seconds', 'API request duration (until headers are sent) by route')
+const httpInFlight = metrics.gauge('http_requests_in_flight', 'API requests currently being handled by route')
+const routeSteps = metrics.histogram('route_step_duration_seconds', 'Time per request phase (the Server-Timing entries) by route and step')
+const providerDuration = metrics.histogram('provider_request_duration_seconds', 'LLM provider call duration by provider and outcome')
+const generationResults = metrics.counter('generation_results_total', 'Generations by what answered: a provider, the response cache or the template fallback')
+const storageDuration = metrics.histogram('storage_operation_duration_seconds', 'Storage operation duration by backend and operation')
+const admissionWait = metrics.histogram('admission_queue_wait_seconds', 'Time generations waited for an admission permit by priority')
+
+metrics.gauge('response_cache_entries', 'Entries in the in-process response cache', {
+  collect: () => responseCache ? [[{}, responseCache.memory.size]] : []
+})
+metrics.counter('response_cache_lookups_total', 'Response cache lookups by result', {
+  collect: () => responseCache ? [
+    [{ result: 'hit_memory' }, responseCache.stats.hits.memory],
+    [{ result: 'hit_shared' }, responseCache.stats.hits.shared],
+    [{ result: 'miss' }, responseCache.stats.misses]
+  ] : []
+})
+metrics.counter('single_flight_requests_total', 'Generations by single-flight role: leader (called the providers), coalesced, or timed out waiting', {
+  collect: () => singleFlight ? [
+    [{ role: 'leader' }, singleFlight.stats.leaders],
+    [{ role: 'coalesced' }, singleFlight.stats.coalesced],
+    [{ role: 'timeout' }, singleFlight.stats.timeouts]
+  ] : []
+})
+metrics.gauge('admission_permits', 'Generation admission: permits in use and requests waiting', {
+  collect: () => admission ? [[{ state: 'active' }, admission.active], [{ state: 'waiting' }, admission.queue.length]] : []
+})
+metrics.counter('admission_rejected_total', 'Generations rejected by admission control by reason', {
+  collect: () => admission ? Object.entries(admission.stats.rejected).map(([reason, count]) => [{ reason }, count]) : []
+})
+metrics.gauge('provider_active_requests', 'In-flight calls per provider (bounded by its concurrency limit)', {
+  collect: () => providers.map(provider => [{ provider: provider.name }, provider.limiter.active])
+})
+metrics.gauge('write_behind_buffered', 'Documents waiting in a write-behind queue (buffered and in flight)', {
+  collect: () => writeBehindQueues.map(queue => [{ queue: queue.name }, queue.pending().length])
+})
+metrics.counter('write_behind_documents_total', 'Write-behind documents by queue and outcome', {
+  collect: () => writeBehindQueues.flatMap(queue => [
+    [{ queue: queue.name, outcome: 'flushed' }, queue.stats.flushed],
+    [{ queue: queue.name, outcome: 'dropped' }, queue.stats.dropped]
+  ])
+})
+metrics.gauge('circuit_breaker_state', 'Provider circuit breaker state (1 for the current state)', {
+  collect: () => providers.flatMap(provider => ['closed', 'open', 'half-open'].map(state =>
+    [{ provider: provider.name, state }, provider.breaker.state === state ? 1 : 0]
+  ))
+})
 
-async function connectToMongo() {
-  if (!client) {
-    client = new MongoClient(process.env.MONGO_URL)
-    await client.connect()
-    db = client.db(process.env.DB_NAME)
+// Storage for conversations, previews, sessions, templates and the shared
+// cache tier: STORAGE_BACKEND=mongo (default) or memory. Mongo connects
+// lazily, on the first operation that needs it.
+const storage = createStorage(process.env, {
+  instrument: (operation, fn) => timedStorage(operation, fn)
+})
+
+// Time a storage operation into the histogram and, when given, the request's Server-Timing
+async function timedStorage(operation, fn, timing) {
+  const start = performance.now()
+  try {
+    return await fn()
+  } finally {
+    const ms = performance.now() - start
+    storageDuration.observe({ backend: storage.name, operation }, ms / 1000)
+    timing?.add('db', ms)
   }
-  return db
+}
+
+// Write-behind persistence: conversations, previews and session turns are
+// buffered and written in bulk off the request's critical path
+const writeBehindOptions = {
+  maxBatch: Number(process.env.WRITE_BEHIND_MAX_BATCH || 100),
+  flushIntervalMs: Number(process.env.WRITE_BEHIND_FLUSH_MS || 250),
+  maxBuffered: Number(process.env.WRITE_BEHIND_MAX_BUFFERED || 5000),
+}
+
+const conversationWrites = new WriteBehindQueue('conversations', {
+  ...writeBehindOptions,
+  flush: docs => timedStorage('insert_conversations', () => storage.insertConversations(docs))
+})
+
+// Preview ids recently written by this instance; those skip the upsert entirely.
+// The TTL also throttles how often a re-posted preview refreshes its lastUsedAt.
+const knownPreviews = new LruCache({ maxEntries: 1000 })
+const PREVIEW_KNOWN_TTL_MS = 3600000
+
+// Previews are content-addressed, so a flush upserts and duplicates collapse to one document.
+// Ids of a dropped batch were never stored, so the next POST writes them again.
+const previewWrites = new WriteBehindQueue('previews', {
+  ...writeBehindOptions,
+  flush: docs => timedStorage('upsert_previews', () => storage.upsertPreviews(docs)),
+  onDrop: docs => docs.forEach(doc => knownPreviews.delete(doc.id))
+})
+
+// Turns of server-side sessions (one document per user or assistant message)
+const sessionTurnWrites = new WriteBehindQueue('session_turns', {
+  ...writeBehindOptions,
+  flush: docs => timedStorage('insert_session_turns', () => storage.insertSessionTurns(docs))
+})
+
+// Sanitized JSONL traffic log for replay, off unless REQUEST_CAPTURE_PATH is set
+const requestCapture = createRequestCapture(process.env, writeBehindOptions)
+
+const writeBehindQueues = [conversationWrites, previewWrites, sessionTurnWrites, ...(requestCapture ? [requestCapture] : [])]
+
+// Register once per process (the module can be re-evaluated in development)
+if (!globalThis.__writeBehindShutdownHook) {
+  globalThis.__writeBehindShutdownHook = true
+  flushOnShutdown(writeBehindQueues)
 }
 
 // Initialize AI services
+// *_BASE_URL overrides point the providers at a local stub (see stub_provider_server.py).
+// SDK-level retries are disabled: the provider fallback chain is the retry mechanism.
+const providerMaxRetries = Number(process.env.PROVIDER_MAX_RETRIES || 0)
+
 const openai = new OpenAI({
   apiKey: process.env.OPENAI_API_KEY,
+  baseURL: process.env.OPENAI_BASE_URL,
+  maxRetries: providerMaxRetries,
 })
 
 const genAI = new GoogleGenerativeAI(process.env.GEMINI_API_KEY)
+const geminiRequestOptions = process.env.GEMINI_BASE_URL ? { baseUrl: process.env.GEMINI_BASE_URL } : {}
+
+// DeepSeek via its OpenAI-compatible API
+const deepseekOpenAI = new OpenAI({
+  apiKey: process.env.DEEPSEEK_API_KEY,
+  baseURL: process.env.DEEPSEEK_BASE_URL || 'https://api.deepseek.com',
+  maxRetries: providerMaxRetries,
+})
+
+// Provider scheduling: PROVIDER_SCHEDULING=sequential|hedged|race
+const providerScheduling = {
+  mode: SCHEDULING_MODES.includes(process.env.PROVIDER_SCHEDULING) ? process.env.PROVIDER_SCHEDULING : 'sequential',
+  timeoutMs: Number(process.env.PROVIDER_TIMEOUT_MS || 60000),
+  // Start the next provider once the current one exceeds its observed p95 latency
+  hedgeDelay: (provider) => {
+    if (process.env.HEDGE_DELAY_MS) return Number(process.env.HEDGE_DELAY_MS)
+    const p95 = provider.latency.percentile(95)
+    const minDelay = Number(process.env.HEDGE_MIN_DELAY_MS || 500)
+    const maxDelay = Number(process.env.HEDGE_MAX_DELAY_MS || 15000)
+    return p95 === null ? maxDelay : Math.min(Math.max(p95, minDelay), maxDelay)
+  }
+}
+
+const breakerOptions = {
+  windowSize: Number(process.env.BREAKER_WINDOW_SIZE || 20),
+  minRequests: Number(process.env.BREAKER_MIN_REQUESTS || 5),
+  errorThreshold: Number(process.env.BREAKER_ERROR_THRESHOLD || 0.5),
+  openMs: Number(process.env.BREAKER_OPEN_MS || 30000),
+}
+
+function chatCompletionParams(model, { systemPrompt, contextMessages, fullPrompt }) {
+  return {
+    model,
+    messages: [
+      {
+        role: "system",
+        content: systemPrompt
+      },
+      ...contextMessages,
+      {
+        role: "user",
+        content: fullPrompt
+      }
+    ],
+    temperature: 0.7,
+    max_tokens: 3000,
+  }
+}
+
+async function callChatCompletion(client, model, request, signal) {
+  const completion = await client.chat.completions.create(chatCompletionParams(model, request), { signal })
+  return completion.choices[0].message.content
+}
+
+async function callGemini({ systemPrompt, fullPrompt }, signal) {
+  const model = genAI.getGenerativeModel({ model: "gemini-pro" }, geminiRequestOptions)
+  const result = await model.generateContent(`${systemPrompt}\n\n${fullPrompt}`, { signal })
+  return result.response.text()
+}
+
+// Streaming variants: yield text chunks as the provider produces them
+async function* streamChatCompletion(client, model, request, signal) {
+  const stream = await client.chat.completions.create({ ...chatCompletionParams(model, request), stream: true }, { signal })
+  for await (const chunk of stream) {
+    const text = chunk.choices[0]?.delta?.content
+    if (text) yield text
+  }
+}
+
+async function* streamGemini({ systemPrompt, fullPrompt }, signal) {
+  const model = genAI.getGenerativeModel({ model: "gemini-pro" }, geminiRequestOptions)
+  const result = await model.generateContentStream(`${systemPrompt}\n\n${fullPrompt}`, { signal })
+  for await (const chunk of result.stream) {
+    const text = chunk.text()
+    if (text) yield text
+  }
+}
+
+// Providers in fallback order, each with its own circuit breaker and latency window
+const providers = [
+  {
+    name: 'openai',
+    label: 'OpenAI GPT-4',
+    call: (request, signal) => callChatCompletion(openai, "gpt-4-turbo-preview", request, signal),
+    stream: (request, signal) => streamChatCompletion(openai, "gpt-4-turbo-preview", request, signal)
+  },
+  {
+    name: 'gemini',
+    label: 'Google Gemini',
+    call: callGemini,
+    stream: streamGemini
+  },
+  {
+    name: 'deepseek',
+    label: 'DeepSeek',
+    call: (request, signal) => callChatCompletion(deepseekOpenAI, "deepseek-chat", request, signal),
+    stream: (request, signal) => streamChatCompletion(deepseekOpenAI, "deepseek-chat", request, signal)
+  }
+].map(provider => ({
+  ...provider,
+  breaker: new CircuitBreaker(provider.name, breakerOptions),
+  latency: new LatencyTracker(),
+  // OPENAI_MAX_CONCURRENCY etc. override PROVIDER_MAX_CONCURRENCY for one provider
+  limiter: new ConcurrencyLimiter(Number(
+    process.env[`${provider.name.toUpperCase()}_MAX_CONCURRENCY`] || process.env.PROVIDER_MAX_CONCURRENCY || 8
+  ))
+}))
+
+// Admission control in front of the provider calls; ADMISSION=off disables it.
+// Cache hits and coalesced requests never need a permit.
+const admission = process.env.ADMISSION === 'off' ? null : new AdmissionController({
+  maxConcurrent: Number(process.env.GENERATE_MAX_CONCURRENCY || 8),
+  maxQueue: Number(process.env.GENERATE_MAX_QUEUE || 32),
+  queueTimeoutMs: Number(process.env.GENERATE_QUEUE_TIMEOUT_MS || 10000),
+})
+
+// Lower runs first: short component requests ahead of full applications
+const PROJECT_PRIORITIES = { component: 0, frontend: 1, backend: 1, fullstack: 2 }
+
+async function admit(projectType, timing) {
+  if (!admission) return { release: () => {} }
+  const priority = PROJECT_PRIORITIES[projectType] ?? 1
+  const permit = await admission.acquire(priority)
+  admissionWait.observe({ priority }, permit.queuedMs / 1000)
+  timing.add('queue', permit.queuedMs)
+  return permit
+}
+
+async function generateAdmitted(prompt, projectType, contextMessages, timing) {
+  const permit = await admit(projectType, timing)
+  try {
+    return await generateCode(prompt, projectType, contextMessages, timing)
+  } finally {
+    permit.release()
+  }
+}
+
+// Run one provider attempt, recording its duration and how it ended
+async function observeProviderCall(provider, signal, call) {
+  const start = performance.now()
+  let outcome = 'success'
+  try {
+    return await call()
+  } catch (error) {
+    if (!signal.aborted) outcome = 'error'
+    else outcome = signal.reason instanceof ProviderTimeoutError ? 'timeout' : 'cancelled'
+    throw error
+  } finally {
+    providerDuration.observe({ provider: provider.name, outcome }, (performance.now() - start) / 1000)
+  }
+}
+
+// Response cache for /generate (in-process LRU backed by storage); RESPONSE_CACHE=off disables it
+const responseCache = process.env.RESPONSE_CACHE === 'off' ? null : new ResponseCache({
+  maxEntries: Number(process.env.RESPONSE_CACHE_MAX_ENTRIES || 500),
+  ttlMs: Number(process.env.RESPONSE_CACHE_TTL_SECONDS || 3600) * 1000,
+  store: {
+    get: (key, now) => timedStorage('cache_get', () => storage.getCachedResponse(key, now)),
+    set: entry => timedStorage('cache_put', () => storage.putCachedResponse(entry))
+  }
+})
+const responseCacheMaxTtlMs = Number(process.env.RESPONSE_CACHE_MAX_TTL_SECONDS || 86400) * 1000
+
+// cacheOptions (request body "cache"): { noCache, noStore, maxAge, ttl } with ages in seconds
+async function lookupCachedResult(key, cacheOptions) {
+  if (!responseCache || cacheOptions.noCache) return null
+  const maxAgeMs = cacheOptions.maxAge !== undefined ? Number(cacheOptions.maxAge) * 1000 : undefined
+  return responseCache.get(key, { maxAgeMs })
+}
+
+function storeCachedResult(key, result, cacheOptions) {
+  // Template fallbacks mean every provider failed; never serve those from cache
+  if (!responseCache || cacheOptions.noStore || result.model === 'Template Interno') return
+  const ttlMs = cacheOptions.ttl !== undefined ?
+    Math.min(Number(cacheOptions.ttl) * 1000, responseCacheMaxTtlMs) :
+    responseCache.ttlMs
+  // Written in the background so the response does not wait on storage
+  responseCache.set(key, result, ttlMs)
+}
+
+// Concurrent identical generations share one provider call; SINGLE_FLIGHT=off disables it.
+// Requests that joined a call in flight give up after SINGLE_FLIGHT_WAIT_MS.
+const singleFlight = process.env.SINGLE_FLIGHT === 'off' ? null : new SingleFlight({
+  waitTimeoutMs: Number(process.env.SINGLE_FLIGHT_WAIT_MS || 120000)
+})
+
+function missStatus(cacheOptions) {
+  if (!responseCache) return 'DISABLED'
+  return cacheOptions.noCache ? 'BYPASS' : 'MISS'
+}
+
+// Generate through the response cache
+async function generateCodeCached(prompt, projectType, contextMessages, cacheOptions = {}, timing = new RequestTiming()) {
+  const key = generationCacheKey(prompt, projectType, contextMessages)
+  const cached = await timing.measure('cache', () => lookupCachedResult(key, cacheOptions))
+  if (cached) {
+    generationResults.inc({ source: 'cache' })
+    return { result: { ...cached.value, cached: true }, cacheStatus: `HIT-${cached.tier}` }
+  }
+
+  // noCache asks for a fresh answer, so it never joins a call already in flight
+  if (!singleFlight || cacheOptions.noCache) {
+    const result = await generateAdmitted(prompt, projectType, contextMessages, timing)
+    storeCachedResult(key, result, cacheOptions)
+    return { result: { ...result, cached: false }, cacheStatus: missStatus(cacheOptions) }
+  }
+
+  const waitStart = performance.now()
+  const { value: result, shared } = await singleFlight.run(key, async () => {
+    const result = await generateAdmitted(prompt, projectType, contextMessages, timing)
+    storeCachedResult(key, result, cacheOptions)
+    return result
+  })
+  if (shared) {
+    timing.add('coalesced', performance.now() - waitStart)
+    return { result: { ...result, cached: false }, cacheStatus: 'COALESCED' }
+  }
+  return { result: { ...result, cached: false }, cacheStatus: missStatus(cacheOptions) }
+}
+
+// Streams from the first provider that answers. Falls back to the next provider
+// only while nothing has been sent; a failure mid-stream is rethrown.
+async function streamFromProviders(request, onText, signal) {
+  for (const provider of providers) {
+    if (signal.aborted) throw signal.reason
+    if (!provider.limiter.tryAcquire()) continue
+    if (!provider.breaker.allowRequest()) {
+      provider.limiter.release()
+      continue
+    }
+
+    const controller = new AbortController()
+    const abort = () => controller.abort(signal.reason)
+    signal.addEventListener('abort', abort, { once: true })
+    const timer = setTimeout(
+      () => controller.abort(new ProviderTimeoutError(provider.name, providerScheduling.timeoutMs)),
+      providerScheduling.timeoutMs
+    )
+
+    let response = ''
+    try {
+      await observeProviderCall(provider, controller.signal, async () => {
+        for await (const text of provider.stream(request, controller.signal)) {
+          response += text
+          onText(text, provider)
+        }
+      })
+      provider.breaker.recordSuccess()
+      return { provider, response }
+    } catch (error) {
+      if (signal.aborted) {
+        provider.breaker.releaseProbe()
+        throw error
+      }
+      provider.breaker.recordFailure()
+      if (response) throw error
+      console.log(`${provider.name} failed, trying next provider...`, error.message)
+    } finally {
+      clearTimeout(timer)
+      signal.removeEventListener('abort', abort)
+      provider.limiter.release()
+    }
+  }
+  return null
+}
+
+// Forward parser events as SSE events: explanation / code_start / code / code_end
+function sendParserEvents(send, events) {
+  for (const event of events) {
+    if (event.type === 'text') send('explanation', { text: event.text })
+    else if (event.type === 'block_start') {
+      send('code_start', { index: event.index, language: event.language, filename: event.filename })
+    } else if (event.type === 'code') {
+      send('code', { index: event.index, text: event.text })
+    } else if (event.type === 'block_end') {
+      send('code_end', { index: event.index, language: event.language, filename: event.filename })
+    }
+  }
+}
+
+// Emit a complete result (cache hit or template fallback) as a stream
+function sendResultEvents(send, result) {
+  send('model', { model: result.model })
+  send('explanation', { text: result.explanation })
+  // Results cached before `files` existed only have the joined code
+  const files = result.files || [{ filename: '', language: '', content: result.code }]
+  files.forEach((file, index) => {
+    send('code_start', { index, language: file.language, filename: file.filename })
+    send('code', { index, text: file.content })
+    send('code_end', { index, language: file.language, filename: file.filename })
+  })
+}
+
+// Streaming counterpart of generateCodeCached(). send(event, data) emits one SSE event;
+// the caller sends the final "done" event with the returned result.
+async function generateCodeStream(prompt, projectType, contextMessages, cacheOptions, send, signal) {
+  const key = generationCacheKey(prompt, projectType, contextMessages)
+  const cached = await lookupCachedResult(key, cacheOptions)
+  if (cached) {
+    generationResults.inc({ source: 'cache' })
+    const result = { ...cached.value, cached: true }
+    sendResultEvents(send, result)
+    return result
+  }
+
+  const parser = new FencedBlockParser()
+  let currentProvider = null
+  const streamed = await streamFromProviders(
+    buildProviderRequest(prompt, projectType, contextMessages),
+    (text, provider) => {
+      if (provider !== currentProvider) {
+        currentProvider = provider
+        send('model', { model: provider.label })
+      }
+      sendParserEvents(send, parser.push(text))
+    },
+    signal
+  )
+
+  let result
+  if (streamed) {
+    sendParserEvents(send, parser.end())
+    generationResults.inc({ source: streamed.provider.name })
+    // The parser has already seen the whole response; reuse its blocks
+    result = buildResult(streamed.response, streamed.provider, parser.result())
+    storeCachedResult(key, result, cacheOptions)
+  } else {
+    console.log('All AI providers failed, using fallback response...')
+    generationResults.inc({ source: 'template' })
+    result = fallbackResult(prompt, projectType)
+    sendResultEvents(send, result)
+  }
+
+  return { ...result, cached: false }
+}
 
 // Helper function to handle CORS
 function handleCORS(response) {
@@ -30,6 +487,8 @@ function handleCORS(response) {
   response.headers.set('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
   response.headers.set('Access-Control-Allow-Headers', 'Content-Type, Authorization')
   response.headers.set('Access-Control-Allow-Credentials', 'true')
+  response.headers.set('Access-Control-Expose-Headers', 'X-Next-Cursor, X-Cache, Server-Timing, Retry-After')
+  response.headers.set('Timing-Allow-Origin', '*')
   return response
 }
 
@@ -38,8 +497,9 @@ export async function OPTIONS() {
   return handleCORS(new NextResponse(null, { status: 200 }))
 }
 
-// AI Code Generation Service with fallback
-async function generateCode(prompt, projectType, conversationHistory = []) {
+// Build the provider-agnostic request: system prompt, context and user prompt.
+// contextMessages are chat messages ({ role, content }) from buildContextWindow().
+function buildProviderRequest(prompt, projectType, contextMessages = []) {
   const systemPrompts = {
     component: `Você é um desenvolvedor React especialista. Gere componentes React limpos e modernos usando:
 - Componentes funcionais com hooks
@@ -80,134 +540,65 @@ Foque na experiência do usuário e apelo visual.`,
 Forneça código backend completo e pronto para produção.`
   }
 
-  const contextMessages = conversationHistory.map(msg => ({
-    role: msg.type === 'user' ? 'user' : 'assistant',
-    content: msg.content
-  }))
-
   const fullPrompt = `${prompt}\n\nPor favor, forneça:\n1. Uma breve explicação do que você está construindo\n2. Código completo e funcional\n3. Instruções de configuração, se necessário\n\nResponda em português.`
 
-  // Try OpenAI first
+  return {
+    systemPrompt: systemPrompts[projectType] || systemPrompts.component,
+    contextMessages,
+    fullPrompt
+  }
+}
+
+// AI Code Generation Service with fallback
+async function generateCode(prompt, projectType, contextMessages = [], timing = new RequestTiming()) {
+  const request = buildProviderRequest(prompt, projectType, contextMessages)
+
   try {
-    const completion = await openai.chat.completions.create({
-      model: "gpt-4-turbo-preview",
-      messages: [
-        {
-          role: "system",
-          content: systemPrompts[projectType] || systemPrompts.component
-        },
-        ...contextMessages,
-        {
-          role: "user",
-          content: fullPrompt
-        }
-      ],
-      temperature: 0.7,
-      max_tokens: 3000,
-    })
+    const { provider, value: response } = await timing.measure('provider', () => scheduleProviders(
+      providers,
+      (provider, signal) => observeProviderCall(provider, signal, () => provider.call(request, signal)),
+      providerScheduling
+    ))
+    generationResults.inc({ source: provider.name })
+    return timing.measureSync('extract', () => buildResult(response, provider))
+  } catch (providersError) {
+    console.log('All AI providers failed, using fallback response...', providersError.message)
+    generationResults.inc({ source: 'template' })
+    return fallbackResult(prompt, projectType)
+  }
+}
 
-    const response = completion.choices[0].message.content
-    
-    // Extract code blocks from the response
-    const codeBlocks = response.match(/```[\s\S]*?```/g) || []
-    const code = codeBlocks.length > 0 ? 
-      codeBlocks.map(block => block.replace(/```[\w]*\n?/, '').replace(/\n?```$/, '')).join('\n\n') : 
-      ''
-    
-    // Extract explanation (text before first code block)
-    const explanation = response.split('```')[0].trim()
-
-    return {
-      success: true,
-      explanation: explanation || response,
-      code: code || response,
-      model: 'OpenAI GPT-4'
-    }
-  } catch (openaiError) {
-    console.log('OpenAI failed, trying Gemini...', openaiError.message)
-    
-    // Fallback to Gemini
-    try {
-      const model = genAI.getGenerativeModel({ model: "gemini-pro" })
-      
-      const systemContext = systemPrompts[projectType] || systemPrompts.component
-      const fullContextPrompt = `${systemContext}\n\n${fullPrompt}`
-      
-      const result = await model.generateContent(fullContextPrompt)
-      const response = result.response.text()
-      
-      // Extract code blocks from the response
-      const codeBlocks = response.match(/```[\s\S]*?```/g) || []
-      const code = codeBlocks.length > 0 ? 
-        codeBlocks.map(block => block.replace(/```[\w]*\n?/, '').replace(/\n?```$/, '')).join('\n\n') : 
-        ''
-      
-      // Extract explanation (text before first code block)
-      const explanation = response.split('```')[0].trim()
-
-      return {
-        success: true,
-        explanation: explanation || response,
-        code: code || response,
-        model: 'Google Gemini'
-      }
-    } catch (geminiError) {
-      console.log('Gemini failed, trying DeepSeek...', geminiError.message)
-      
-      // Fallback to DeepSeek (via OpenAI-compatible API)
-      try {
-        const deepseekOpenAI = new OpenAI({
-          apiKey: process.env.DEEPSEEK_API_KEY,
-          baseURL: 'https://api.deepseek.com'
-        })
-
-        const completion = await deepseekOpenAI.chat.completions.create({
-          model: "deepseek-chat",
-          messages: [
-            {
-              role: "system",
-              content: systemPrompts[projectType] || systemPrompts.component
-            },
-            ...contextMessages,
-            {
-              role: "user",
-              content: fullPrompt
-            }
-          ],
-          temperature: 0.7,
-          max_tokens: 3000,
-        })
-
-        const response = completion.choices[0].message.content
-        
-        // Extract code blocks from the response
-        const codeBlocks = response.match(/```[\s\S]*?```/g) || []
-        const code = codeBlocks.length > 0 ? 
-          codeBlocks.map(block => block.replace(/```[\w]*\n?/, '').replace(/\n?```$/, '')).join('\n\n') : 
-          ''
-        
-        // Extract explanation (text before first code block)
-        const explanation = response.split('```')[0].trim()
+// `files` holds each fenced block of the response with its inferred filename and
+// byte offsets; `code` is the legacy field with every block joined together
+function buildResult(response, provider, parsed = parseFencedBlocks(response)) {
+  const files = parsed.blocks.map(({ filename, language, content, start, end }) => ({ filename, language, content, start, end }))
+  const code = files.map(file => file.content).join('\n\n')
 
-        return {
-          success: true,
-          explanation: explanation || response,
-          code: code || response,
-          model: 'DeepSeek'
-        }
-      } catch (deepseekError) {
-        console.log('DeepSeek failed, using fallback response...', deepseekError.message)
-        
-        // Final fallback - generate a basic template
-        const fallbackCode = generateFallbackCode(projectType, prompt)
-        return {
-          success: true,
-          explanation: `Gerei um código básico baseado no seu pedido: "${prompt}". Este é um template inicial que você pode customizar.`,
-          code: fallbackCode,
-          model: 'Template Interno'
-        }
-      }
-    }
+  return {
+    success: true,
+    explanation: parsed.explanation || response,
+    code: code || response,
+    files,
+    model: provider.label
+  }
+}
+
+const FALLBACK_FILES = {
+  component: { filename: 'Component.jsx', language: 'jsx' },
+  frontend: { filename: 'App.jsx', language: 'jsx' },
+  backend: { filename: 'server.js', language: 'javascript' },
+  fullstack: { filename: 'app.js', language: 'javascript' }
+}
+
+// Final fallback - generate a basic template
+function fallbackResult(prompt, projectType) {
+  const fallbackCode = generateFallbackCode(projectType, prompt)
+  return {
+    success: true,
+    explanation: `Gerei um código básico baseado no seu pedido: "${prompt}". Este é um template inicial que você pode customizar.`,
+    code: fallbackCode,
+    files: [{ ...(FALLBACK_FILES[projectType] || FALLBACK_FILES.component), content: fallbackCode, start: null, end: null }],
+    model: 'Template Interno'
   }
 }
 
@@ -437,14 +828,368 @@ app.listen(3001, () => console.log('API rodando na porta 3001'))
   return templates[projectType] || templates.component
 }
 
-// Route handler function
+// Server-side sessions: the client sends a conversationId, the turns live in
+// Mongo and the provider context is rebuilt from them within a token budget
+const contextOptions = {
+  budget: Number(process.env.CONTEXT_TOKEN_BUDGET || 2000),
+  summaryMaxTokens: Number(process.env.CONTEXT_SUMMARY_MAX_TOKENS || 300),
+  // Only the newest turns are read; older ones are covered by the summary
+  loadTurns: Number(process.env.SESSION_LOAD_TURNS || 40),
+}
+
+async function loadSession(sessionId, timing) {
+  const { session, turns: stored } = await timedStorage(
+    'session_load',
+    () => storage.loadSession(sessionId, { limit: contextOptions.loadTurns }),
+    timing
+  )
+
+  // Include turns that are still waiting in the write-behind buffer
+  const storedIds = new Set(stored.map(turn => turn.id))
+  const pending = sessionTurnWrites.pending().filter(turn => turn.sessionId === sessionId && !storedIds.has(turn.id))
+  const summarizedThrough = session?.summarizedThrough
+  const turns = [...stored, ...pending]
+    .filter(turn => !summarizedThrough || turn.timestamp > summarizedThrough)
+    .sort((a, b) => a.timestamp - b.timestamp)
+    .slice(-contextOptions.loadTurns)
+
+  return { id: sessionId, summary: session?.summary || '', updatedAt: session?.updatedAt, turns }
+}
+
+// Resolve the request's context window. Requests with a conversationId, or
+// with newSession: true to start one, use a server-side session; a legacy
+// conversationHistory array is still accepted and trimmed to the same budget.
+// Anything else is stateless and writes no session turns.
+async function prepareContext(body, timing) {
+  if (!body.conversationId && Array.isArray(body.conversationHistory)) {
+    const turns = body.conversationHistory.map(msg => ({
+      role: msg.type === 'user' ? 'user' : 'assistant',
+      content: String(msg.content || '')
+    }))
+    return { session: null, ...buildContextWindow(turns, contextOptions) }
+  }
+
+  if (!body.conversationId && body.newSession !== true) {
+    return { session: null, ...buildContextWindow([], contextOptions) }
+  }
+
+  const session = body.conversationId ?
+    await loadSession(body.conversationId, timing) :
+    { id: uuidv4(), summary: '', turns: [] }
+  return { session, ...buildContextWindow(session.turns, { ...contextOptions, summary: session.summary }) }
+}
+
+// Token counts for the response: context window plus the full provider prompt
+function contextUsage(prompt, projectType, context) {
+  const { systemPrompt, fullPrompt } = buildProviderRequest(prompt, projectType)
+  return {
+    ...context.usage,
+    promptTokens: estimateTokens(systemPrompt) + context.usage.contextTokens + estimateTokens(fullPrompt)
+  }
+}
+
+// The assistant turn keeps the generated code so follow-up requests can refer to it
+function assistantTurnContent(result) {
+  if (!result.code || result.code === result.explanation) return result.explanation
+  return `${result.explanation}\n\n\`\`\`\n${result.code}\n\`\`\``
+}
+
+// Fold turns that fell out of the window into the session's cached summary
+function updateSessionSummary(session, dropped) {
+  if (dropped.length === 0) return
+  const summarizedThrough = dropped[dropped.length - 1].timestamp
+  const summary = summarizeTurns(session.summary, dropped, { maxTokens: contextOptions.summaryMaxTokens })
+  // Written in the background; a concurrent request that summarized further wins
+  timedStorage('session_summary', () => storage.updateSessionSummary(session.id, summary, summarizedThrough)).catch(error => {
+    console.error('Erro ao atualizar resumo da sessão:', error)
+  })
+}
+
+// Sessions expire by updatedAt (RETENTION_SESSIONS_DAYS), which only a summary
+// update moves; refresh it, at most daily, while the session is still in use
+const SESSION_TOUCH_MS = 86400000
+
+function touchSession(session, dropped) {
+  if (!session.updatedAt || dropped.length > 0 || Date.now() - session.updatedAt < SESSION_TOUCH_MS) return
+  timedStorage('session_touch', () => storage.touchSession(session.id, new Date())).catch(error => {
+    console.error('Erro ao atualizar sessão:', error)
+  })
+}
+
+async function recordSessionTurns(context, message, result, startedAt) {
+  const { session } = context
+  if (!session) return
+  try {
+    await sessionTurnWrites.enqueue({ id: uuidv4(), sessionId: session.id, role: 'user', content: message, timestamp: startedAt })
+    await sessionTurnWrites.enqueue({ id: uuidv4(), sessionId: session.id, role: 'assistant', content: assistantTurnContent(result), timestamp: new Date() })
+    updateSessionSummary(session, context.dropped)
+    touchSession(session, context.dropped)
+  } catch (dbError) {
+    console.error('Erro ao salvar turnos da sessão:', dbError)
+  }
+}
+
+// Precomputed template generations: generated once (on first use, or at
+// startup with TEMPLATE_PREWARM=on), persisted in storage and kept in memory.
+// Entries older than TEMPLATE_REFRESH_SECONDS are served while a background
+// refresh replaces them.
+const TEMPLATE_REFRESH_MS = Number(process.env.TEMPLATE_REFRESH_SECONDS || 86400) * 1000
+const templateGenerations = new Map()
+const templateRefreshes = new Map()
+
+// Public template list, serialized once; the ETag changes only when the list does
+const templatesBody = JSON.stringify(TEMPLATES.map(({ prompt, ...template }) => template))
+const templatesEtag = `"${createHash('sha256').update(templatesBody).digest('hex').slice(0, 32)}"`
+
+async function loadTemplateGeneration(template, timing) {
+  const promptHash = templatePromptHash(template)
+  const memory = templateGenerations.get(template.id)
+  if (memory && memory.promptHash === promptHash) return memory
+
+  const stored = await timedStorage('template_get', () => storage.getTemplateGeneration(template.id, promptHash), timing)
+  if (!stored) return null
+  const entry = { promptHash, result: stored.result, generatedAt: stored.generatedAt.getTime() }
+  templateGenerations.set(template.id, entry)
+  return entry
+}
+
+// One refresh per template at a time; concurrent first uses share it
+function refreshTemplate(template) {
+  if (!templateRefreshes.has(template.id)) {
+    const refresh = (async () => {
+      const result = await generateAdmitted(template.prompt, template.type, [], new RequestTiming())
+      // A template fallback means every provider failed; keep what we had
+      if (result.model !== 'Template Interno') {
+        const entry = { promptHash: templatePromptHash(template), result, generatedAt: Date.now() }
+        templateGenerations.set(template.id, entry)
+        await timedStorage('template_put', () => storage.putTemplateGeneration({
+          templateId: template.id,
+          promptHash: entry.promptHash,
+          result,
+          generatedAt: new Date(entry.generatedAt)
+        }))
+      }
+      return result
+    })().finally(() => templateRefreshes.delete(template.id))
+    templateRefreshes.set(template.id, refresh)
+  }
+  return templateRefreshes.get(template.id)
+}
+
+async function templateGeneration(template, timing) {
+  const entry = await loadTemplateGeneration(template, timing)
+  if (!entry) {
+    const result = await timing.measure('template_generate', () => refreshTemplate(template))
+    return { result: { ...result, cached: false }, cacheStatus: 'TEMPLATE-MISS' }
+  }
+
+  const stale = Date.now() - entry.generatedAt >= TEMPLATE_REFRESH_MS
+  if (stale) {
+    refreshTemplate(template).catch(error => {
+      console.error(`Erro ao atualizar template ${template.id}:`, error)
+    })
+  }
+  return { result: { ...entry.result, cached: true }, cacheStatus: stale ? 'TEMPLATE-STALE' : 'TEMPLATE' }
+}
+
+// Generate the templates that have no stored generation yet, one at a time
+async function prewarmTemplates() {
+  try {
+    for (const template of TEMPLATES) {
+      if (!await loadTemplateGeneration(template)) await refreshTemplate(template)
+    }
+  } catch (error) {
+    console.error('Erro ao pré-gerar templates:', error)
+  }
+}
+
+if (process.env.TEMPLATE_PREWARM === 'on' && !globalThis.__templatePrewarm) {
+  globalThis.__templatePrewarm = prewarmTemplates()
+}
+
+function conversationDocument(body, result, sessionId) {
+  return {
+    id: uuidv4(),
+    message: body.message,
+    projectType: body.projectType || 'component',
+    ...(sessionId && { sessionId }),
+    result: result,
+    timestamp: new Date()
+  }
+}
+
+// Save conversation to database (write-behind; waits only when the buffer is full)
+async function saveConversation(body, result, sessionId) {
+  try {
+    await conversationWrites.enqueue(conversationDocument(body, result, sessionId))
+  } catch (dbError) {
+    console.error('Erro ao salvar no banco:', dbError)
+    // Continue even if DB save fails
+  }
+}
+
+// Batch generation: items fan out with bounded parallelism and each result is
+// emitted as soon as it finishes; the conversations are written in one bulk insert
+const BATCH_MAX_ITEMS = Number(process.env.BATCH_MAX_ITEMS || 50)
+const BATCH_CONCURRENCY = Number(process.env.BATCH_CONCURRENCY || 4)
+const BATCH_MAX_CONCURRENCY = Number(process.env.BATCH_MAX_CONCURRENCY || 16)
+
+function validateBatch(body) {
+  if (!Array.isArray(body.items) || body.items.length === 0) return "Lista de itens é obrigatória"
+  if (body.items.length > BATCH_MAX_ITEMS) return `No máximo ${BATCH_MAX_ITEMS} itens por lote`
+  if (body.items.some(item => !item || typeof item.message !== 'string' || !item.message)) {
+    return "Todo item precisa de uma mensagem"
+  }
+  return null
+}
+
+// Runs the batch, calling emit(line) once per finished item. Stops starting
+// new items once signal is aborted. Returns the conversations to persist.
+async function runBatch(items, { concurrency, cacheOptions, emit, signal }) {
+  const conversations = []
+  let next = 0
+
+  const worker = async () => {
+    while (next < items.length && !signal.aborted) {
+      const index = next++
+      const item = items[index]
+      const projectType = item.projectType || 'component'
+      const startedAt = performance.now()
+      try {
+        const { result, cacheStatus } = await generateCodeCached(item.message, projectType, [], cacheOptions)
+        conversations.push(conversationDocument({ message: item.message, projectType }, result))
+        emit({ index, ...result, cacheStatus, durationMs: Math.round(performance.now() - startedAt) })
+      } catch (error) {
+        const status = error instanceof AdmissionRejectedError ? error.status :
+          error instanceof SingleFlightTimeoutError ? 504 : 500
+        if (status === 500) console.error('Erro em item do lote:', error)
+        emit({ index, success: false, status, error: 'Falha na geração de código', ...(error.retryAfterS && { retryAfter: error.retryAfterS }) })
+      }
+    }
+  }
+
+  await Promise.all(Array.from({ length: Math.min(concurrency, items.length) }, worker))
+  return conversations
+}
+
+// Strip Mongo's _id from a document before returning it
+function withoutMongoId({ _id, ...rest }) {
+  return rest
+}
+
+// Keyset pagination over conversations, newest first, ordered by (timestamp, id)
+const CONVERSATIONS_PAGE_SIZE = 50
+const CONVERSATIONS_MAX_PAGE_SIZE = 200
+
+function compareConversations(a, b) {
+  return (b.timestamp - a.timestamp) || (a.id < b.id ? 1 : a.id > b.id ? -1 : 0)
+}
+
+function encodeConversationCursor(conversation) {
+  return Buffer.from(JSON.stringify({ t: conversation.timestamp.toISOString(), id: conversation.id })).toString('base64url')
+}
+
+function decodeConversationCursor(cursor) {
+  try {
+    const { t, id } = JSON.parse(Buffer.from(cursor, 'base64url').toString('utf8'))
+    const timestamp = new Date(t)
+    if (Number.isNaN(timestamp.getTime()) || typeof id !== 'string') return null
+    return { timestamp, id }
+  } catch {
+    return null
+  }
+}
+
+// Summary view: enough to render a history list without the generated code
+function summarizeConversation(conversation) {
+  return {
+    id: conversation.id,
+    message: conversation.message.length > 120 ? `${conversation.message.slice(0, 120)}…` : conversation.message,
+    projectType: conversation.projectType,
+    model: conversation.result?.model,
+    timestamp: conversation.timestamp
+  }
+}
+
+async function listConversations({ limit, before, summary }, timing) {
+  const stored = await timedStorage('conversations_list', () => storage.listConversations({ limit, before, summary }), timing)
+
+  // Include conversations that are still waiting in the write-behind buffer
+  const storedIds = new Set(stored.map(conversation => conversation.id))
+  const pending = conversationWrites.pending().filter(conversation =>
+    !storedIds.has(conversation.id) && (!before || compareConversations(before, conversation) < 0)
+  )
+
+  const page = [...pending.map(withoutMongoId), ...stored]
+    .sort(compareConversations)
+    .slice(0, limit)
+
+  return {
+    items: summary ? page.map(summarizeConversation) : page,
+    nextCursor: page.length === limit ? encodeConversationCursor(page[page.length - 1]) : null
+  }
+}
+
+// Route label for metrics; ids are collapsed and unknown paths grouped to bound cardinality
+const METRIC_ROUTES = new Set(['/', '/generate', '/generate/stream', '/generate/batch', '/preview', '/conversations', '/cache/stats', '/metrics', '/templates'])
+
+function routeLabel(path) {
+  if (path.length === 2 && (path[0] === 'preview' || path[0] === 'conversations')) return `/${path[0]}/:id`
+  const route = `/${path.join('/')}`
+  return METRIC_ROUTES.has(route) ? route : 'other'
+}
+
+// Route handler function: records request metrics and the Server-Timing header.
+// For streamed responses the duration ends when the headers are sent.
 async function handleRoute(request, { params }) {
   const { path = [] } = params
+  const label = routeLabel(path)
+  const timing = new RequestTiming()
+  const arrivedAt = Date.now()
+  // Read from a copy so the handler can still consume the body
+  const captureBody = requestCapture && label !== '/metrics' && request.method === 'POST' ?
+    request.clone().text().catch(() => '') :
+    null
+
+  httpInFlight.inc({ route: label })
+  let response
+  try {
+    response = await dispatchRoute(request, path, timing)
+  } finally {
+    httpInFlight.dec({ route: label })
+  }
+
+  httpRequests.inc({ route: label, method: request.method, status: response.status })
+  httpDuration.observe({ route: label }, timing.elapsed() / 1000)
+  for (const [step, ms] of timing.phases) routeSteps.observe({ route: label, step }, ms / 1000)
+  response.headers.set('Server-Timing', timing.header())
+
+  if (requestCapture && label !== '/metrics') {
+    requestCapture.record({
+      arrivedAt,
+      route: label,
+      method: request.method,
+      status: response.status,
+      durationMs: timing.elapsed(),
+      bodyText: captureBody ? await captureBody : '',
+      searchParams: new URL(request.url).searchParams
+    })
+  }
+  return response
+}
+
+async function dispatchRoute(request, path, timing) {
   const route = `/${path.join('/')}`
   const method = request.method
 
   try {
-    const db = await connectToMongo()
+    // Routes touch storage only when they need it, so the health check,
+    // metrics and templates keep answering while the database is down
+    if (route === '/metrics' && method === 'GET') {
+      return new NextResponse(metrics.render(), {
+        headers: { 'Content-Type': 'text/plain; version=0.0.4; charset=utf-8', 'Cache-Control': 'no-store' }
+      })
+    }
 
     // Root endpoint
     if (route === '/' && method === 'GET') {
@@ -452,14 +1197,72 @@ async function handleRoute(request, { params }) {
         message: "API do Gerador de Código IA",
         status: "funcionando",
         services: ["OpenAI GPT-4", "Google Gemini", "DeepSeek", "MongoDB"],
-        currentModel: "Sistema Multi-IA"
+        currentModel: "Sistema Multi-IA",
+        storage: storage.name
       }))
     }
 
     // Generate code endpoint
+    // templateId: answer with the template's stored generation (message and projectType are ignored)
     if (route === '/generate' && method === 'POST') {
       const body = await request.json()
+      const template = body.templateId !== undefined ? findTemplate(body.templateId) : null
+
+      if (body.templateId !== undefined && !template) {
+        return handleCORS(NextResponse.json(
+          { error: "Template não encontrado" }, 
+          { status: 404 }
+        ))
+      }
       
+      if (!body.message && !template) {
+        return handleCORS(NextResponse.json(
+          { error: "Mensagem é obrigatória" }, 
+          { status: 400 }
+        ))
+      }
+
+      if (body.conversationId !== undefined && typeof body.conversationId !== 'string') {
+        return handleCORS(NextResponse.json(
+          { error: "conversationId inválido" }, 
+          { status: 400 }
+        ))
+      }
+
+      const startedAt = new Date()
+      const message = template ? template.prompt : body.message
+      const projectType = template ? template.type : (body.projectType || 'component')
+      const context = await timing.measure('context', () => prepareContext(body, timing))
+      const { result, cacheStatus } = template ?
+        await templateGeneration(template, timing) :
+        await generateCodeCached(
+          message, 
+          projectType,
+          context.messages,
+          body.cache || {},
+          timing
+        )
+
+      await timing.measure('save', async () => {
+        await saveConversation({ ...body, message, projectType }, result, context.session?.id)
+        await recordSessionTurns(context, message, result, startedAt)
+      })
+
+      const response = NextResponse.json({
+        ...result,
+        ...(template && { templateId: template.id }),
+        ...(context.session && { conversationId: context.session.id }),
+        usage: contextUsage(message, projectType, context)
+      })
+      response.headers.set('X-Cache', cacheStatus)
+      return handleCORS(response)
+    }
+
+    // Streaming code generation endpoint (Server-Sent Events)
+    // Events: model, explanation, code_start, code, code_end, done, error
+    if (route === '/generate/stream' && method === 'POST') {
+      const body = await request.json()
+
       if (!body.message) {
         return handleCORS(NextResponse.json(
           { error: "Mensagem é obrigatória" }, 
@@ -467,28 +1270,142 @@ async function handleRoute(request, { params }) {
         ))
       }
 
-      const result = await generateCode(
-        body.message, 
-        body.projectType || 'component',
-        body.conversationHistory || []
-      )
+      if (body.conversationId !== undefined && typeof body.conversationId !== 'string') {
+        return handleCORS(NextResponse.json(
+          { error: "conversationId inválido" }, 
+          { status: 400 }
+        ))
+      }
 
-      // Save conversation to database
-      try {
-        const conversation = {
-          id: uuidv4(),
-          message: body.message,
-          projectType: body.projectType || 'component',
-          result: result,
-          timestamp: new Date()
+      const startedAt = new Date()
+      const projectType = body.projectType || 'component'
+      const context = await timing.measure('context', () => prepareContext(body, timing))
+      // Taken before the response starts so a saturated server can still answer 429/503;
+      // held for the whole stream, cache hits included
+      const permit = await admit(projectType, timing)
+      const encoder = new TextEncoder()
+      const abortController = new AbortController()
+
+      const stream = new ReadableStream({
+        async start(controller) {
+          // Once the client has gone (cancel) the controller throws on enqueue and close
+          let closed = false
+          const send = (event, data) => {
+            if (closed || abortController.signal.aborted) return
+            controller.enqueue(encoder.encode(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`))
+          }
+          const close = () => {
+            if (closed || abortController.signal.aborted) return
+            closed = true
+            controller.close()
+          }
+
+          let result
+          try {
+            result = await generateCodeStream(
+              body.message,
+              projectType,
+              context.messages,
+              body.cache || {},
+              send,
+              abortController.signal
+            )
+            send('done', {
+              ...result,
+              ...(context.session && { conversationId: context.session.id }),
+              usage: contextUsage(body.message, projectType, context)
+            })
+            close()
+            // Saved even if the client left after the generation finished
+            await saveConversation(body, result, context.session?.id)
+            await recordSessionTurns(context, body.message, result, startedAt)
+          } catch (error) {
+            // A generation cut short by the client leaving is not an error
+            if (abortController.signal.aborted && result === undefined) return
+            console.error('Erro no streaming de geração:', error)
+            send('error', { error: 'Falha na geração de código' })
+            close()
+          } finally {
+            permit.release()
+          }
+        },
+        cancel() {
+          // Client went away: stop the upstream provider call
+          abortController.abort()
+          permit.release()
+        }
+      })
+
+      return handleCORS(new NextResponse(stream, {
+        headers: {
+          'Content-Type': 'text/event-stream; charset=utf-8',
+          'Cache-Control': 'no-cache, no-transform',
+          'Connection': 'keep-alive',
+          'X-Accel-Buffering': 'no'
         }
-        await db.collection('conversations').insertOne(conversation)
-      } catch (dbError) {
-        console.error('Erro ao salvar no banco:', dbError)
-        // Continue even if DB save fails
+      }))
+    }
+
+    // Batch generation endpoint (NDJSON: one line per item as it finishes, then a summary line)
+    // Body: { items: [{ message, projectType }], concurrency?, cache? }
+    if (route === '/generate/batch' && method === 'POST') {
+      const body = await request.json()
+      const invalid = validateBatch(body)
+      if (invalid) {
+        return handleCORS(NextResponse.json(
+          { error: invalid }, 
+          { status: 400 }
+        ))
       }
 
-      return handleCORS(NextResponse.json(result))
+      const concurrency = Math.min(Math.max(parseInt(body.concurrency, 10) || BATCH_CONCURRENCY, 1), BATCH_MAX_CONCURRENCY)
+      const encoder = new TextEncoder()
+      const abortController = new AbortController()
+      const batchStart = performance.now()
+
+      const stream = new ReadableStream({
+        async start(controller) {
+          const emit = (line) => {
+            if (!abortController.signal.aborted) controller.enqueue(encoder.encode(`${JSON.stringify(line)}\n`))
+          }
+
+          const conversations = await runBatch(body.items, {
+            concurrency,
+            cacheOptions: body.cache || {},
+            emit,
+            signal: abortController.signal
+          })
+
+          let saved = true
+          try {
+            await timedStorage('insert_conversations', () => storage.insertConversations(conversations))
+          } catch (dbError) {
+            saved = false
+            console.error('Erro ao salvar lote no banco:', dbError)
+          }
+
+          emit({
+            done: true,
+            count: body.items.length,
+            completed: conversations.length,
+            saved,
+            elapsedMs: Math.round(performance.now() - batchStart)
+          })
+          if (!abortController.signal.aborted) controller.close()
+        },
+        cancel() {
+          // Client went away: finish the items in flight but start no new ones
+          abortController.abort()
+        }
+      })
+
+      return handleCORS(new NextResponse(stream, {
+        headers: {
+          'Content-Type': 'application/x-ndjson; charset=utf-8',
+          'Cache-Control': 'no-cache, no-transform',
+          'X-Accel-Buffering': 'no'
+        }
+      }))
     }
 
     // Preview generation endpoint
@@ -504,18 +1421,25 @@ async function handleRoute(request, { params }) {
 
       // For now, return a simple preview URL
       // In a full implementation, you'd create a sandboxed preview environment
-      const previewId = uuidv4()
+      // The id is the SHA-256 of the code, so identical code maps to one stored preview
+      const previewId = createHash('sha256').update(body.code).digest('hex')
       
       try {
-        await db.collection('previews').insertOne({
-          id: previewId,
-          code: body.code,
-          timestamp: new Date()
-        })
+        if (!knownPreviews.get(previewId)) {
+          await previewWrites.enqueue({
+            id: previewId,
+            encoding: 'gzip',
+            body: gzipSync(body.code),
+            size: Buffer.byteLength(body.code),
+            timestamp: new Date(),
+            lastUsedAt: new Date()
+          })
+          knownPreviews.set(previewId, true, PREVIEW_KNOWN_TTL_MS)
+        }
         
         return handleCORS(NextResponse.json({
           success: true,
-          previewUrl: `/preview/${previewId}`,
+          previewUrl: `/api/preview/${previewId}`,
           previewId: previewId
         }))
       } catch (error) {
@@ -526,60 +1450,115 @@ async function handleRoute(request, { params }) {
       }
     }
 
+    // Serve a preview's code (read-your-writes: still-buffered previews are served from memory).
+    // Content never changes for an id, so responses are immutable and revalidate by ETag.
+    if (path[0] === 'preview' && path.length === 2 && method === 'GET') {
+      const previewId = path[1]
+      const etag = `"${previewId}"`
+      const cacheHeaders = {
+        'ETag': etag,
+        'Cache-Control': 'public, max-age=31536000, immutable',
+        'Vary': 'Accept-Encoding'
+      }
+
+      if (request.headers.get('if-none-match') === etag) {
+        return handleCORS(new NextResponse(null, { status: 304, headers: cacheHeaders }))
+      }
+
+      const preview = previewWrites.find(doc => doc.id === previewId) ||
+        await timedStorage('preview_get', () => storage.getPreview(previewId), timing)
+
+      if (!preview) {
+        return handleCORS(NextResponse.json(
+          { error: "Preview não encontrado" }, 
+          { status: 404 }
+        ))
+      }
+
+      const headers = { ...cacheHeaders, 'Content-Type': 'text/plain; charset=utf-8' }
+
+      // Previews stored before content addressing keep their code uncompressed
+      if (preview.encoding !== 'gzip') {
+        return handleCORS(new NextResponse(preview.code, { headers }))
+      }
+
+      // Pass the stored gzip body straight through when the client accepts it
+      const compressed = Buffer.isBuffer(preview.body) ? preview.body : Buffer.from(preview.body.buffer)
+      if (/\bgzip\b/.test(request.headers.get('accept-encoding') || '')) {
+        return handleCORS(new NextResponse(compressed, {
+          headers: { ...headers, 'Content-Encoding': 'gzip', 'Content-Length': String(compressed.length) }
+        }))
+      }
+      return handleCORS(new NextResponse(gunzipSync(compressed), { headers }))
+    }
+
     // Get conversations history
+    // ?limit=N (max 200), ?before=<cursor from X-Next-Cursor>, ?view=summary
     if (route === '/conversations' && method === 'GET') {
-      const conversations = await db.collection('conversations')
-        .find({})
-        .sort({ timestamp: -1 })
-        .limit(50)
-        .toArray()
+      const { searchParams } = new URL(request.url)
+      const limit = Math.min(
+        Math.max(parseInt(searchParams.get('limit'), 10) || CONVERSATIONS_PAGE_SIZE, 1),
+        CONVERSATIONS_MAX_PAGE_SIZE
+      )
 
-      const cleanedConversations = conversations.map(({ _id, ...rest }) => rest)
-      
-      return handleCORS(NextResponse.json(cleanedConversations))
+      let before = null
+      if (searchParams.get('before')) {
+        before = decodeConversationCursor(searchParams.get('before'))
+        if (!before) {
+          return handleCORS(NextResponse.json(
+            { error: "Cursor inválido" }, 
+            { status: 400 }
+          ))
+        }
+      }
+
+      const { items, nextCursor } = await listConversations({
+        limit,
+        before,
+        summary: searchParams.get('view') === 'summary'
+      }, timing)
+
+      const response = NextResponse.json(items)
+      if (nextCursor) response.headers.set('X-Next-Cursor', nextCursor)
+      return handleCORS(response)
     }
 
-    // Templates endpoint
-    if (route === '/templates' && method === 'GET') {
-      const templates = [
-        {
-          id: 'todo-app',
-          name: 'Aplicação de Tarefas',
-          description: 'Um app completo de tarefas com operações CRUD',
-          type: 'fullstack',
-          tags: ['React', 'Node.js', 'MongoDB']
-        },
-        {
-          id: 'dashboard',
-          name: 'Dashboard de Analytics',
-          description: 'Dashboard com gráficos e visualização de dados',
-          type: 'frontend',
-          tags: ['React', 'Gráficos', 'Tailwind']
-        },
-        {
-          id: 'landing-page',
-          name: 'Landing Page SaaS',
-          description: 'Landing page moderna com seção hero e recursos',
-          type: 'frontend',
-          tags: ['React', 'Tailwind', 'Responsivo']
-        },
-        {
-          id: 'chat-app',
-          name: 'Chat em Tempo Real',
-          description: 'Aplicação de chat com mensagens em tempo real',
-          type: 'fullstack',
-          tags: ['React', 'Socket.io', 'MongoDB']
-        },
-        {
-          id: 'blog-platform',
-          name: 'Plataforma de Blog',
-          description: 'Blog com suporte a markdown e CMS',
-          type: 'fullstack',
-          tags: ['React', 'Markdown', 'CMS']
-        }
-      ]
+    // Get a single conversation with its full result
+    if (path[0] === 'conversations' && path.length === 2 && method === 'GET') {
+      const conversationId = path[1]
+      const pending = conversationWrites.find(conversation => conversation.id === conversationId)
+      const conversation = pending ? withoutMongoId(pending) :
+        await timedStorage('conversation_get', () => storage.getConversation(conversationId), timing)
+
+      if (!conversation) {
+        return handleCORS(NextResponse.json(
+          { error: "Conversa não encontrada" }, 
+          { status: 404 }
+        ))
+      }
 
-      return handleCORS(NextResponse.json(templates))
+      return handleCORS(NextResponse.json(conversation))
+    }
+
+    // Response cache counters
+    if (route === '/cache/stats' && method === 'GET') {
+      return handleCORS(NextResponse.json(
+        responseCache ? responseCache.snapshot() : { enabled: false }
+      ))
+    }
+
+    // Templates endpoint: static list, revalidated by ETag
+    if (route === '/templates' && method === 'GET') {
+      const headers = {
+        'ETag': templatesEtag,
+        'Cache-Control': 'public, max-age=300, stale-while-revalidate=86400'
+      }
+      if (request.headers.get('if-none-match') === templatesEtag) {
+        return handleCORS(new NextResponse(null, { status: 304, headers }))
+      }
+      return handleCORS(new NextResponse(templatesBody, {
+        headers: { ...headers, 'Content-Type': 'application/json; charset=utf-8' }
+      }))
     }
 
     // Route not found
@@ -589,6 +1568,20 @@ async function handleRoute(request, { params }) {
     ))
 
   } catch (error) {
+    if (error instanceof AdmissionRejectedError) {
+      const response = NextResponse.json(
+        { error: "Servidor sobrecarregado, tente novamente em instantes", reason: error.reason }, 
+        { status: error.status }
+      )
+      response.headers.set('Retry-After', String(error.retryAfterS))
+      return handleCORS(response)
+    }
+    if (error instanceof SingleFlightTimeoutError) {
+      return handleCORS(NextResponse.json(
+        { error: "Tempo de espera pela geração esgotado" }, 
+        { status: 504 }
+      ))
+    }
     console.error('Erro na API:', error)
     return handleCORS(NextResponse.json(
       { error: "Erro interno do servidor" }, 
@@ -1,6 +1,7 @@
 'use client'
 
 import { useState, useEffect, useRef } from 'react'
+import dynamic from 'next/dynamic'
 import { Button } from '@/components/ui/button'
 import { Input } from '@/components/ui/input'
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card'
@@ -29,7 +30,67 @@ import {
   Settings,
   RefreshCw
 } from 'lucide-react'
-import Editor from '@monaco-editor/react'
+
+// The code editor (Monaco) and the preview pane are only needed once there is
+// code to show, so they are kept out of the initial bundle and loaded on demand
+const loadCodeEditor = () => import('@/components/code-editor')
+const CodeEditor = dynamic(loadCodeEditor, {
+  ssr: false,
+  loading: () => <PanelLoading label="Carregando editor..." />
+})
+const PreviewPane = dynamic(() => import('@/components/preview-pane'), {
+  ssr: false,
+  loading: () => <PanelLoading label="Carregando preview..." />
+})
+
+function PanelLoading({ label }) {
+  return (
+    <div className="h-full flex items-center justify-center gap-2 text-muted-foreground">
+      <div className="animate-spin w-4 h-4 border-2 border-primary border-t-transparent rounded-full"></div>
+      <span className="text-sm">{label}</span>
+    </div>
+  )
+}
+
+// Read the Server-Sent Events of /api/generate/stream, calling handlers as they arrive.
+// Resolves with the final result carried by the "done" event.
+async function readGenerationStream(response, handlers) {
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  let result = null
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    let boundary
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary)
+      buffer = buffer.slice(boundary + 2)
+
+      let event = 'message'
+      let data = ''
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim()
+        else if (line.startsWith('data:')) data += line.slice(5).trim()
+      }
+      if (!data) continue
+
+      const payload = JSON.parse(data)
+      if (event === 'model') handlers.onModel?.(payload.model)
+      else if (event === 'explanation') handlers.onExplanation?.(payload.text)
+      else if (event === 'code_start') handlers.onCodeStart?.(payload.index)
+      else if (event === 'code') handlers.onCode?.(payload.text)
+      else if (event === 'done') result = payload
+      else if (event === 'error') throw new Error(payload.error)
+    }
+  }
+
+  if (!result) throw new Error('Geração interrompida')
+  return result
+}
 
 export default function App() {
   const [messages, setMessages] = useState([])
@@ -40,6 +101,8 @@ export default function App() {
   const [projectType, setProjectType] = useState('component')
   const [previewUrl, setPreviewUrl] = useState('')
   const [currentModel, setCurrentModel] = useState('Carregando...')
+  // Server-side session; the server keeps the turns and builds the context
+  const [conversationId, setConversationId] = useState(null)
   const messagesEndRef = useRef(null)
 
   const scrollToBottom = () => {
@@ -80,9 +143,13 @@ export default function App() {
     setMessages(prev => [...prev, userMessage])
     setInputValue('')
     setIsGenerating(true)
+    // Fetch the editor chunk while the model is still thinking
+    loadCodeEditor()
+
+    const assistantId = Date.now() + 1
 
     try {
-      const response = await fetch('/api/generate', {
+      const response = await fetch('/api/generate/stream', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -90,22 +157,54 @@ export default function App() {
         body: JSON.stringify({
           message: inputValue,
           projectType: projectType,
-          conversationHistory: messages.slice(-5) // Últimas 5 mensagens para contexto
+          ...(conversationId ? { conversationId } : { newSession: true })
         }),
       })
 
-      const data = await response.json()
+      if (!response.ok || !response.body) {
+        const errorData = await response.json().catch(() => ({}))
+        throw new Error(errorData.error || 'Falha ao gerar código')
+      }
+
+      // Show the explanation and code as they stream in
+      setMessages(prev => [...prev, {
+        id: assistantId,
+        type: 'assistant',
+        content: '',
+        streaming: true,
+        timestamp: new Date()
+      }])
+
+      let seenCode = false
+      const data = await readGenerationStream(response, {
+        onModel: (model) => setCurrentModel(model),
+        onExplanation: (text) => {
+          if (seenCode) return
+          setMessages(prev => prev.map(m => m.id === assistantId ? { ...m, content: m.content + text } : m))
+        },
+        onCodeStart: (index) => {
+          seenCode = true
+          if (index === 0) {
+            setGeneratedCode('')
+            setActiveTab('code')
+          } else {
+            setGeneratedCode(prev => prev + '\n\n')
+          }
+        },
+        onCode: (text) => setGeneratedCode(prev => prev + text)
+      })
+
+      if (data.conversationId) {
+        setConversationId(data.conversationId)
+      }
 
       if (data.success) {
-        const aiMessage = {
-          id: Date.now() + 1,
-          type: 'assistant',
+        setMessages(prev => prev.map(m => m.id === assistantId ? {
+          ...m,
           content: data.explanation,
           code: data.code,
-          timestamp: new Date()
-        }
-
-        setMessages(prev => [...prev, aiMessage])
+          streaming: false
+        } : m))
         setGeneratedCode(data.code)
         setActiveTab('code')
         
@@ -128,7 +227,8 @@ export default function App() {
         content: `Erro: ${error.message}`,
         timestamp: new Date()
       }
-      setMessages(prev => [...prev, errorMessage])
+      // Drop the partial streamed message, if any
+      setMessages(prev => [...prev.filter(m => m.id !== assistantId), errorMessage])
     } finally {
       setIsGenerating(false)
     }
@@ -286,7 +386,7 @@ export default function App() {
                         </div>
                       </div>
                     ))}
-                    {isGenerating && (
+                    {isGenerating && !messages.some(m => m.streaming) && (
                       <div className="flex gap-3">
                         <Avatar className="w-8 h-8">
                           <AvatarFallback>
@@ -355,7 +455,7 @@ export default function App() {
                     <MessageCircle className="w-3 h-3" />
                     Chat
                   </TabsTrigger>
-                  <TabsTrigger value="code" className="gap-1">
+                  <TabsTrigger value="code" className="gap-1" onMouseEnter={loadCodeEditor} onFocus={loadCodeEditor}>
                     <FileCode className="w-3 h-3" />
                     Código
                   </TabsTrigger>
@@ -379,43 +479,12 @@ export default function App() {
 
                 <TabsContent value="code" className="flex-1 m-0">
                   <div className="h-full">
-                    <Editor
-                      height="100%"
-                      defaultLanguage="javascript"
-                      value={generatedCode || '// O código gerado aparecerá aqui...'}
-                      onChange={(value) => setGeneratedCode(value)}
-                      theme="vs-dark"
-                      options={{
-                        minimap: { enabled: false },
-                        fontSize: 14,
-                        lineHeight: 1.5,
-                        padding: { top: 16, bottom: 16 },
-                        scrollBeyondLastLine: false,
-                        automaticLayout: true,
-                        wordWrap: 'on'
-                      }}
-                    />
+                    <CodeEditor value={generatedCode} onChange={(value) => setGeneratedCode(value)} />
                   </div>
                 </TabsContent>
 
                 <TabsContent value="preview" className="flex-1 m-0 p-4">
-                  <div className="h-full bg-muted rounded-lg flex items-center justify-center">
-                    {previewUrl ? (
-                      <iframe 
-                        src={previewUrl} 
-                        className="w-full h-full rounded-lg border"
-                        title="Preview do Código"
-                      />
-                    ) : (
-                      <div className="text-center">
-                        <Globe className="w-16 h-16 mx-auto mb-4 text-muted-foreground" />
-                        <h3 className="text-lg font-medium mb-2">Preview em Tempo Real</h3>
-                        <p className="text-muted-foreground">
-                          Gere código para ver o preview em tempo real
-                        </p>
-                      </div>
-                    )}
-                  </div>
+                  <PreviewPane previewUrl={previewUrl} />
                 </TabsContent>
               </Tabs>
             </CardContent>
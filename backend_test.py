@@ -4,20 +4,186 @@ Comprehensive Backend API Tests for AI Code Generator
 Tests all endpoints: health check, code generation, preview, conversations, templates
 """
 
+import argparse
+import csv
+import gzip
+import hashlib
+import random
+import threading
+import uuid
 import requests
 import json
 import time
 import os
-from datetime import datetime
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from api_client import CodeGeneratorClient, RetryPolicy, parse_sse
+from env_config import env_value
 
 # Get base URL from environment - using local URL since external has routing issues
 BASE_URL = "http://localhost:3000/api"
 
-class AICodeGeneratorAPITester:
+# Prompts shared by the functional tests and the load generator
+GENERATE_TEST_CASES = [
+    {
+        'name': 'Component Generation',
+        'payload': {
+            'message': 'Create a simple todo component with add, delete, and toggle functionality',
+            'projectType': 'component'
+        }
+    },
+    {
+        'name': 'Frontend Dashboard',
+        'payload': {
+            'message': 'Build a dashboard with charts and user analytics',
+            'projectType': 'frontend'
+        }
+    },
+    {
+        'name': 'Backend API',
+        'payload': {
+            'message': 'Create a REST API for user management',
+            'projectType': 'backend'
+        }
+    },
+    {
+        'name': 'Fullstack App',
+        'payload': {
+            'message': 'Build a complete blog application',
+            'projectType': 'fullstack'
+        }
+    }
+]
+
+PREVIEW_TEST_CODE = """
+import React, { useState } from 'react';
+
+function TodoApp() {
+  const [todos, setTodos] = useState([]);
+  const [input, setInput] = useState('');
+
+  const addTodo = () => {
+    if (input.trim()) {
+      setTodos([...todos, { id: Date.now(), text: input, completed: false }]);
+      setInput('');
+    }
+  };
+
+  return (
+    <div className="p-4">
+      <h1 className="text-2xl font-bold mb-4">Todo App</h1>
+      <div className="mb-4">
+        <input
+          type="text"
+          value={input}
+          onChange={(e) => setInput(e.target.value)}
+          className="border p-2 mr-2"
+          placeholder="Add a todo..."
+        />
+        <button onClick={addTodo} className="bg-blue-500 text-white p-2 rounded">
+          Add Todo
+        </button>
+      </div>
+      <ul>
+        {todos.map(todo => (
+          <li key={todo.id} className="mb-2">
+            {todo.text}
+          </li>
+        ))}
+      </ul>
+    </div>
+  );
+}
+
+export default TodoApp;
+        """
+
+# Routes exercised by the load generator: name -> (method, path, default weight)
+LOAD_ROUTES = {
+    'health': ('GET', '', 2),
+    'generate': ('POST', '/generate', 3),
+    'preview': ('POST', '/preview', 2),
+    'conversations': ('GET', '/conversations', 2),
+    'templates': ('GET', '/templates', 1),
+}
+
+
+# Response-size (bytes) and p95 latency (ms) budgets for the history endpoints
+CONVERSATION_BUDGETS = {
+    'summary_first_page': {'max_bytes': 16 * 1024, 'p95_ms': 150},
+    'summary_deep_page': {'max_bytes': 16 * 1024, 'p95_ms': 150},
+    'full_first_page': {'max_bytes': 512 * 1024, 'p95_ms': 300},
+    'by_id': {'max_bytes': 16 * 1024, 'p95_ms': 100},
+}
+
+
+def percentile(values, pct):
+    """Return the pct-th percentile of values using linear interpolation"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def parse_server_timing(header):
+    """Parse a Server-Timing header into {name: duration in ms}"""
+    timings = {}
+    for entry in (header or '').split(','):
+        name, *params = [part.strip() for part in entry.split(';')]
+        for param in params:
+            if param.startswith('dur='):
+                try:
+                    timings[name] = float(param[4:])
+                except ValueError:
+                    pass
+    return timings
+
+
+class InitialAssetParser(HTMLParser):
+    """Collect the scripts and stylesheets a page loads up front"""
+
     def __init__(self):
-        self.base_url = BASE_URL
+        super().__init__()
+        self.scripts = []
+        self.stylesheets = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'script' and attrs.get('src') and 'nomodule' not in attrs:
+            self.scripts.append(attrs['src'])
+        elif tag == 'link' and attrs.get('rel') == 'stylesheet' and attrs.get('href'):
+            self.stylesheets.append(attrs['href'])
+
+
+def parse_mix(spec):
+    """Parse a 'route=weight,route=weight' mix specification"""
+    if not spec:
+        return {name: weight for name, (_, _, weight) in LOAD_ROUTES.items()}
+
+    mix = {}
+    for item in spec.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in LOAD_ROUTES:
+            raise ValueError(f"Unknown route '{name}', expected one of {', '.join(LOAD_ROUTES)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+class AICodeGeneratorAPITester:
+    def __init__(self, base_url=BASE_URL, request_timeout=120, retries=0):
+        self.base_url = base_url
+        self.request_timeout = request_timeout
         self.test_results = []
-        self.session = requests.Session()
+        # Every request goes through the same client the services use. Retries
+        # are off by default so the tests and load reports see raw 429/503s.
+        self.client = CodeGeneratorClient(base_url, timeout=request_timeout, retry=RetryPolicy(max_attempts=retries + 1))
         
     def log_test(self, test_name, success, message, details=None):
         """Log test results"""
@@ -39,7 +205,7 @@ class AICodeGeneratorAPITester:
         """Test GET /api/ - Basic health check"""
         print("🔍 Testing Health Check Endpoint (GET /api)")
         try:
-            response = self.session.get(f"{self.base_url}")
+            response = self.client.get("")
             
             if response.status_code == 200:
                 data = response.json()
@@ -90,45 +256,13 @@ class AICodeGeneratorAPITester:
         """Test POST /api/generate - Main code generation endpoint"""
         print("🔍 Testing Code Generation Endpoint (POST /api/generate)")
         
-        # Test cases for different project types and prompts
-        test_cases = [
-            {
-                'name': 'Component Generation',
-                'payload': {
-                    'message': 'Create a simple todo component with add, delete, and toggle functionality',
-                    'projectType': 'component'
-                }
-            },
-            {
-                'name': 'Frontend Dashboard',
-                'payload': {
-                    'message': 'Build a dashboard with charts and user analytics',
-                    'projectType': 'frontend'
-                }
-            },
-            {
-                'name': 'Backend API',
-                'payload': {
-                    'message': 'Create a REST API for user management',
-                    'projectType': 'backend'
-                }
-            },
-            {
-                'name': 'Fullstack App',
-                'payload': {
-                    'message': 'Build a complete blog application',
-                    'projectType': 'fullstack'
-                }
-            }
-        ]
-        
         success_count = 0
         
-        for test_case in test_cases:
+        for test_case in GENERATE_TEST_CASES:
             try:
                 print(f"  Testing: {test_case['name']}")
-                response = self.session.post(
-                    f"{self.base_url}/generate",
+                response = self.client.post(
+                    "/generate",
                     json=test_case['payload'],
                     headers={'Content-Type': 'application/json'}
                 )
@@ -147,6 +281,7 @@ class AICodeGeneratorAPITester:
                                     'project_type': test_case['payload']['projectType'],
                                     'has_explanation': bool(data['explanation']),
                                     'has_code': bool(data['code']),
+                                    'files': [file['filename'] for file in data.get('files', [])],
                                     'model': data.get('model', 'unknown')
                                 }
                             )
@@ -187,8 +322,8 @@ class AICodeGeneratorAPITester:
         # Test error handling - missing message
         try:
             print("  Testing: Error Handling - Missing Message")
-            response = self.session.post(
-                f"{self.base_url}/generate",
+            response = self.client.post(
+                "/generate",
                 json={'projectType': 'component'},
                 headers={'Content-Type': 'application/json'}
             )
@@ -232,53 +367,11 @@ class AICodeGeneratorAPITester:
         """Test POST /api/preview - Code preview generation"""
         print("🔍 Testing Code Preview Endpoint (POST /api/preview)")
         
-        test_code = """
-import React, { useState } from 'react';
-
-function TodoApp() {
-  const [todos, setTodos] = useState([]);
-  const [input, setInput] = useState('');
-
-  const addTodo = () => {
-    if (input.trim()) {
-      setTodos([...todos, { id: Date.now(), text: input, completed: false }]);
-      setInput('');
-    }
-  };
-
-  return (
-    <div className="p-4">
-      <h1 className="text-2xl font-bold mb-4">Todo App</h1>
-      <div className="mb-4">
-        <input
-          type="text"
-          value={input}
-          onChange={(e) => setInput(e.target.value)}
-          className="border p-2 mr-2"
-          placeholder="Add a todo..."
-        />
-        <button onClick={addTodo} className="bg-blue-500 text-white p-2 rounded">
-          Add Todo
-        </button>
-      </div>
-      <ul>
-        {todos.map(todo => (
-          <li key={todo.id} className="mb-2">
-            {todo.text}
-          </li>
-        ))}
-      </ul>
-    </div>
-  );
-}
-
-export default TodoApp;
-        """
         
         try:
-            response = self.session.post(
-                f"{self.base_url}/preview",
-                json={'code': test_code},
+            response = self.client.post(
+                "/preview",
+                json={'code': PREVIEW_TEST_CODE},
                 headers={'Content-Type': 'application/json'}
             )
             
@@ -332,8 +425,8 @@ export default TodoApp;
         # Test error handling - missing code
         try:
             print("  Testing: Error Handling - Missing Code")
-            response = self.session.post(
-                f"{self.base_url}/preview",
+            response = self.client.post(
+                "/preview",
                 json={},
                 headers={'Content-Type': 'application/json'}
             )
@@ -372,12 +465,68 @@ export default TodoApp;
         
         return False
 
+    def test_preview_fetch(self):
+        """Test GET /api/preview/{id} - Content-addressed preview fetch with ETag revalidation"""
+        print("🔍 Testing Preview Fetch Endpoint (GET /api/preview/{id})")
+
+        try:
+            ids = []
+            for _ in range(2):
+                response = self.client.post("/preview", json={'code': PREVIEW_TEST_CODE})
+                ids.append(response.json().get('previewId'))
+
+            if not ids[0] or ids[0] != ids[1]:
+                self.log_test(
+                    "Preview Fetch",
+                    False,
+                    "Identical code did not map to the same preview id",
+                    {'preview_ids': ids}
+                )
+                return False
+
+            response = self.client.get(f"/preview/{ids[0]}")
+            etag = response.headers.get('ETag')
+            if response.status_code != 200 or response.text != PREVIEW_TEST_CODE or not etag:
+                self.log_test(
+                    "Preview Fetch",
+                    False,
+                    f"Preview fetch returned status {response.status_code} or unexpected content",
+                    {'status_code': response.status_code, 'etag': etag}
+                )
+                return False
+
+            revalidated = self.client.get(f"/preview/{ids[0]}", headers={'If-None-Match': etag})
+            if revalidated.status_code == 304:
+                self.log_test(
+                    "Preview Fetch",
+                    True,
+                    "Preview served with a strong ETag and revalidates with 304",
+                    {'etag': etag, 'cache_control': response.headers.get('Cache-Control')}
+                )
+                return True
+
+            self.log_test(
+                "Preview Fetch",
+                False,
+                f"Expected 304 on revalidation, got {revalidated.status_code}",
+                {'status_code': revalidated.status_code}
+            )
+        except Exception as e:
+            self.log_test(
+                "Preview Fetch",
+                False,
+                f"Preview fetch failed with exception: {str(e)}",
+                {'exception': str(e)}
+            )
+
+        return False
+
     def test_conversations_history(self):
         """Test GET /api/conversations - Conversation history"""
         print("🔍 Testing Conversations History Endpoint (GET /api/conversations)")
         
         try:
-            response = self.session.get(f"{self.base_url}/conversations")
+            response = self.client.get("/conversations")
             
             if response.status_code == 200:
                 data = response.json()
@@ -445,7 +594,7 @@ export default TodoApp;
         print("🔍 Testing Templates Endpoint (GET /api/templates)")
         
         try:
-            response = self.session.get(f"{self.base_url}/templates")
+            response = self.client.get("/templates")
             
             if response.status_code == 200:
                 data = response.json()
@@ -511,6 +660,467 @@ export default TodoApp;
         
         return False
 
+    def stream_generate(self, payload):
+        """POST /api/generate/stream and time the Server-Sent Events it returns
+
+        Records time to first byte, first token (explanation or code), first
+        code block and total time, all in seconds from the request start.
+        """
+        timings = {'ttfb': None, 'first_token': None, 'first_code_block': None, 'total': None}
+        outcome = {'status': None, 'result': None, 'error': None, 'events': Counter(), 'timings': timings}
+        start = time.perf_counter()
+
+        try:
+            response = self.client.post(
+                "/generate/stream",
+                json=payload,
+                stream=True
+            )
+        except requests.RequestException as e:
+            outcome['status'] = f"error:{type(e).__name__}"
+            outcome['error'] = str(e)
+            return outcome
+
+        with response:
+            outcome['status'] = response.status_code
+            if response.status_code != 200:
+                outcome['error'] = response.text
+                return outcome
+
+            def timed_lines():
+                for line in response.iter_lines(decode_unicode=True):
+                    if timings['ttfb'] is None:
+                        timings['ttfb'] = time.perf_counter() - start
+                    yield line
+
+            for event, data in parse_sse(timed_lines()):
+                elapsed = time.perf_counter() - start
+                outcome['events'][event] += 1
+                if event in ('explanation', 'code') and timings['first_token'] is None:
+                    timings['first_token'] = elapsed
+                elif event == 'code_start' and timings['first_code_block'] is None:
+                    timings['first_code_block'] = elapsed
+                elif event == 'done':
+                    outcome['result'] = json.loads(data)
+                elif event == 'error':
+                    outcome['error'] = json.loads(data).get('error')
+
+        timings['total'] = time.perf_counter() - start
+        return outcome
+
+    def test_template_generation(self, template_id='dashboard'):
+        """Test /api/templates revalidation and POST /api/generate with a templateId"""
+        print("🔍 Testing Template Generation (ETag + POST /api/generate with templateId)")
+
+        try:
+            first = self.client.get("/templates")
+            etag = first.headers.get('ETag')
+            revalidated = self.client.get("/templates", headers={'If-None-Match': etag or ''})
+
+            timings = []
+            statuses = []
+            for _ in range(2):
+                start = time.perf_counter()
+                response = self.client.post("/generate", json={'templateId': template_id})
+                timings.append(round((time.perf_counter() - start) * 1000))
+                statuses.append(response.headers.get('X-Cache'))
+                data = response.json()
+                if response.status_code != 200 or not data.get('code') or data.get('templateId') != template_id:
+                    self.log_test(
+                        "Template Generation",
+                        False,
+                        f"Template generation returned status code {response.status_code}",
+                        {'response': data}
+                    )
+                    return False
+
+            unknown = self.client.post("/generate", json={'templateId': 'nao-existe'})
+            passed = (
+                bool(etag) and revalidated.status_code == 304 and
+                statuses[1] in ('TEMPLATE', 'TEMPLATE-STALE') and unknown.status_code == 404
+            )
+            self.log_test(
+                "Template Generation",
+                passed,
+                "Templates revalidate by ETag and template generations are served from storage" if passed else
+                "Template list revalidation or stored template generation did not behave as expected",
+                {
+                    'etag': etag,
+                    'revalidation_status': revalidated.status_code,
+                    'x_cache': statuses,
+                    'latency_ms': timings,
+                    'unknown_template_status': unknown.status_code
+                }
+            )
+            return passed
+        except Exception as e:
+            self.log_test(
+                "Template Generation",
+                False,
+                f"Template generation test failed with exception: {str(e)}",
+                {'exception': str(e)}
+            )
+
+        return False
+
+    def test_streaming_generation(self):
+        """Test POST /api/generate/stream - Streaming code generation"""
+        print("🔍 Testing Streaming Generation Endpoint (POST /api/generate/stream)")
+
+        try:
+            outcome = self.stream_generate(GENERATE_TEST_CASES[0]['payload'])
+            result = outcome['result'] or {}
+            timings = {
+                name: round(value * 1000) if value is not None else None
+                for name, value in outcome['timings'].items()
+            }
+
+            if outcome['status'] == 200 and result.get('success') and result.get('code'):
+                self.log_test(
+                    "Streaming Generation",
+                    True,
+                    "Streaming generation completed with a final result",
+                    {'timings_ms': timings, 'events': dict(outcome['events']), 'model': result.get('model')}
+                )
+                return True
+
+            self.log_test(
+                "Streaming Generation",
+                False,
+                f"Streaming generation did not complete (status {outcome['status']})",
+                {'error': outcome['error'], 'events': dict(outcome['events'])}
+            )
+        except Exception as e:
+            self.log_test(
+                "Streaming Generation",
+                False,
+                f"Streaming generation failed with exception: {str(e)}",
+                {'exception': str(e)}
+            )
+
+        return False
+
+    def test_session_context(self, turns=6):
+        """Test server-side sessions: conversationId round-trip and bounded context tokens"""
+        print("🔍 Testing Session Context (POST /api/generate with conversationId)")
+
+        conversation_id = None
+        usages = []
+        try:
+            for turn in range(turns):
+                payload = {
+                    'message': f"Passo {turn + 1}: ajuste o componente anterior adicionando mais um recurso",
+                    'projectType': 'component',
+                    'cache': {'noCache': True, 'noStore': True}
+                }
+                if conversation_id:
+                    payload['conversationId'] = conversation_id
+                else:
+                    payload['newSession'] = True
+                response = self.client.post("/generate", json=payload)
+                data = response.json()
+                if response.status_code != 200 or not data.get('conversationId') or 'usage' not in data:
+                    self.log_test(
+                        "Session Context",
+                        False,
+                        f"Turn {turn + 1} returned no session data (status {response.status_code})",
+                        {'response': data}
+                    )
+                    return False
+                conversation_id = data['conversationId']
+                usages.append(data['usage'])
+
+            within_budget = all(usage['contextTokens'] <= usage['budget'] for usage in usages)
+            kept_history = usages[-1]['historyTurns'] > 0
+            self.log_test(
+                "Session Context",
+                within_budget and kept_history,
+                "Context stayed within the token budget across the session" if within_budget else
+                "Context exceeded the token budget",
+                {
+                    'conversation_id': conversation_id,
+                    'prompt_tokens': [usage['promptTokens'] for usage in usages],
+                    'context_tokens': [usage['contextTokens'] for usage in usages],
+                    'history_turns': [usage['historyTurns'] for usage in usages]
+                }
+            )
+            return within_budget and kept_history
+        except Exception as e:
+            self.log_test(
+                "Session Context",
+                False,
+                f"Session context test failed with exception: {str(e)}",
+                {'exception': str(e)}
+            )
+
+        return False
+
+    def run_stream_test(self, total_requests=10, concurrency=1):
+        """Measure perceived (first byte/token/code block) vs total latency of streamed generations"""
+        print(f"🌊 Streaming test against {self.base_url}: {total_requests} requests, {concurrency} concurrent")
+        payloads = [GENERATE_TEST_CASES[i % len(GENERATE_TEST_CASES)]['payload'] for i in range(total_requests)]
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(self.stream_generate, payloads))
+
+        report = {
+            'requests': total_requests,
+            'errors': sum(1 for o in outcomes if o['status'] != 200 or o['error']),
+            'timings_ms': {},
+        }
+        for name in ('ttfb', 'first_token', 'first_code_block', 'total'):
+            values = [o['timings'][name] * 1000 for o in outcomes if o['timings'][name] is not None]
+            report['timings_ms'][name] = {
+                'count': len(values),
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'p99': percentile(values, 99),
+            }
+
+        print("=" * 80)
+        print(f"{'metric':<20}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for name, stats in report['timings_ms'].items():
+            print(f"{name:<20}{stats['count']:>7}{stats['p50']:>10.0f}{stats['p95']:>10.0f}{stats['p99']:>10.0f}")
+        print(f"(latencies in ms, {report['errors']} error(s))")
+        return report
+
+    def run_batch_test(self, total_items=8, concurrency=4, fresh=True):
+        """Compare one /generate/batch call against the same items sent sequentially to /generate"""
+        print(f"📦 Batch test against {self.base_url}: {total_items} items, batch concurrency {concurrency}")
+        # A per-run nonce keeps the two runs from answering each other out of the response cache
+        nonce = uuid.uuid4().hex[:8]
+        items = [
+            {
+                'message': f"{GENERATE_TEST_CASES[i % len(GENERATE_TEST_CASES)]['payload']['message']} (#{i} {nonce})",
+                'projectType': GENERATE_TEST_CASES[i % len(GENERATE_TEST_CASES)]['payload']['projectType'],
+            }
+            for i in range(total_items)
+        ]
+        cache = {'noCache': True, 'noStore': True} if fresh else {}
+
+        start = time.perf_counter()
+        sequential_errors = 0
+        for item in items:
+            response = self.client.post("/generate", json={**item, 'cache': cache})
+            sequential_errors += response.status_code != 200
+        sequential_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        item_latencies = []
+        summary = None
+        batch_errors = 0
+        with self.client.post(
+            "/generate/batch",
+            json={'items': items, 'concurrency': concurrency, 'cache': cache},
+            stream=True,
+        ) as response:
+            if response.status_code != 200:
+                raise RuntimeError(f"Batch request failed with status {response.status_code}: {response.text}")
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get('done'):
+                    summary = data
+                    continue
+                item_latencies.append((time.perf_counter() - start) * 1000)
+                batch_errors += not data.get('success')
+        batch_s = time.perf_counter() - start
+
+        report = {
+            'items': total_items,
+            'concurrency': concurrency,
+            'sequential_s': sequential_s,
+            'batch_s': batch_s,
+            'speedup': sequential_s / batch_s if batch_s else 0.0,
+            'sequential_errors': sequential_errors,
+            'batch_errors': batch_errors,
+            'first_item_ms': min(item_latencies, default=0.0),
+            'item_arrival_p50_ms': percentile(item_latencies, 50),
+            'server_summary': summary,
+        }
+        print("=" * 80)
+        print(f"sequential /generate: {sequential_s:.2f}s ({sequential_errors} error(s))")
+        print(f"/generate/batch:      {batch_s:.2f}s ({batch_errors} error(s)), first item after "
+              f"{report['first_item_ms']:.0f}ms, speedup x{report['speedup']:.2f}")
+        if summary is None:
+            print("⚠️  Batch stream ended without a summary line")
+        elif not summary.get('saved'):
+            print("⚠️  Server reported the batch conversations were not saved")
+        return report
+
+    def _timed_get(self, path, params=None):
+        """GET a path and return (response, latency in ms)"""
+        start = time.perf_counter()
+        response = self.client.get(path, params=params)
+        return response, (time.perf_counter() - start) * 1000
+
+    def seed_conversations(self, collection, target_count):
+        """Top the collection up to target_count synthetic conversations marked seeded=True"""
+        existing = collection.count_documents({'seeded': True})
+        missing = target_count - existing
+        if missing <= 0:
+            return existing
+
+        print(f"  Seeding {missing} conversations (target {target_count})...")
+        code = PREVIEW_TEST_CODE * 2
+        now = datetime.utcnow()
+        batch = []
+        for i in range(missing):
+            case = GENERATE_TEST_CASES[i % len(GENERATE_TEST_CASES)]['payload']
+            batch.append({
+                'id': str(uuid.uuid4()),
+                'message': case['message'],
+                'projectType': case['projectType'],
+                'result': {
+                    'success': True,
+                    'explanation': 'Explicação gerada para teste de volume. ' * 10,
+                    'code': code,
+                    'model': 'Seed'
+                },
+                'timestamp': now - timedelta(seconds=existing + i),
+                'seeded': True,
+            })
+            if len(batch) == 1000:
+                collection.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            collection.insert_many(batch, ordered=False)
+        return target_count
+
+    def run_conversations_budget(self, counts, samples=20, pages=5, keep=False, mongo_url=None, db_name=None):
+        """Assert response-size and latency budgets of /conversations at seeded history sizes"""
+        try:
+            from pymongo import MongoClient
+        except ImportError:
+            raise SystemExit("The conversations budget mode needs pymongo (pip install pymongo)")
+
+        mongo_url = mongo_url or env_value('MONGO_URL', 'mongodb://localhost:27017')
+        db_name = db_name or env_value('DB_NAME')
+        collection = MongoClient(mongo_url)[db_name]['conversations']
+        print(f"📚 Conversations budget test against {self.base_url} ({db_name}.conversations)")
+
+        report = {}
+        try:
+            for count in sorted(counts):
+                self.seed_conversations(collection, count)
+                seeded_ids = [doc['id'] for doc in collection.aggregate([
+                    {'$match': {'seeded': True}}, {'$sample': {'size': samples}}, {'$project': {'id': 1}}
+                ])]
+                measurements = defaultdict(lambda: {'latencies': [], 'bytes': []})
+
+                def record(name, response, latency):
+                    measurements[name]['latencies'].append(latency)
+                    measurements[name]['bytes'].append(len(response.content))
+                    if response.status_code != 200:
+                        raise AssertionError(f"{name} returned status {response.status_code}")
+
+                for i in range(samples):
+                    response, latency = self._timed_get('/conversations', {'view': 'summary', 'limit': 50})
+                    record('summary_first_page', response, latency)
+
+                    cursor = response.headers.get('X-Next-Cursor')
+                    for _ in range(pages):
+                        if not cursor:
+                            break
+                        response, latency = self._timed_get(
+                            '/conversations', {'view': 'summary', 'limit': 50, 'before': cursor}
+                        )
+                        record('summary_deep_page', response, latency)
+                        cursor = response.headers.get('X-Next-Cursor')
+
+                    response, latency = self._timed_get('/conversations', {'limit': 50})
+                    record('full_first_page', response, latency)
+
+                    if seeded_ids:
+                        response, latency = self._timed_get(f"/conversations/{seeded_ids[i % len(seeded_ids)]}")
+                        record('by_id', response, latency)
+
+                level = {}
+                for name, data in measurements.items():
+                    budget = CONVERSATION_BUDGETS[name]
+                    stats = {
+                        'p50_ms': percentile(data['latencies'], 50),
+                        'p95_ms': percentile(data['latencies'], 95),
+                        'max_bytes': max(data['bytes']),
+                    }
+                    passed = stats['p95_ms'] <= budget['p95_ms'] and stats['max_bytes'] <= budget['max_bytes']
+                    level[name] = {**stats, 'budget': budget, 'passed': passed}
+                    self.log_test(
+                        f"Conversations Budget - {name} @ {count}",
+                        passed,
+                        f"p95 {stats['p95_ms']:.0f}ms (budget {budget['p95_ms']}ms), "
+                        f"max {stats['max_bytes']} bytes (budget {budget['max_bytes']})"
+                    )
+                report[count] = level
+        finally:
+            if not keep:
+                collection.delete_many({'seeded': True})
+
+        return report
+
+    def _fetch_asset(self, url):
+        """Download url gzip-encoded as a browser would; returns (wire bytes, decoded bytes)"""
+        response = self.client.get(
+            url, headers={'Accept-Encoding': 'gzip'}, stream=True
+        )
+        response.raise_for_status()
+        wire = response.raw.read(decode_content=False)
+        decoded = gzip.decompress(wire) if response.headers.get('Content-Encoding') == 'gzip' else wire
+        return len(wire), len(decoded)
+
+    def run_bundle_budget(self, app_url=None, budgets_path='bundle-budgets.json', samples=3):
+        """Check each route's initial JS/CSS bytes and load time from `next start` against its budget"""
+        app_url = (app_url or self.base_url.rsplit('/api', 1)[0]).rstrip('/')
+        with open(budgets_path) as f:
+            budgets = json.load(f)['routes']
+        print(f"📦 Bundle budget test against {app_url} ({budgets_path})")
+
+        report = {}
+        for route, budget in budgets.items():
+            tti_samples = []
+            for _ in range(samples):
+                # TTI proxy: the HTML plus every initial script and stylesheet downloaded,
+                # six at a time like a browser; parse and execute time is not included
+                started = time.time()
+                page = self.client.get(f"{app_url}{route}")
+                page.raise_for_status()
+                assets = InitialAssetParser()
+                assets.feed(page.text)
+                urls = list(dict.fromkeys(urljoin(page.url, src) for src in assets.scripts + assets.stylesheets))
+                with ThreadPoolExecutor(max_workers=6) as pool:
+                    sizes = dict(zip(urls, pool.map(self._fetch_asset, urls)))
+                tti_samples.append((time.time() - started) * 1000)
+
+            scripts = {urljoin(page.url, src) for src in assets.scripts}
+            js_wire = sum(wire for url, (wire, _) in sizes.items() if url in scripts)
+            js_raw = sum(raw for url, (_, raw) in sizes.items() if url in scripts)
+            css_wire = sum(wire for url, (wire, _) in sizes.items() if url not in scripts)
+            stats = {
+                'html_bytes': len(page.content),
+                'scripts': len(scripts),
+                'js_wire_bytes': js_wire,
+                'js_raw_bytes': js_raw,
+                'css_wire_bytes': css_wire,
+                'tti_proxy_ms': percentile(tti_samples, 50),
+            }
+            checks = {
+                'js': ('initialJsGzipKb', js_wire / 1024),
+                'css': ('initialCssGzipKb', css_wire / 1024),
+                'tti': ('ttiProxyMs', stats['tti_proxy_ms']),
+            }
+            failed = [name for name, (key, value) in checks.items() if key in budget and value > budget[key]]
+            report[route] = {**stats, 'budget': budget, 'passed': not failed}
+            self.log_test(
+                f"Bundle Budget - {route}",
+                not failed,
+                f"{len(scripts)} scripts, JS {js_wire / 1024:.1f} KB on the wire ({js_raw / 1024:.1f} KB raw, "
+                f"budget {budget.get('initialJsGzipKb', '-')} KB), CSS {css_wire / 1024:.1f} KB, "
+                f"TTI proxy {stats['tti_proxy_ms']:.0f}ms (budget {budget.get('ttiProxyMs', '-')}ms)"
+                + (f" - over: {', '.join(failed)}" if failed else '')
+            )
+        return report
+
     def run_all_tests(self):
         """Run all backend API tests"""
         print("🚀 Starting AI Code Generator Backend API Tests")
@@ -522,8 +1132,12 @@ export default TodoApp;
             'health_check': self.test_health_check(),
             'code_generation': self.test_code_generation(),
             'preview_generation': self.test_preview_generation(),
+            'preview_fetch': self.test_preview_fetch(),
             'conversations_history': self.test_conversations_history(),
-            'templates': self.test_templates()
+            'templates': self.test_templates(),
+            'template_generation': self.test_template_generation(),
+            'streaming_generation': self.test_streaming_generation(),
+            'session_context': self.test_session_context()
         }
         
         # Summary
@@ -547,6 +1161,926 @@ export default TodoApp;
         
         return test_results
 
+    def _load_request(self, route, index, scheduled_at=None, nonce=None):
+        """Issue one load-test request and return its sample
+
+        Without a nonce /generate cycles through the fixed test cases, so after
+        the first few requests it measures response cache hits. With one every
+        prompt is unique and uncached, so it measures generation.
+        """
+        method, path, _ = LOAD_ROUTES[route]
+        kwargs = {}
+        if route == 'generate':
+            case = GENERATE_TEST_CASES[index % len(GENERATE_TEST_CASES)]['payload']
+            if nonce is not None:
+                # noStore keeps a long run from filling the cache with prompts never asked again
+                case = {**case, 'message': f"{case['message']} (#{index} {nonce})", 'cache': {'noStore': True}}
+            kwargs['json'] = case
+        elif route == 'preview':
+            kwargs['json'] = {'code': PREVIEW_TEST_CODE}
+
+        # In open-loop mode latency is measured from the scheduled send time so
+        # that a saturated server cannot hide its queueing (coordinated omission)
+        start = scheduled_at if scheduled_at is not None else time.perf_counter()
+        size = 0
+        queue_ms = None
+        try:
+            response = self.client.request(method, path, **kwargs)
+            status = response.status_code
+            size = len(response.content)
+            # Time spent waiting for an admission permit, as reported by the server
+            queue_ms = parse_server_timing(response.headers.get('Server-Timing')).get('queue')
+        except requests.RequestException as e:
+            status = f"error:{type(e).__name__}"
+
+        return {
+            'route': route,
+            'status': status,
+            'ok': isinstance(status, int) and status < 400,
+            'latency': time.perf_counter() - start,
+            'bytes': size,
+            'queue_ms': queue_ms,
+        }
+
+    def scrape_metrics(self):
+        """Fetch and parse /api/metrics; None when the endpoint is unavailable"""
+        try:
+            response = self.client.get("/metrics", timeout=(5, 10))
+            if response.status_code != 200:
+                return None
+            return parse_prometheus(response.text)
+        except requests.RequestException:
+            return None
+
+    def run_load_test(self, mix=None, concurrency=10, rate=None, duration=30, total_requests=None, seed=None, slo_ms=None,
+                      cache='miss'):
+        """Replay a weighted route mix at a target concurrency (closed loop) or rate (open loop)
+
+        cache='miss' sends a unique prompt with every /generate so each one
+        reaches a provider; cache='hit' repeats the fixed test cases.
+        """
+        mix = mix or parse_mix(None)
+        nonce = uuid.uuid4().hex[:8] if cache == 'miss' else None
+        routes = list(mix)
+        weights = [mix[route] for route in routes]
+        rng = random.Random(seed)
+        rng_lock = threading.Lock()
+        samples = []
+        issued = [0]
+
+        def next_request():
+            # Returns (route, index) or None once the request budget is spent
+            with rng_lock:
+                if total_requests is not None and issued[0] >= total_requests:
+                    return None
+                issued[0] += 1
+                return rng.choices(routes, weights)[0], issued[0]
+
+        mode = f"{rate:g} req/s (open loop)" if rate else f"{concurrency} workers (closed loop)"
+        print(f"🔥 Load test against {self.base_url}: {mode}, {duration:g}s, mix {mix}, cache {cache}")
+
+        metrics_before = self.scrape_metrics()
+        started = time.perf_counter()
+        deadline = started + duration
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            if rate:
+                futures = []
+                interval = 1.0 / rate
+                scheduled = started
+                while scheduled < deadline:
+                    request = next_request()
+                    if request is None:
+                        break
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    futures.append(executor.submit(self._load_request, *request, scheduled, nonce))
+                    scheduled += interval
+                for future in futures:
+                    samples.append(future.result())
+            else:
+                def worker():
+                    while time.perf_counter() < deadline:
+                        request = next_request()
+                        if request is None:
+                            return
+                        samples.append(self._load_request(*request, nonce=nonce))
+
+                for future in [executor.submit(worker) for _ in range(concurrency)]:
+                    future.result()
+
+        report = summarize_load(samples, time.perf_counter() - started, slo_ms)
+        report['cache'] = cache
+        print_load_report(report)
+
+        metrics_after = self.scrape_metrics() if metrics_before is not None else None
+        if metrics_after is not None:
+            report['server_metrics'] = metrics_breakdown(metrics_before, metrics_after)
+            print_metrics_breakdown(report['server_metrics'])
+        return report
+
+
+    def sample_soak(self, started, pid=None, db=None):
+        """One soak-test sample of the server process, its metrics and MongoDB"""
+        sample = {'timestamp': datetime.now().isoformat(), 'elapsed_s': round(time.time() - started, 1)}
+        if pid:
+            try:
+                sample.update(read_proc_stats(pid))
+            except OSError:
+                pid = None
+
+        metrics = self.scrape_metrics()
+        if metrics is not None:
+            from_metrics = {
+                'heap_used_bytes': metric_total(metrics, 'nodejs_heap_used_bytes'),
+                'heap_total_bytes': metric_total(metrics, 'nodejs_heap_total_bytes'),
+                'external_bytes': metric_total(metrics, 'nodejs_external_memory_bytes'),
+                'requests_total': metric_total(metrics, 'http_requests_total'),
+                'cache_entries': metric_total(metrics, 'response_cache_entries'),
+                'write_behind_buffered': metric_total(metrics, 'write_behind_buffered'),
+            }
+            if not pid:
+                # The server is on another host: fall back to its own view of itself
+                from_metrics['rss_bytes'] = metric_total(metrics, 'process_resident_memory_bytes')
+                from_metrics['open_fds'] = metric_total(metrics, 'process_open_fds')
+            sample.update(from_metrics)
+
+        if db is not None:
+            try:
+                sample.update(mongo_stats(db))
+            except Exception as e:
+                print(f"  ⚠️ MongoDB sample failed: {e}")
+        return sample
+
+    def run_soak_test(self, duration=7200, rate=2.0, concurrency=10, mix=None, interval=30, warmup=300,
+                      pid=None, mongo_url=None, db_name=None, min_increase_pct=10.0, csv_path=None, cache='miss'):
+        """Drive steady open-loop traffic for hours and flag resources that keep growing"""
+        pid = pid or find_server_pid()
+        db = None
+        if mongo_url or env_value('MONGO_URL'):
+            try:
+                from pymongo import MongoClient
+                db = MongoClient(mongo_url or env_value('MONGO_URL'), serverSelectionTimeoutMS=5000)[
+                    db_name or env_value('DB_NAME')]
+            except ImportError:
+                print("  ⚠️ pymongo not installed, skipping MongoDB samples")
+
+        print(f"🕰️  Soak test against {self.base_url}: {rate:g} req/s for {duration:g}s, "
+              f"sampling every {interval:g}s (server pid {pid or 'not found, using /metrics'}, "
+              f"MongoDB {'on' if db is not None else 'off'})")
+
+        started = time.time()
+        load = threading.Thread(
+            target=self.run_load_test,
+            kwargs={'mix': mix, 'concurrency': concurrency, 'rate': rate, 'duration': duration, 'cache': cache},
+            daemon=True,
+        )
+        load.start()
+
+        samples = []
+        next_sample = started
+        while load.is_alive():
+            sample = self.sample_soak(started, pid, db)
+            samples.append(sample)
+            if csv_path:
+                # Rewritten every sample so an interrupted run still leaves a report
+                write_soak_csv(csv_path, samples)
+            print(f"  t={sample['elapsed_s']:>7.0f}s rss={sample.get('rss_bytes', 0) / 1e6:.0f}MB "
+                  f"heap={(sample.get('heap_used_bytes') or 0) / 1e6:.0f}MB fds={sample.get('open_fds')} "
+                  f"mongo_conns={sample.get('mongo_connections', '-')}")
+            next_sample += interval
+            load.join(max(0.0, next_sample - time.time()))
+        samples.append(self.sample_soak(started, pid, db))
+        if csv_path:
+            write_soak_csv(csv_path, samples)
+
+        steady = [sample for sample in samples if sample['elapsed_s'] >= warmup]
+        series_keys = list(dict.fromkeys(key for sample in samples for key in sample
+                                         if key not in ('timestamp', 'elapsed_s', 'requests_total')))
+        trends = {key: detect_growth(steady, key, min_increase_pct=min_increase_pct) for key in series_keys}
+
+        print(f"\n{'series':<28}{'first':>14}{'last':>14}{'per hour':>14}{'floor +%':>10}")
+        for key, trend in trends.items():
+            if trend is None:
+                continue
+            flag = '  ⚠️ growing' if trend['growing'] else ''
+            print(f"{key:<28}{trend['first']:>14.0f}{trend['last']:>14.0f}{trend['slope_per_hour']:>14.1f}"
+                  f"{trend['increase_pct']:>10.1f}{flag}")
+
+        for key in SOAK_LEAK_SERIES:
+            trend = trends.get(key)
+            if trend is None:
+                continue
+            self.log_test(
+                f"Soak - {key}",
+                not trend['growing'],
+                f"floor {trend['floors'][0]:.0f} -> {trend['floors'][-1]:.0f} ({trend['increase_pct']:+.1f}%), "
+                f"{trend['slope_per_hour']:+.1f}/hour after {warmup:g}s warm-up"
+            )
+        if not any(trends.get(key) for key in SOAK_LEAK_SERIES):
+            print("  ⚠️ Not enough samples after the warm-up to judge growth (need at least 10)")
+
+        return {
+            'duration_s': duration,
+            'rate': rate,
+            'cache': cache,
+            'interval_s': interval,
+            'warmup_s': warmup,
+            'pid': pid,
+            'trends': trends,
+            'samples': samples,
+        }
+
+    def _replay_generation(self, shape, sessions):
+        """Generation body with the captured shape: synthetic prompt, history, session and cache flags"""
+        payload = {}
+        if shape.get('templateId') is not None:
+            payload['templateId'] = shape['templateId']
+        elif shape.get('unknownTemplate'):
+            payload['templateId'] = 'replay-unknown-template'
+        if 'messageChars' in shape:
+            payload['message'] = synthetic_prompt(shape['messageChars'], shape.get('messageHash'))
+        if shape.get('projectType'):
+            payload['projectType'] = shape['projectType']
+        if shape.get('historyLength'):
+            payload['conversationHistory'] = [
+                {'type': 'user' if i % 2 == 0 else 'assistant',
+                 'content': synthetic_prompt(80, f"{shape.get('messageHash')}:{i}")}
+                for i in range(shape['historyLength'])
+            ]
+        # A session's first replayed turn starts a new one; later turns reuse its id
+        if shape.get('sessionKey') in sessions:
+            payload['conversationId'] = sessions[shape['sessionKey']]
+        elif shape.get('sessionKey') or shape.get('newSession'):
+            payload['newSession'] = True
+        if shape.get('cache'):
+            payload['cache'] = shape['cache']
+        return payload
+
+    def _replay_request(self, record, scheduled_at, state):
+        """Reissue one captured request; None when it cannot be replayed yet"""
+        route = record['route']
+        method = record.get('method', 'GET')
+        path = '' if route == '/' else route
+        kwargs = {'stream': True}
+        if route in ('/generate', '/generate/stream'):
+            kwargs['json'] = self._replay_generation(record, state['sessions'])
+        elif route == '/generate/batch':
+            kwargs['json'] = {'items': [self._replay_generation(item, state['sessions'])
+                                        for item in record.get('batchItems', [])]}
+            for key in ('concurrency', 'cache'):
+                if key in record:
+                    kwargs['json'][key] = record[key]
+        elif route == '/preview':
+            chars = record.get('codeChars', len(PREVIEW_TEST_CODE))
+            code = f"// {record.get('codeHash', '')}\n{PREVIEW_TEST_CODE * (chars // len(PREVIEW_TEST_CODE) + 1)}"
+            kwargs['json'] = {'code': code[:max(chars, 1)]}
+        elif route == '/conversations':
+            kwargs['params'] = {key: value for key, value in record.get('query', {}).items() if key != 'paged'}
+        elif route in ('/preview/:id', '/conversations/:id'):
+            # Ids are not captured: fetch one created or listed earlier in the replay
+            ids = state['previews' if route == '/preview/:id' else 'conversations']
+            if not ids:
+                return None
+            path = route.replace(':id', ids[-1])
+
+        sent = time.perf_counter()
+        size = 0
+        total = None
+        queue_ms = None
+        try:
+            response = self.client.request(method, path, **kwargs)
+            headers_at = time.perf_counter()
+            with response:
+                body = response.content
+            total = time.perf_counter() - scheduled_at
+            status = response.status_code
+            size = len(body)
+            queue_ms = parse_server_timing(response.headers.get('Server-Timing')).get('queue')
+            if status < 400:
+                self._track_replay_ids(route, record, body, state)
+        except requests.RequestException as e:
+            headers_at = time.perf_counter()
+            status = f"error:{type(e).__name__}"
+
+        return {
+            'route': route,
+            'status': status,
+            'ok': isinstance(status, int) and status < 400,
+            # Until headers, from the scheduled time: comparable with the captured durationMs
+            'latency': headers_at - scheduled_at,
+            'total_s': total,
+            'lag_ms': (sent - scheduled_at) * 1000,
+            'bytes': size,
+            'queue_ms': queue_ms,
+        }
+
+    @staticmethod
+    def _track_replay_ids(route, record, body, state):
+        """Remember sessions, previews and conversations the replay created for later requests"""
+        try:
+            if route == '/generate/stream':
+                data = next((json.loads(data) for event, data in parse_sse(body.decode().splitlines())
+                             if event == 'done'), {})
+            else:
+                data = json.loads(body)
+        except ValueError:
+            return
+        if route in ('/generate', '/generate/stream'):
+            if record.get('sessionKey') and data.get('conversationId'):
+                state['sessions'].setdefault(record['sessionKey'], data['conversationId'])
+        elif route == '/preview' and data.get('previewId'):
+            state['previews'].append(data['previewId'])
+        elif route == '/conversations' and isinstance(data, list):
+            state['conversations'].extend(item['id'] for item in data[:5] if item.get('id'))
+
+    def run_replay(self, records, speed=1.0, concurrency=64, max_gap_s=None):
+        """Replay captured requests with their recorded inter-arrival times divided by speed
+
+        Open loop like the load mode: latency is measured from each request's
+        scheduled time, and schedule lag shows how late the client sent it
+        (all workers busy). Replayed latencies are compared per route with
+        those the capture recorded.
+        """
+        replayable = [record for record in records if record.get('route') in REPLAY_ROUTES]
+        if not replayable:
+            print("❌ Nothing to replay")
+            return {'requests': 0}
+        offsets = schedule_replay(replayable, speed, max_gap_s)
+        print(f"⏪ Replaying {len(replayable)} request(s) against {self.base_url} at {speed:g}x "
+              f"over {offsets[-1]:.0f}s ({len(records) - len(replayable)} not replayable)")
+
+        state = {'sessions': {}, 'previews': [], 'conversations': []}
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = []
+            for record, offset in zip(replayable, offsets):
+                scheduled = started + offset
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(self._replay_request, record, scheduled, state))
+            results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - started
+
+        samples = [sample for sample in results if sample is not None]
+        report = summarize_load(samples, elapsed)
+        print_load_report(report)
+
+        lags = [sample['lag_ms'] for sample in samples]
+        report['schedule_lag_ms'] = {
+            'p50': percentile(lags, 50),
+            'p95': percentile(lags, 95),
+            'p99': percentile(lags, 99),
+            'max': max(lags, default=0.0),
+        }
+        lag = report['schedule_lag_ms']
+        print(f"schedule lag p50/p95/p99/max {lag['p50']:.0f}/{lag['p95']:.0f}/{lag['p99']:.0f}/{lag['max']:.0f} ms, "
+              f"{len(results) - len(samples)} request(s) skipped (no id to fetch yet)")
+
+        baseline = recorded_baseline(replayable)
+        if baseline:
+            print(f"\n{'route':<20}{'rec p50':>9}{'p50':>9}{'rec p95':>9}{'p95':>9}{'rec err%':>10}{'err%':>8}")
+            for route, recorded in sorted(baseline.items()):
+                replayed = report['routes'].get(route)
+                if not replayed:
+                    continue
+                print(f"{route:<20}{recorded['p50_ms']:>9.0f}{replayed['p50_ms']:>9.0f}"
+                      f"{recorded['p95_ms']:>9.0f}{replayed['p95_ms']:>9.0f}"
+                      f"{recorded['error_rate'] * 100:>9.1f}%{replayed['error_rate'] * 100:>7.1f}%")
+            print("(ms until response headers; replayed latency includes schedule lag)")
+        report.update({
+            'speed': speed,
+            'max_gap_s': max_gap_s,
+            'replayed': len(samples),
+            'skipped': len(results) - len(samples),
+            'not_replayable': len(records) - len(replayable),
+            'recorded': baseline,
+        })
+        return report
+
+
+def parse_prometheus(text):
+    """Parse Prometheus text format into {(metric, ((label, value), ...)): value}"""
+    series = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        name_part, _, value = line.rpartition(' ')
+        labels = ()
+        if '{' in name_part:
+            name, _, label_text = name_part.partition('{')
+            pairs = []
+            for item in label_text.rstrip('}').split('",'):
+                key, _, raw = item.partition('="')
+                pairs.append((key, raw.rstrip('"').replace('\\"', '"').replace('\\n', '\n').replace('\\\\', '\\')))
+            labels = tuple(sorted(pairs))
+        else:
+            name = name_part
+        series[(name, labels)] = float(value)
+    return series
+
+
+# Soak-test series: process-level ones should plateau once warm, so steady
+# growth is reported as a leak; collection sizes are expected to grow with
+# traffic and are only reported
+SOAK_LEAK_SERIES = [
+    'rss_bytes', 'heap_used_bytes', 'external_bytes', 'open_fds', 'threads',
+    'mongo_connections', 'cache_entries', 'write_behind_buffered',
+]
+SOAK_COLLECTIONS = ['conversations', 'previews', 'sessions', 'session_turns', 'generation_cache', 'template_generations']
+
+
+def metric_total(series, name):
+    """Sum of a metric over all its label sets in a parse_prometheus() result"""
+    values = [value for (metric, _), value in series.items() if metric == name]
+    return sum(values) if values else None
+
+
+def find_server_pid():
+    """PID of the local Next.js server process, or None when it is not on this host"""
+    candidates = []
+    for entry in os.listdir('/proc') if os.path.isdir('/proc') else []:
+        if not entry.isdigit() or int(entry) == os.getpid():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", 'rb') as f:
+                cmdline = f.read().replace(b'\0', b' ').decode(errors='replace')
+        except OSError:
+            continue
+        # next start / next dev retitle their server process "next-server (vX.Y.Z)"
+        if 'next-server' in cmdline:
+            candidates.insert(0, int(entry))
+        elif 'next start' in cmdline or 'next dev' in cmdline:
+            candidates.append(int(entry))
+    return candidates[0] if candidates else None
+
+
+def read_proc_stats(pid):
+    """RSS, peak RSS, threads and open file descriptors of pid from /proc"""
+    stats = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key == 'VmRSS':
+                stats['rss_bytes'] = int(value.split()[0]) * 1024
+            elif key == 'VmHWM':
+                stats['peak_rss_bytes'] = int(value.split()[0]) * 1024
+            elif key == 'Threads':
+                stats['threads'] = int(value)
+    stats['open_fds'] = len(os.listdir(f"/proc/{pid}/fd"))
+    return stats
+
+
+def mongo_stats(db, collections=SOAK_COLLECTIONS):
+    """Current server connections and per-collection document counts and sizes"""
+    stats = {'mongo_connections': db.command('serverStatus')['connections']['current']}
+    existing = set(db.list_collection_names())
+    for name in collections:
+        coll_stats = db.command('collStats', name) if name in existing else {}
+        stats[f"{name}_count"] = coll_stats.get('count', 0)
+        stats[f"{name}_bytes"] = coll_stats.get('size', 0)
+    return stats
+
+
+def detect_growth(samples, key, windows=5, min_increase_pct=10.0):
+    """Trend of one series: slope per hour, and whether its floor rises in every window
+
+    The floor (minimum) per window is compared rather than the mean, so heap
+    that is reclaimed by GC does not look like growth but a rising baseline does.
+    """
+    points = [(sample['elapsed_s'], sample[key]) for sample in samples if sample.get(key) is not None]
+    if len(points) < windows * 2:
+        return None
+
+    size = len(points) // windows
+    floors = [min(value for _, value in points[i * size:(i + 1) * size]) for i in range(windows)]
+    times = [t for t, _ in points]
+    values = [v for _, v in points]
+    mean_t = sum(times) / len(times)
+    mean_v = sum(values) / len(values)
+    variance = sum((t - mean_t) ** 2 for t in times)
+    slope = sum((t - mean_t) * (v - mean_v) for t, v in points) / variance if variance else 0.0
+
+    increase_pct = (floors[-1] - floors[0]) / floors[0] * 100 if floors[0] else (100.0 if floors[-1] > 0 else 0.0)
+    monotonic = all(later > earlier for earlier, later in zip(floors, floors[1:]))
+    return {
+        'first': values[0],
+        'last': values[-1],
+        'floors': floors,
+        'slope_per_hour': slope * 3600,
+        'increase_pct': increase_pct,
+        'growing': monotonic and increase_pct >= min_increase_pct,
+    }
+
+
+def write_soak_csv(path, samples):
+    """Write the soak samples as one CSV row per sample"""
+    columns = list(dict.fromkeys(key for sample in samples for key in sample))
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(samples)
+
+
+# Routes the replay can reissue (captured 'other' paths and /metrics are skipped)
+REPLAY_ROUTES = {'/', '/generate', '/generate/stream', '/generate/batch', '/preview', '/preview/:id',
+                 '/conversations', '/conversations/:id', '/cache/stats', '/templates'}
+
+
+def load_capture(paths):
+    """Read REQUEST_CAPTURE_PATH logs, oldest request first"""
+    records = []
+    for path in paths:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt') as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    return sorted(records, key=lambda record: record['t'])
+
+
+def export_conversations(db, since=None, until=None, limit=None):
+    """Generation records in capture format from the conversations collection
+
+    Conversations are stamped when they are saved, so arrival times are
+    shifted by each generation's duration, and there is no recorded status
+    or latency to compare against.
+    """
+    query = {}
+    if since or until:
+        query['timestamp'] = {**({'$gte': since} if since else {}), **({'$lt': until} if until else {})}
+    cursor = db.conversations.find(query, projection={'message': 1, 'projectType': 1, 'sessionId': 1, 'timestamp': 1})
+    cursor = cursor.sort('timestamp', 1)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    def digest(value):
+        return hashlib.sha256(str(value).encode()).hexdigest()[:16]
+
+    records = []
+    for doc in cursor:
+        message = doc.get('message') or ''
+        record = {
+            't': int(doc['timestamp'].replace(tzinfo=timezone.utc).timestamp() * 1000),
+            'route': '/generate',
+            'method': 'POST',
+            'projectType': doc.get('projectType') or 'component',
+            'messageChars': len(message),
+            'messageHash': digest(message),
+        }
+        if doc.get('sessionId'):
+            record['sessionKey'] = digest(doc['sessionId'])
+        records.append(record)
+    return records
+
+
+def synthetic_prompt(chars, key):
+    """A prompt of about `chars` characters; the same key always gives the same prompt
+
+    Prompts with the same captured hash stay identical, so the replay hits the
+    response cache and single-flight as often as the original traffic did.
+    """
+    rng = random.Random(key)
+    words = ' '.join(case['payload']['message'] for case in GENERATE_TEST_CASES).split()
+    parts = [f"[{key}]"]
+    length = len(parts[0])
+    while length < chars:
+        word = rng.choice(words)
+        parts.append(word)
+        length += len(word) + 1
+    return ' '.join(parts)
+
+
+def schedule_replay(records, speed=1.0, max_gap_s=None):
+    """Send offsets in seconds from the start: recorded inter-arrival times divided by speed
+
+    Gaps longer than max_gap_s (after scaling) are shortened to it, so an
+    export spanning days does not replay its idle nights.
+    """
+    offsets = []
+    offset = 0.0
+    for previous, record in zip([None] + records[:-1], records):
+        if previous is not None:
+            gap = max(0.0, record['t'] - previous['t']) / 1000 / speed
+            offset += min(gap, max_gap_s) if max_gap_s else gap
+        offsets.append(offset)
+    return offsets
+
+
+def recorded_baseline(records):
+    """Per-route latency and error rate the capture recorded, where it has them"""
+    by_route = defaultdict(list)
+    for record in records:
+        if record.get('durationMs') is not None and record.get('status') is not None:
+            by_route[record['route']].append(record)
+    baseline = {}
+    for route, group in by_route.items():
+        durations = [record['durationMs'] for record in group]
+        baseline[route] = {
+            'count': len(group),
+            'p50_ms': percentile(durations, 50),
+            'p95_ms': percentile(durations, 95),
+            'p99_ms': percentile(durations, 99),
+            'error_rate': sum(1 for record in group if record['status'] >= 400) / len(group),
+        }
+    return baseline
+
+
+# Histograms broken down after a load run: metric -> labels that name each row
+METRIC_BREAKDOWNS = {
+    'route_step_duration_seconds': ('route', 'step'),
+    'provider_request_duration_seconds': ('provider', 'outcome'),
+    'storage_operation_duration_seconds': ('backend', 'operation'),
+    'http_request_duration_seconds': ('route',),
+}
+
+
+def metrics_breakdown(before, after):
+    """Per-row count and mean latency of each histogram, plus counter deltas, between two scrapes"""
+    def delta(key):
+        return after.get(key, 0.0) - before.get(key, 0.0)
+
+    breakdown = {}
+    for metric, label_names in METRIC_BREAKDOWNS.items():
+        rows = {}
+        for (name, labels), _ in after.items():
+            if name != f"{metric}_count":
+                continue
+            count = delta((name, labels))
+            if count <= 0:
+                continue
+            total = delta((f"{metric}_sum", labels))
+            label_map = dict(labels)
+            row = ' '.join(label_map.get(label, '') for label in label_names)
+            rows[row] = {'count': int(count), 'mean_ms': total / count * 1000, 'total_s': total}
+        breakdown[metric] = rows
+
+    breakdown['generation_results_total'] = {
+        dict(labels).get('source', ''): int(delta((name, labels)))
+        for (name, labels) in after if name == 'generation_results_total' and delta((name, labels)) > 0
+    }
+    breakdown['gauges'] = {
+        name: value for (name, labels), value in after.items()
+        if not labels and name in ('process_resident_memory_bytes', 'nodejs_heap_used_bytes', 'process_open_fds')
+    }
+    return breakdown
+
+
+def print_metrics_breakdown(breakdown):
+    """Print where server time went during a load run"""
+    print("=" * 80)
+    print("🔬 SERVER-SIDE BREAKDOWN (/api/metrics, delta over the run)")
+    print("=" * 80)
+    for metric in METRIC_BREAKDOWNS:
+        rows = breakdown.get(metric) or {}
+        if not rows:
+            continue
+        print(f"{metric}:")
+        for row, stats in sorted(rows.items(), key=lambda item: -item[1]['total_s']):
+            print(f"  {row:<40}{stats['count']:>8}{stats['mean_ms']:>10.1f} ms mean{stats['total_s']:>10.2f} s total")
+    if breakdown.get('generation_results_total'):
+        answered = ', '.join(f"{source}={count}" for source, count in sorted(breakdown['generation_results_total'].items()))
+        print(f"generations answered by: {answered}")
+    for name, value in sorted(breakdown.get('gauges', {}).items()):
+        print(f"{name}: {value:.0f}")
+
+
+def summarize_load(samples, elapsed, slo_ms=None):
+    """Aggregate load-test samples into per-route and overall statistics
+
+    Goodput counts successful responses, and with slo_ms only those that
+    also finished within it; shed counts 429/503 admission rejections.
+    """
+    by_route = defaultdict(list)
+    for sample in samples:
+        by_route[sample['route']].append(sample)
+
+    def stats(group):
+        latencies = [s['latency'] * 1000 for s in group]
+        queued = [s['queue_ms'] for s in group if s.get('queue_ms') is not None]
+        errors = sum(1 for s in group if not s['ok'])
+        return {
+            'count': len(group),
+            'throughput_rps': len(group) / elapsed if elapsed else 0.0,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'mean_ms': sum(latencies) / len(latencies) if latencies else 0.0,
+            'max_ms': max(latencies, default=0.0),
+            'error_rate': errors / len(group) if group else 0.0,
+            'goodput_rps': sum(1 for s in group if s['ok'] and (slo_ms is None or s['latency'] * 1000 <= slo_ms)) / elapsed
+            if elapsed else 0.0,
+            'shed': sum(1 for s in group if s['status'] in (429, 503)),
+            'queue_p50_ms': percentile(queued, 50),
+            'queue_p95_ms': percentile(queued, 95),
+            'queue_p99_ms': percentile(queued, 99),
+            'bytes': sum(s['bytes'] for s in group),
+            'statuses': dict(Counter(str(s['status']) for s in group)),
+        }
+
+    return {
+        'elapsed_s': elapsed,
+        'overall': stats(samples),
+        'routes': {route: stats(group) for route, group in sorted(by_route.items())},
+    }
+
+
+def print_load_report(report):
+    """Print a load-test report as a per-route table"""
+    print("=" * 80)
+    print(f"📊 LOAD TEST REPORT ({report['elapsed_s']:.1f}s)")
+    print("=" * 80)
+    header = f"{'route':<15}{'count':>7}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'err%':>7}  statuses"
+    print(header)
+    print("-" * len(header))
+    rows = list(report['routes'].items()) + [('TOTAL', report['overall'])]
+    for route, stats in rows:
+        statuses = ', '.join(f"{code}={count}" for code, count in sorted(stats['statuses'].items()))
+        print(
+            f"{route:<15}{stats['count']:>7}{stats['throughput_rps']:>9.2f}"
+            f"{stats['p50_ms']:>9.0f}{stats['p95_ms']:>9.0f}{stats['p99_ms']:>9.0f}"
+            f"{stats['error_rate'] * 100:>6.1f}%  {statuses}"
+        )
+    print("(latencies in ms)")
+    overall = report['overall']
+    print(
+        f"goodput {overall['goodput_rps']:.2f} req/s, shed {overall['shed']} (429/503), "
+        f"admission queue p50/p95/p99 {overall['queue_p50_ms']:.0f}/{overall['queue_p95_ms']:.0f}/"
+        f"{overall['queue_p99_ms']:.0f} ms"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AI Code Generator backend API tests")
+    parser.add_argument('--base-url', default=BASE_URL, help=f"API base URL (default: {BASE_URL})")
+    parser.add_argument('--timeout', type=float, default=120, help="Per-request timeout in seconds")
+    parser.add_argument('--retries', type=int, default=0,
+                        help="Retry 429/503 responses this many times, honoring Retry-After (default: report them)")
+    parser.add_argument('--start-stub', type=int, metavar='PORT',
+                        help="Start the stub provider server on PORT for the duration of the run")
+    subparsers = parser.add_subparsers(dest='mode')
+
+    subparsers.add_parser('functional', help="Run the functional endpoint tests (default)")
+
+    load = subparsers.add_parser('load', help="Generate concurrent load against the API")
+    load.add_argument('--concurrency', type=int, default=10, help="Worker threads / max in-flight requests")
+    load.add_argument('--rate', type=float, help="Target request rate in req/s (omit for closed loop)")
+    load.add_argument('--duration', type=float, default=30, help="Test duration in seconds")
+    load.add_argument('--requests', type=int, help="Stop after this many requests")
+    load.add_argument('--mix', help=f"Weighted route mix, e.g. generate=1,templates=4 (routes: {', '.join(LOAD_ROUTES)})")
+    load.add_argument('--seed', type=int, help="Seed for the route selection")
+    load.add_argument('--slo-ms', type=float, help="Count only responses faster than this towards goodput")
+    load.add_argument('--cache', choices=('miss', 'hit'), default='miss',
+                      help="miss: a unique prompt per /generate (default); hit: repeat the test cases to load the cache")
+    load.add_argument('--json', dest='json_output', help="Also write the report to this JSON file")
+
+    stream = subparsers.add_parser('stream', help="Measure time to first token/code block of streamed generations")
+    stream.add_argument('--requests', type=int, default=10, help="Number of streamed generations")
+    stream.add_argument('--concurrency', type=int, default=1, help="Concurrent streams")
+    stream.add_argument('--json', dest='json_output', help="Also write the report to this JSON file")
+
+    batch = subparsers.add_parser('batch', help="Compare /generate/batch against sequential /generate calls")
+    batch.add_argument('--items', type=int, default=8, help="Number of prompts in the batch")
+    batch.add_argument('--concurrency', type=int, default=4, help="Server-side batch parallelism")
+    batch.add_argument('--use-cache', action='store_true', help="Allow cached answers (default: bypass the cache)")
+    batch.add_argument('--json', dest='json_output', help="Also write the report to this JSON file")
+
+    history = subparsers.add_parser('conversations-budget',
+                                    help="Seed conversations and check /conversations size and latency budgets")
+    history.add_argument('--counts', default='10000,100000', help="Comma-separated history sizes to test")
+    history.add_argument('--samples', type=int, default=20, help="Requests per measurement and size")
+    history.add_argument('--pages', type=int, default=5, help="Cursor pages to follow per sample")
+    history.add_argument('--keep', action='store_true', help="Keep the seeded conversations afterwards")
+    history.add_argument('--mongo-url', help="MongoDB URL (default: MONGO_URL from the environment or .env)")
+    history.add_argument('--db-name', help="Database name (default: DB_NAME from the environment or .env)")
+    history.add_argument('--json', dest='json_output', help="Also write the report to this JSON file")
+
+    soak = subparsers.add_parser('soak', help="Run steady traffic for hours and flag memory, handle and collection growth")
+    soak.add_argument('--duration', type=float, default=7200, help="Test duration in seconds")
+    soak.add_argument('--rate', type=float, default=2, help="Steady request rate in req/s")
+    soak.add_argument('--concurrency', type=int, default=10, help="Max in-flight requests")
+    soak.add_argument('--mix', help="Weighted route mix (see the load mode)")
+    soak.add_argument('--cache', choices=('miss', 'hit'), default='miss', help="Cache behaviour (see the load mode)")
+    soak.add_argument('--interval', type=float, default=30, help="Seconds between resource samples")
+    soak.add_argument('--warmup', type=float, default=300, help="Seconds excluded from the growth analysis")
+    soak.add_argument('--pid', type=int, help="Server process to sample from /proc (default: find next-server)")
+    soak.add_argument('--min-increase-pct', type=float, default=10,
+                      help="Minimum rise of a series' floor to count as growth")
+    soak.add_argument('--mongo-url', help="MongoDB URL (default: MONGO_URL from the environment or .env)")
+    soak.add_argument('--db-name', help="Database name (default: DB_NAME from the environment or .env)")
+    soak.add_argument('--csv', dest='csv_output', help="Write the time series to this CSV file")
+    soak.add_argument('--json', dest='json_output', help="Also write the report to this JSON file")
+
+    bundle = subparsers.add_parser('bundle-budget',
+                                   help="Check the page's initial JS/CSS bytes and load time from `next start`")
+    bundle.add_argument('--app-url', help="Frontend URL (default: the base URL without /api)")
+    bundle.add_argument('--budgets', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bundle-budgets.json'),
+                        help="Per-route budgets file shared with scripts/bundle-report.mjs")
+    bundle.add_argument('--samples', type=int, default=3, help="Cold page loads per route (median is reported)")
+    bundle.add_argument('--json', dest='json_output', help="Also write the report to this JSON file")
+
+    replay = subparsers.add_parser('replay', help="Replay captured traffic (REQUEST_CAPTURE_PATH logs or conversations) "
+                                                  "with its original timing, scaled by --speed")
+    replay.add_argument('captures', nargs='*', help="Capture logs (.jsonl or .jsonl.gz)")
+    replay.add_argument('--from-conversations', action='store_true',
+                        help="Replay generations exported from the conversations collection instead")
+    replay.add_argument('--since-hours', type=float, help="Only export conversations from the last N hours")
+    replay.add_argument('--limit', type=int, help="Replay at most this many requests")
+    replay.add_argument('--export', help="Write the exported records as a capture log and exit")
+    replay.add_argument('--speed', type=float, default=1.0, help="Time scale: 2 replays twice as fast")
+    replay.add_argument('--max-gap', type=float, help="Shorten idle gaps (after scaling) to this many seconds")
+    replay.add_argument('--concurrency', type=int, default=64, help="Max in-flight requests")
+    replay.add_argument('--mongo-url', help="MongoDB URL (default: MONGO_URL from the environment or .env)")
+    replay.add_argument('--db-name', help="Database name (default: DB_NAME from the environment or .env)")
+    replay.add_argument('--json', dest='json_output', help="Also write the report to this JSON file")
+
+    args = parser.parse_args(argv)
+    tester = AICodeGeneratorAPITester(args.base_url, args.timeout, args.retries)
+
+    stub = None
+    if args.start_stub:
+        from stub_provider_server import StubProviderServer
+
+        stub = StubProviderServer(port=args.start_stub).start()
+        print(f"🧪 Stub provider server running on {stub.url}; start the API with:")
+        for key, value in stub.env().items():
+            print(f"   {key}={value}")
+
+    try:
+        return run_mode(tester, args)
+    finally:
+        if stub:
+            stub.stop()
+
+
+def run_mode(tester, args):
+    """Dispatch the selected command-line mode"""
+    if args.mode == 'load':
+        report = tester.run_load_test(
+            mix=parse_mix(args.mix),
+            concurrency=args.concurrency,
+            rate=args.rate,
+            duration=args.duration,
+            total_requests=args.requests,
+            seed=args.seed,
+            slo_ms=args.slo_ms,
+            cache=args.cache,
+        )
+    elif args.mode == 'stream':
+        report = tester.run_stream_test(args.requests, args.concurrency)
+    elif args.mode == 'batch':
+        report = tester.run_batch_test(args.items, args.concurrency, fresh=not args.use_cache)
+    elif args.mode == 'conversations-budget':
+        report = tester.run_conversations_budget(
+            [int(count) for count in args.counts.split(',')],
+            samples=args.samples,
+            pages=args.pages,
+            keep=args.keep,
+            mongo_url=args.mongo_url,
+            db_name=args.db_name,
+        )
+    elif args.mode == 'soak':
+        report = tester.run_soak_test(
+            duration=args.duration,
+            rate=args.rate,
+            concurrency=args.concurrency,
+            mix=parse_mix(args.mix),
+            interval=args.interval,
+            warmup=args.warmup,
+            pid=args.pid,
+            mongo_url=args.mongo_url,
+            db_name=args.db_name,
+            min_increase_pct=args.min_increase_pct,
+            csv_path=args.csv_output,
+            cache=args.cache,
+        )
+    elif args.mode == 'bundle-budget':
+        report = tester.run_bundle_budget(args.app_url, args.budgets, args.samples)
+    elif args.mode == 'replay':
+        if args.from_conversations:
+            from pymongo import MongoClient
+            db = MongoClient(args.mongo_url or env_value('MONGO_URL'), serverSelectionTimeoutMS=5000)[
+                args.db_name or env_value('DB_NAME')]
+            since = datetime.now(timezone.utc) - timedelta(hours=args.since_hours) if args.since_hours else None
+            records = export_conversations(db, since=since, limit=args.limit)
+        elif args.captures:
+            records = load_capture(args.captures)[:args.limit]
+        else:
+            raise SystemExit("replay needs capture logs or --from-conversations")
+        if args.export:
+            with open(args.export, 'w') as f:
+                f.writelines(json.dumps(record) + '\n' for record in records)
+            print(f"💾 Wrote {len(records)} record(s) to {args.export}")
+            return records
+        report = tester.run_replay(records, speed=args.speed, concurrency=args.concurrency, max_gap_s=args.max_gap)
+    else:
+        return tester.run_all_tests()
+
+    if args.json_output:
+        with open(args.json_output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
 if __name__ == "__main__":
-    tester = AICodeGeneratorAPITester()
-    results = tester.run_all_tests()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite and regression gate for the AI Code Generator API
+Runs fixed, seeded scenarios against the offline stack: the stub provider
+server (started here, with fixed latencies) and the API pointed at the
+stub, with STORAGE_BACKEND=memory unless the environment picks another
+backend. Every scenario reports latency percentiles, throughput, response
+bytes and the server's own phase timings (Server-Timing), and the run is
+saved as a versioned JSON baseline that records the storage backend.
+
+    # API already running against the stub printed at startup
+    python benchmark.py run --save before
+    # or let the benchmark start it with the right environment
+    python benchmark.py run --server-cmd "yarn start" --save after
+    python benchmark.py compare benchmarks/before.json benchmarks/after.json --threshold 10
+    python benchmark.py run --compare benchmarks/before.json   # run, then gate on the baseline
+
+compare exits with status 1 when any metric regresses past the threshold,
+and refuses baselines taken against different storage backends.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+from api_client import NO_RETRY, CodeGeneratorClient, parse_sse
+from backend_test import BASE_URL, GENERATE_TEST_CASES, PREVIEW_TEST_CODE, parse_server_timing, percentile
+from stub_provider_server import StubProviderServer
+
+SCHEMA_VERSION = 1
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+
+# Deterministic provider behaviour for the stub during a run
+STUB_PROFILE = {
+    'latency': {'dist': 'fixed', 'ms': 200},
+    'tokens': {'min': 300, 'max': 300},
+    'token_rate': 400,
+    'error_rate': 0.0,
+    'timeout_rate': 0.0,
+}
+
+# name -> (kind, requests, concurrency); generate_cached warms its keys before timing
+SCENARIOS = {
+    'health': ('health', 200, 4),
+    'templates': ('templates', 300, 8),
+    'generate_cached': ('generate_cached', 200, 8),
+    'generate_fresh': ('generate_fresh', 48, 8),
+    'generate_stream': ('generate_stream', 24, 4),
+    'generate_batch': ('generate_batch', 6, 1),
+    'preview': ('preview', 200, 8),
+    'conversations': ('conversations', 200, 8),
+}
+
+# metric -> direction: 'lower' or 'higher' is better
+METRIC_DIRECTIONS = {
+    'p50_ms': 'lower',
+    'p95_ms': 'lower',
+    'p99_ms': 'lower',
+    'mean_ms': 'lower',
+    'ttfb_p50_ms': 'lower',
+    'ttfb_p95_ms': 'lower',
+    'throughput_rps': 'higher',
+    'error_rate': 'lower',
+    'mean_bytes': 'lower',
+}
+
+
+class ScenarioRunner:
+    """Issues one scenario's requests and collects per-request samples"""
+
+    def __init__(self, client, seed):
+        self.client = client
+        self.seed = seed
+
+    def request(self, kind, index, rng_seed):
+        """Run request `index` of a scenario; returns a sample dict"""
+        rng = random.Random(rng_seed)
+        case = GENERATE_TEST_CASES[index % len(GENERATE_TEST_CASES)]['payload']
+        start = time.perf_counter()
+        ttfb = None
+        size = 0
+        try:
+            if kind == 'health':
+                response = self.client.get('/')
+            elif kind == 'templates':
+                response = self.client.get('/templates')
+            elif kind == 'conversations':
+                response = self.client.get('/conversations', params={'view': 'summary', 'limit': 20})
+            elif kind == 'preview':
+                response = self.client.post('/preview', json={'code': f"{PREVIEW_TEST_CODE}\n// {index % 20}"})
+            elif kind == 'generate_cached':
+                response = self.client.post('/generate', json=case)
+            elif kind == 'generate_fresh':
+                payload = {**case, 'message': f"{case['message']} #{rng.getrandbits(32):08x}",
+                           'cache': {'noCache': True, 'noStore': True}}
+                response = self.client.post('/generate', json=payload)
+            elif kind == 'generate_stream':
+                payload = {**case, 'message': f"{case['message']} #{rng.getrandbits(32):08x}",
+                           'cache': {'noCache': True, 'noStore': True}}
+                response = self.client.post('/generate/stream', json=payload, stream=True)
+                counter = [0]
+                with response:
+                    for event, _ in parse_sse(self._counted_lines(response, counter)):
+                        if ttfb is None and event in ('explanation', 'code'):
+                            ttfb = time.perf_counter() - start
+                size = counter[0]
+            elif kind == 'generate_batch':
+                items = [{**GENERATE_TEST_CASES[(index + i) % len(GENERATE_TEST_CASES)]['payload'],
+                          'message': f"{case['message']} #{rng.getrandbits(32):08x}"} for i in range(8)]
+                response = self.client.post('/generate/batch', stream=True, json={
+                    'items': items, 'concurrency': 4, 'cache': {'noCache': True, 'noStore': True}})
+                with response:
+                    for line in response.iter_lines():
+                        if ttfb is None and line:
+                            ttfb = time.perf_counter() - start
+                        size += len(line) + 1
+            else:
+                raise ValueError(f"Unknown scenario kind '{kind}'")
+            status = response.status_code
+            if kind not in ('generate_stream', 'generate_batch'):
+                size = len(response.content)
+            server_timing = parse_server_timing(response.headers.get('Server-Timing'))
+        except requests.RequestException as e:
+            status = f"error:{type(e).__name__}"
+            server_timing = {}
+
+        return {
+            'status': status,
+            'ok': isinstance(status, int) and status < 400,
+            'latency_ms': (time.perf_counter() - start) * 1000,
+            'ttfb_ms': ttfb * 1000 if ttfb is not None else None,
+            'bytes': size,
+            'server_timing': server_timing,
+        }
+
+    @staticmethod
+    def _counted_lines(response, counter):
+        """Iterate SSE lines, adding their size on the wire to counter[0]"""
+        for line in response.iter_lines(decode_unicode=True):
+            counter[0] += len(line.encode()) + 1
+            yield line
+
+    def warm(self, kind):
+        """Untimed requests a scenario depends on, so its results do not depend on run order"""
+        if kind != 'generate_cached':
+            return
+        # One generation per distinct case stores every key the timed requests will hit
+        for case in GENERATE_TEST_CASES:
+            response = self.client.post('/generate', json=case['payload'])
+            if response.status_code != 200:
+                raise SystemExit(f"❌ Warming the response cache failed with status {response.status_code}")
+
+    def run(self, name, kind, total, concurrency):
+        """Run a scenario to completion; returns its summary"""
+        # Each request gets its own seed so the prompts do not depend on thread scheduling
+        seeds = random.Random(f"{self.seed}:{name}")
+        request_seeds = [seeds.getrandbits(64) for _ in range(total)]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = list(executor.map(lambda i: self.request(kind, i, request_seeds[i]), range(total)))
+        elapsed = time.perf_counter() - started
+        return summarize_scenario(samples, elapsed, concurrency)
+
+
+def summarize_scenario(samples, elapsed, concurrency):
+    """Latency percentiles, throughput, bytes and mean server phase timings of one scenario"""
+    ok = [sample for sample in samples if sample['ok']]
+    latencies = [sample['latency_ms'] for sample in ok]
+    ttfbs = [sample['ttfb_ms'] for sample in ok if sample['ttfb_ms'] is not None]
+    phases = defaultdict(list)
+    for sample in ok:
+        for phase, ms in sample['server_timing'].items():
+            phases[phase].append(ms)
+
+    summary = {
+        'requests': len(samples),
+        'concurrency': concurrency,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': len(ok) / elapsed if elapsed else 0.0,
+        'error_rate': 1 - len(ok) / len(samples) if samples else 0.0,
+        'statuses': dict(Counter(str(sample['status']) for sample in samples)),
+        'p50_ms': percentile(latencies, 50),
+        'p90_ms': percentile(latencies, 90),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'mean_ms': sum(latencies) / len(latencies) if latencies else 0.0,
+        'max_ms': max(latencies, default=0.0),
+        'mean_bytes': sum(sample['bytes'] for sample in ok) / len(ok) if ok else 0.0,
+        'server_timing_ms': {phase: sum(values) / len(values) for phase, values in sorted(phases.items())},
+    }
+    if ttfbs:
+        summary['ttfb_p50_ms'] = percentile(ttfbs, 50)
+        summary['ttfb_p95_ms'] = percentile(ttfbs, 95)
+    return summary
+
+
+def git_revision():
+    """Current commit and whether the tree has uncommitted changes, when run from a checkout"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return {'commit': commit, 'dirty': dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+
+
+def wait_for_api(client, timeout_s):
+    """The API's health document once it answers, or None after timeout_s"""
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        try:
+            response = client.get('/', timeout=(2, 5))
+            if response.status_code == 200:
+                return response.json()
+        except (requests.RequestException, ValueError):
+            pass
+        time.sleep(1)
+    return None
+
+
+def run_suite(base_url, scenarios, seed, stub_port, server_cmd=None, startup_timeout=180):
+    """Run the selected scenarios and return a baseline document"""
+    stub = None
+    server = None
+    storage_backend = os.environ.get('STORAGE_BACKEND', 'memory')
+    if stub_port:
+        stub = StubProviderServer(port=stub_port, profiles={name: STUB_PROFILE for name in ('openai', 'gemini', 'deepseek')},
+                                  seed=seed).start()
+        print(f"🧪 Stub provider server on {stub.url}")
+        if not server_cmd:
+            print("   Start the API with:")
+            for key, value in {**stub.env(), 'STORAGE_BACKEND': storage_backend}.items():
+                print(f"   {key}={value}")
+
+    client = CodeGeneratorClient(base_url, timeout=120, retry=NO_RETRY, pool_size=32)
+    try:
+        if server_cmd:
+            env = {**os.environ, **(stub.env() if stub else {})}
+            env.setdefault('STORAGE_BACKEND', 'memory')
+            server = subprocess.Popen(server_cmd, shell=True, env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            print(f"🚀 Started `{server_cmd}` (pid {server.pid}), waiting for {base_url}")
+        health = wait_for_api(client, startup_timeout if server_cmd else 10)
+        if health is None:
+            raise SystemExit(f"❌ API at {base_url} is not responding")
+        # What the server reports wins: an already running API may use another backend
+        storage_backend = health.get('storage') or storage_backend
+        print(f"🗄️  Storage backend: {storage_backend}")
+
+        runner = ScenarioRunner(client, seed)
+        results = {}
+        for name in scenarios:
+            kind, total, concurrency = SCENARIOS[name]
+            runner.warm(kind)
+            if stub:
+                # Same provider latencies and outcomes in every run
+                stub.state.reset()
+                stub.state.rng.seed(seed)
+            print(f"▶️  {name}: {total} requests, concurrency {concurrency}")
+            results[name] = runner.run(name, kind, total, concurrency)
+            result = results[name]
+            print(f"   p50 {result['p50_ms']:.1f}ms  p95 {result['p95_ms']:.1f}ms  p99 {result['p99_ms']:.1f}ms  "
+                  f"{result['throughput_rps']:.1f} req/s  errors {result['error_rate']:.1%}  "
+                  f"{result['mean_bytes']:.0f} B")
+    finally:
+        client.close()
+        if server:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        if stub:
+            stub.stop()
+
+    return {
+        'schema_version': SCHEMA_VERSION,
+        'id': uuid.uuid4().hex[:12],
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'git': git_revision(),
+        'environment': {
+            'base_url': base_url,
+            'seed': seed,
+            'stub_profile': STUB_PROFILE if stub else None,
+            'storage_backend': storage_backend,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'scenarios': results,
+    }
+
+
+def load_baseline(path):
+    with open(path) as f:
+        baseline = json.load(f)
+    version = baseline.get('schema_version')
+    if version != SCHEMA_VERSION:
+        raise SystemExit(f"❌ {path} has schema version {version}, expected {SCHEMA_VERSION}")
+    return baseline
+
+
+def check_comparable(baseline, current):
+    """Refuse to compare runs taken against different storage backends"""
+    before = baseline['environment'].get('storage_backend')
+    after = current['environment'].get('storage_backend')
+    if before and after and before != after:
+        raise SystemExit(f"❌ Cannot compare a {before} baseline with a {after} run; "
+                         f"rerun with STORAGE_BACKEND={before}")
+
+
+def compare_baselines(baseline, current, threshold_pct=10.0, thresholds=None, min_delta_ms=2.0):
+    """Per-metric deltas between two runs; a row regresses when it got worse past its threshold
+
+    Latency metrics also need to move by at least min_delta_ms, so that
+    sub-millisecond jitter on fast endpoints does not fail the gate. The
+    error rate is compared in absolute percentage points.
+    """
+    thresholds = thresholds or {}
+    rows = []
+    for scenario, before in baseline['scenarios'].items():
+        after = current['scenarios'].get(scenario)
+        if after is None:
+            continue
+        for metric, direction in METRIC_DIRECTIONS.items():
+            if metric not in before or metric not in after:
+                continue
+            old, new = before[metric], after[metric]
+            limit = thresholds.get(metric, threshold_pct)
+            if metric == 'error_rate':
+                delta_pct = (new - old) * 100
+                worse = delta_pct
+            else:
+                delta_pct = (new - old) / old * 100 if old else (0.0 if new == old else float('inf'))
+                worse = delta_pct if direction == 'lower' else -delta_pct
+            regressed = worse > limit
+            if regressed and metric.endswith('_ms') and abs(new - old) < min_delta_ms:
+                regressed = False
+            rows.append({
+                'scenario': scenario,
+                'metric': metric,
+                'baseline': old,
+                'current': new,
+                'delta_pct': delta_pct,
+                'threshold_pct': limit,
+                'regressed': regressed,
+            })
+    return rows
+
+
+def print_comparison(rows, baseline, current):
+    def label(doc):
+        git = doc.get('git') or {}
+        return f"{git.get('commit') or doc.get('id')}{'+dirty' if git.get('dirty') else ''} ({doc['created_at'][:19]})"
+
+    print(f"📊 {label(baseline)} -> {label(current)}")
+    print(f"{'scenario':<18}{'metric':<16}{'baseline':>12}{'current':>12}{'delta':>10}")
+    for row in rows:
+        flag = '  ❌ regression' if row['regressed'] else ''
+        print(f"{row['scenario']:<18}{row['metric']:<16}{row['baseline']:>12.2f}{row['current']:>12.2f}"
+              f"{row['delta_pct']:>+9.1f}%{flag}")
+    regressions = [row for row in rows if row['regressed']]
+    if regressions:
+        print(f"\n❌ {len(regressions)} metric(s) regressed past their threshold")
+    else:
+        print("\n✅ No regressions past the threshold")
+    return regressions
+
+
+def parse_thresholds(values):
+    """Parse repeated METRIC=PCT options"""
+    thresholds = {}
+    for item in values or []:
+        metric, _, pct = item.partition('=')
+        if metric not in METRIC_DIRECTIONS:
+            raise SystemExit(f"Unknown metric '{metric}', expected one of {', '.join(METRIC_DIRECTIONS)}")
+        thresholds[metric] = float(pct)
+    return thresholds
+
+
+def save_baseline(doc, name, directory=BENCHMARK_DIR):
+    path = name if name.endswith('.json') else os.path.join(directory, f"{name}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(doc, f, indent=2)
+    print(f"💾 Saved {path}")
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API benchmark suite with baselines and a regression gate")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_gate_options(command):
+        command.add_argument('--threshold', type=float, default=10.0,
+                             help="Allowed regression in percent for every metric (error_rate: points)")
+        command.add_argument('--metric-threshold', action='append', metavar='METRIC=PCT',
+                             help="Per-metric override, e.g. p99_ms=25")
+        command.add_argument('--min-delta-ms', type=float, default=2.0,
+                             help="Ignore latency changes smaller than this many ms")
+
+    run = subparsers.add_parser('run', help="Run the scenarios and save a baseline")
+    run.add_argument('--base-url', default=BASE_URL, help=f"API base URL (default: {BASE_URL})")
+    run.add_argument('--scenarios', default=','.join(SCENARIOS),
+                     help=f"Comma-separated scenarios (default: all of {', '.join(SCENARIOS)})")
+    run.add_argument('--seed', type=int, default=1)
+    run.add_argument('--stub-port', type=int, default=4010, help="Port for the stub providers (0 to not start one)")
+    run.add_argument('--server-cmd', help="Start the API with this command, pointed at the stub "
+                                          "(STORAGE_BACKEND defaults to memory)")
+    run.add_argument('--save', metavar='NAME', help=f"Baseline name or .json path (default dir: {BENCHMARK_DIR})")
+    run.add_argument('--compare', metavar='BASELINE', help="Compare the run against this baseline and gate on it")
+    add_gate_options(run)
+
+    compare = subparsers.add_parser('compare', help="Compare two baselines; exit 1 on regression")
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--json', dest='json_output', help="Also write the comparison rows to this JSON file")
+    add_gate_options(compare)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+        unknown = [name for name in scenarios if name not in SCENARIOS]
+        if unknown:
+            raise SystemExit(f"Unknown scenario(s) {', '.join(unknown)}; expected {', '.join(SCENARIOS)}")
+        current = run_suite(args.base_url, scenarios, args.seed, args.stub_port, args.server_cmd)
+        if args.save:
+            save_baseline(current, args.save)
+        if not args.compare:
+            return 0
+        baseline = load_baseline(args.compare)
+    else:
+        baseline = load_baseline(args.baseline)
+        current = load_baseline(args.current)
+
+    check_comparable(baseline, current)
+    rows = compare_baselines(baseline, current, args.threshold, parse_thresholds(args.metric_threshold),
+                             args.min_delta_ms)
+    regressions = print_comparison(rows, baseline, current)
+    if getattr(args, 'json_output', None):
+        with open(args.json_output, 'w') as f:
+            json.dump(rows, f, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+'use client'
+
+import Editor from '@monaco-editor/react'
+
+// Monaco editor for the generated code; loaded on demand by app/page.js
+export default function CodeEditor({ value, onChange }) {
+  return (
+    <Editor
+      height="100%"
+      defaultLanguage="javascript"
+      value={value || '// O código gerado aparecerá aqui...'}
+      onChange={onChange}
+      theme="vs-dark"
+      options={{
+        minimap: { enabled: false },
+        fontSize: 14,
+        lineHeight: 1.5,
+        padding: { top: 16, bottom: 16 },
+        scrollBeyondLastLine: false,
+        automaticLayout: true,
+        wordWrap: 'on'
+      }}
+    />
+  )
+}
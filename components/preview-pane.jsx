@@ -0,0 +1,26 @@
+'use client'
+
+import { Globe } from 'lucide-react'
+
+// Live preview of the generated component; loaded on demand by app/page.js
+export default function PreviewPane({ previewUrl }) {
+  return (
+    <div className="h-full bg-muted rounded-lg flex items-center justify-center">
+      {previewUrl ? (
+        <iframe 
+          src={previewUrl} 
+          className="w-full h-full rounded-lg border"
+          title="Preview do Código"
+        />
+      ) : (
+        <div className="text-center">
+          <Globe className="w-16 h-16 mx-auto mb-4 text-muted-foreground" />
+          <h3 className="text-lg font-medium mb-2">Preview em Tempo Real</h3>
+          <p className="text-muted-foreground">
+            Gere código para ver o preview em tempo real
+          </p>
+        </div>
+      )}
+    </div>
+  )
+}
@@ -0,0 +1,40 @@
+"""
+Settings for the Python tooling, read the way the Next.js app reads them
+The process environment wins; otherwise the value comes from the repo's
+.env file, parsed like dotenv: blank lines and # comments are skipped, an
+optional `export ` prefix is allowed and one pair of matching quotes around
+the value is removed.
+"""
+
+import os
+
+ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+
+
+def parse_env_line(line):
+    """(name, value) from one .env line, or None for blanks, comments and malformed lines"""
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    if line.startswith('export '):
+        line = line[len('export '):].lstrip()
+    name, sep, value = line.partition('=')
+    if not sep or not name.strip():
+        return None
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in ('"', "'"):
+        value = value[1:-1]
+    return name.strip(), value
+
+
+def env_value(key, default=None, path=ENV_PATH):
+    """Read a setting from the environment, falling back to the .env file; empty values count as unset"""
+    if os.environ.get(key):
+        return os.environ[key]
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                entry = parse_env_line(line)
+                if entry and entry[0] == key and entry[1]:
+                    return entry[1]
+    return default
@@ -0,0 +1,136 @@
+// Admission control for expensive work (LLM provider calls)
+//
+// At most `maxConcurrent` callers hold a permit; the rest wait in a queue of
+// at most `maxQueue` entries ordered by priority (lower runs first), then by
+// arrival. Callers are rejected fast instead of piling up:
+//   429 -> the queue is full (a lower-priority waiter is shed to make room
+//          for a higher-priority arrival when possible)
+//   503 -> the expected or actual wait exceeds `queueTimeoutMs`
+// Rejections carry a Retry-After estimate derived from recent service times.
+export class AdmissionRejectedError extends Error {
+  constructor(status, reason, retryAfterS) {
+    super(`Admission rejected: ${reason}`)
+    this.name = 'AdmissionRejectedError'
+    this.status = status
+    this.reason = reason
+    this.retryAfterS = retryAfterS
+  }
+}
+
+// Non-blocking counting semaphore used for per-provider concurrency limits
+export class ConcurrencyLimiter {
+  constructor(limit) {
+    this.limit = limit
+    this.active = 0
+  }
+
+  tryAcquire() {
+    if (this.active >= this.limit) return false
+    this.active++
+    return true
+  }
+
+  release() {
+    this.active = Math.max(0, this.active - 1)
+  }
+}
+
+export class AdmissionController {
+  constructor({ maxConcurrent = 8, maxQueue = 32, queueTimeoutMs = 10000 } = {}) {
+    this.maxConcurrent = maxConcurrent
+    this.maxQueue = maxQueue
+    this.queueTimeoutMs = queueTimeoutMs
+    this.active = 0
+    this.queue = []
+    this.sequence = 0
+    this.avgServiceMs = null
+    this.stats = { admitted: 0, queued: 0, rejected: { queue_full: 0, shed: 0, deadline: 0, expected_wait: 0 } }
+  }
+
+  // Resolves with { release, queuedMs }; rejects with AdmissionRejectedError
+  acquire(priority = 0) {
+    const enqueuedAt = Date.now()
+    if (this.active < this.maxConcurrent && this.queue.length === 0) {
+      return Promise.resolve(this.grant(enqueuedAt))
+    }
+
+    // Expected wait: everyone ahead of us, served maxConcurrent at a time
+    const ahead = this.queue.filter(entry => entry.priority <= priority).length + 1
+    const expectedWaitMs = this.avgServiceMs === null ? 0 : (ahead / this.maxConcurrent) * this.avgServiceMs
+    if (expectedWaitMs > this.queueTimeoutMs) {
+      return Promise.reject(this.reject(503, 'expected_wait'))
+    }
+
+    if (this.queue.length >= this.maxQueue) {
+      const worst = this.queue[this.queue.length - 1]
+      if (worst.priority <= priority) return Promise.reject(this.reject(429, 'queue_full'))
+      this.queue.pop()
+      clearTimeout(worst.timer)
+      worst.reject(this.reject(429, 'shed'))
+    }
+
+    return new Promise((resolve, reject) => {
+      const entry = { priority, seq: this.sequence++, enqueuedAt, resolve, reject }
+      entry.timer = setTimeout(() => {
+        this.remove(entry)
+        reject(this.reject(503, 'deadline'))
+      }, this.queueTimeoutMs)
+      entry.timer.unref?.()
+
+      // Keep the queue sorted by (priority, arrival)
+      const index = this.queue.findIndex(other => other.priority > priority)
+      this.queue.splice(index === -1 ? this.queue.length : index, 0, entry)
+      this.stats.queued++
+    })
+  }
+
+  grant(enqueuedAt) {
+    this.active++
+    this.stats.admitted++
+    const startedAt = Date.now()
+    let released = false
+    return {
+      queuedMs: startedAt - enqueuedAt,
+      release: () => {
+        if (released) return
+        released = true
+        this.recordService(Date.now() - startedAt)
+        this.active--
+        this.next()
+      }
+    }
+  }
+
+  next() {
+    while (this.active < this.maxConcurrent && this.queue.length > 0) {
+      const entry = this.queue.shift()
+      clearTimeout(entry.timer)
+      entry.resolve(this.grant(entry.enqueuedAt))
+    }
+  }
+
+  remove(entry) {
+    const index = this.queue.indexOf(entry)
+    if (index !== -1) this.queue.splice(index, 1)
+  }
+
+  recordService(ms) {
+    // Exponentially weighted so the estimate follows provider latency shifts
+    this.avgServiceMs = this.avgServiceMs === null ? ms : this.avgServiceMs * 0.9 + ms * 0.1
+  }
+
+  retryAfterSeconds() {
+    if (this.avgServiceMs === null) return 1
+    const drainMs = ((this.queue.length + 1) / this.maxConcurrent) * this.avgServiceMs
+    return Math.min(Math.max(Math.ceil(drainMs / 1000), 1), 60)
+  }
+
+  reject(status, reason) {
+    this.stats.rejected[reason]++
+    return new AdmissionRejectedError(status, reason, this.retryAfterSeconds())
+  }
+
+  snapshot() {
+    return { ...this.stats, active: this.active, waiting: this.queue.length, avgServiceMs: this.avgServiceMs }
+  }
+}
@@ -0,0 +1,79 @@
+// Rolling error-rate circuit breaker for upstream providers
+//
+// closed    -> requests flow; opens once the error rate over the last
+//              `windowSize` outcomes reaches `errorThreshold`
+// open      -> requests are skipped until `openMs` has elapsed
+// half-open -> a single probe request is let through; success closes the
+//              breaker, failure opens it again
+export class CircuitBreaker {
+  constructor(name, { windowSize = 20, minRequests = 5, errorThreshold = 0.5, openMs = 30000 } = {}) {
+    this.name = name
+    this.windowSize = windowSize
+    this.minRequests = minRequests
+    this.errorThreshold = errorThreshold
+    this.openMs = openMs
+    this.state = 'closed'
+    this.outcomes = []
+    this.openedAt = 0
+    this.probeInFlight = false
+  }
+
+  // Returns true when a request may be sent. In half-open state this claims
+  // the single probe slot, so call it only right before sending.
+  allowRequest(now = Date.now()) {
+    if (this.state === 'open') {
+      if (now - this.openedAt < this.openMs) return false
+      this.state = 'half-open'
+      this.probeInFlight = false
+    }
+    if (this.state === 'half-open') {
+      if (this.probeInFlight) return false
+      this.probeInFlight = true
+    }
+    return true
+  }
+
+  recordSuccess() {
+    if (this.state === 'half-open') {
+      this.reset()
+      return
+    }
+    this.record(true)
+  }
+
+  recordFailure(now = Date.now()) {
+    if (this.state === 'half-open') {
+      this.trip(now)
+      return
+    }
+    this.record(false)
+    const failures = this.outcomes.filter(ok => !ok).length
+    if (this.outcomes.length >= this.minRequests && failures / this.outcomes.length >= this.errorThreshold) {
+      this.trip(now)
+    }
+  }
+
+  // Release a claimed probe slot without an outcome (e.g. the request was cancelled)
+  releaseProbe() {
+    this.probeInFlight = false
+  }
+
+  record(ok) {
+    this.outcomes.push(ok)
+    if (this.outcomes.length > this.windowSize) this.outcomes.shift()
+  }
+
+  trip(now) {
+    this.state = 'open'
+    this.openedAt = now
+    this.probeInFlight = false
+    this.outcomes = []
+    console.log(`Circuit breaker for ${this.name} opened`)
+  }
+
+  reset() {
+    this.state = 'closed'
+    this.probeInFlight = false
+    this.outcomes = []
+  }
+}
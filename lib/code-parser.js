@@ -0,0 +1,273 @@
+// Incremental parser for fenced code blocks in streamed LLM output
+//
+// push(chunk) consumes text as it arrives and returns the events it completes:
+//   { type: 'text', text }                prose outside code blocks
+//   { type: 'block_start', index, language, filename }
+//   { type: 'code', index, text }         code inside block `index`
+//   { type: 'block_end', index, language, filename, start, end }
+// end() flushes held text and closes an unterminated block; result() returns
+// the explanation (prose before the first block) and every block collected
+// so far, so a response is parsed once while it streams.
+//
+// Fence lines are never emitted as text. A partial line is only held back
+// while it could still turn out to be a fence, so prose and code are
+// forwarded with at most one line of delay.
+//
+// Block offsets are UTF-8 byte offsets into the full response: the block's
+// content is response[start, end), without the newline before the closing
+// fence. The filename comes from the fence info string (```jsx:src/App.jsx,
+// ```js title="server.js"), else from a label on the prose line before the
+// block ("**server.js**", "### models/Todo.js", "Arquivo `schema.js`:"),
+// else from a comment on the block's first line ("// server.js"); when none
+// is found it is file-<n> with an extension for the block's language. The
+// filename on block_start only reflects the first two sources.
+const FENCE = '```'
+
+const LANGUAGE_EXTENSIONS = {
+  javascript: 'js', js: 'js', jsx: 'jsx', typescript: 'ts', ts: 'ts', tsx: 'tsx',
+  json: 'json', html: 'html', css: 'css', scss: 'scss', python: 'py', py: 'py',
+  bash: 'sh', sh: 'sh', shell: 'sh', sql: 'sql', yaml: 'yml', yml: 'yml',
+  markdown: 'md', md: 'md', graphql: 'graphql', prisma: 'prisma', dockerfile: 'dockerfile'
+}
+const EXTENSION_LANGUAGES = {
+  js: 'javascript', mjs: 'javascript', cjs: 'javascript', jsx: 'jsx', ts: 'typescript',
+  tsx: 'tsx', json: 'json', html: 'html', css: 'css', scss: 'scss', py: 'python',
+  sh: 'bash', sql: 'sql', yml: 'yaml', yaml: 'yaml', md: 'markdown', env: 'bash',
+  graphql: 'graphql', prisma: 'prisma'
+}
+
+const FILE_PATH = /^(?:\.{0,2}\/)?(?:[\w@.-]+\/)*[\w@-][\w@.-]*\.([A-Za-z0-9]{1,10})$/
+// Names that look like files but are how the prose refers to frameworks
+const NOT_FILES = /^(?:node|next|express|react|vue|nuxt|nest|socket|three|chart|d3|alpine|ember)\.(?:js|io)$/i
+const INFO_ATTRIBUTE = /^(?:file(?:name)?|title|path)=["']?([^"']+)["']?$/i
+const FIRST_LINE_COMMENT = /^\s*(?:\/\/|#|\/\*|<!--|--)\s*(?:(?:file(?:name)?|arquivo|path|caminho)\s*:\s*)?(\S+?)\s*(?:\*\/|-->)?\s*$/i
+
+function looksLikeFilename(token) {
+  const match = FILE_PATH.exec(token)
+  return Boolean(match) && match[1].toLowerCase() in EXTENSION_LANGUAGES && !NOT_FILES.test(token)
+}
+
+function languageForFilename(filename) {
+  const extension = filename.slice(filename.lastIndexOf('.') + 1).toLowerCase()
+  return EXTENSION_LANGUAGES[extension] || ''
+}
+
+// ```lang, ```lang:path, ```lang path, ```lang title="path", ```path
+function parseInfo(info) {
+  const [first = '', ...rest] = info.split(/\s+/)
+  const colon = first.indexOf(':')
+  let language = colon === -1 ? first : first.slice(0, colon)
+  const candidates = colon === -1 ? [] : [first.slice(colon + 1)]
+  for (const token of rest) {
+    const attribute = INFO_ATTRIBUTE.exec(token)
+    candidates.push(attribute ? attribute[1] : token)
+  }
+
+  let filename = candidates.find(looksLikeFilename) || ''
+  if (!filename && looksLikeFilename(language)) {
+    filename = language
+    language = ''
+  }
+  return { language: language || (filename ? languageForFilename(filename) : ''), filename }
+}
+
+// A filename labelling the next block: a `code` or **bold** span that is a
+// path, or any other path on a heading or on a line ending with ':'
+function filenameFromLabel(line) {
+  const spans = [...line.matchAll(/`([^`]+)`|\*\*([^*]+)\*\*/g)].map(match => (match[1] || match[2]).trim())
+  const label = /^\s*#{1,6}\s/.test(line) || /:\s*$/.test(line)
+  // Code spans that are not paths themselves (`node server.js`) are commands, not labels
+  const tokens = label ? line.replace(/`[^`]*`/g, ' ').replace(/[*#:]/g, ' ').split(/\s+/) : []
+  return [...spans, ...tokens].reverse().find(looksLikeFilename) || ''
+}
+
+function filenameFromFirstLine(content) {
+  const newline = content.indexOf('\n')
+  const match = FIRST_LINE_COMMENT.exec(newline === -1 ? content : content.slice(0, newline))
+  return match && looksLikeFilename(match[1]) ? match[1] : ''
+}
+
+// Start of the first line at or after `from` (a line start) that opens with a fence
+function nextFenceLine(data, from) {
+  let index = data.indexOf(FENCE, from)
+  while (index !== -1) {
+    const lineStart = data.lastIndexOf('\n', index - 1) + 1
+    if (lineStart >= from && !data.slice(lineStart, index).trim()) return lineStart
+    index = data.indexOf(FENCE, index + FENCE.length)
+  }
+  return -1
+}
+
+export class FencedBlockParser {
+  constructor() {
+    this.pending = ''
+    this.atLineStart = true
+    this.inBlock = false
+    this.blockCount = 0
+    this.offset = 0
+    this.explanation = ''
+    this.proseLine = ''
+    this.labelLine = ''
+    this.blocks = []
+  }
+
+  push(chunk) {
+    const events = []
+    const data = this.pending + chunk
+    this.pending = ''
+    let position = 0
+
+    while (position < data.length) {
+      if (!this.atLineStart) {
+        // Rest of a line that already started as plain content
+        const newline = data.indexOf('\n', position)
+        const lineEnd = newline === -1 ? data.length : newline + 1
+        this.emitContent(events, data.slice(position, lineEnd))
+        position = lineEnd
+        this.atLineStart = newline !== -1
+        continue
+      }
+
+      // Everything up to the next fence line is content, emitted in one piece
+      const fence = nextFenceLine(data, position)
+      if (fence === -1) {
+        const lastNewline = data.lastIndexOf('\n')
+        if (lastNewline >= position) {
+          this.emitContent(events, data.slice(position, lastNewline + 1))
+          position = lastNewline + 1
+        }
+        // Incomplete last line: hold it only while it may still become a fence
+        const tail = data.slice(position)
+        const trimmed = tail.trimStart()
+        if (trimmed.startsWith(FENCE) || FENCE.startsWith(trimmed)) {
+          this.pending = tail
+        } else {
+          this.emitContent(events, tail)
+          this.atLineStart = false
+        }
+        break
+      }
+
+      if (fence > position) this.emitContent(events, data.slice(position, fence))
+      const newline = data.indexOf('\n', fence)
+      if (newline === -1) {
+        this.pending = data.slice(fence)
+        break
+      }
+      const line = data.slice(fence, newline + 1)
+      const bytes = Buffer.byteLength(line)
+      this.handleFence(events, line.trim().slice(FENCE.length).trim(), bytes)
+      this.offset += bytes
+      position = newline + 1
+    }
+
+    return events
+  }
+
+  end() {
+    const events = []
+    if (this.pending) {
+      const trimmed = this.pending.trimStart()
+      if (trimmed.startsWith(FENCE)) {
+        const bytes = Buffer.byteLength(this.pending)
+        this.handleFence(events, trimmed.slice(FENCE.length).trim(), bytes)
+        this.offset += bytes
+      } else {
+        this.emitContent(events, this.pending)
+      }
+      this.pending = ''
+    }
+    if (this.inBlock) this.closeBlock(events)
+    return events
+  }
+
+  // { explanation, blocks: [{ index, language, filename, content, start, end }] }
+  result() {
+    return { explanation: this.explanation.trim(), blocks: this.blocks }
+  }
+
+  handleFence(events, info, lineBytes) {
+    if (this.inBlock) {
+      this.closeBlock(events)
+      return
+    }
+
+    const { language, filename } = parseInfo(info)
+    const block = {
+      index: this.blockCount++,
+      language,
+      filename: filename || filenameFromLabel(this.labelLine),
+      content: '',
+      start: this.offset + lineBytes,
+      end: null
+    }
+    this.blocks.push(block)
+    this.inBlock = true
+    this.labelLine = ''
+    events.push({ type: 'block_start', index: block.index, language: block.language, filename: block.filename })
+  }
+
+  closeBlock(events) {
+    const block = this.blocks[this.blocks.length - 1]
+    block.end = this.offset
+    // The newline before the closing fence belongs to the fence
+    if (block.content.endsWith('\n')) {
+      const trailing = block.content.endsWith('\r\n') ? 2 : 1
+      block.content = block.content.slice(0, -trailing)
+      block.end -= trailing
+    }
+    if (!block.filename) block.filename = filenameFromFirstLine(block.content)
+    if (!block.filename) block.filename = `file-${block.index + 1}.${LANGUAGE_EXTENSIONS[block.language.toLowerCase()] || 'txt'}`
+    if (!block.language) block.language = languageForFilename(block.filename)
+
+    this.inBlock = false
+    events.push({
+      type: 'block_end',
+      index: block.index,
+      language: block.language,
+      filename: block.filename,
+      start: block.start,
+      end: block.end
+    })
+  }
+
+  emitContent(events, text) {
+    if (!text) return
+    this.offset += Buffer.byteLength(text)
+    if (this.inBlock) {
+      this.blocks[this.blocks.length - 1].content += text
+    } else {
+      if (this.blockCount === 0) this.explanation += text
+      this.trackProse(text)
+    }
+
+    const last = events[events.length - 1]
+    const type = this.inBlock ? 'code' : 'text'
+    if (last && last.type === type) {
+      last.text += text
+    } else {
+      events.push(this.inBlock ? { type, index: this.blockCount - 1, text } : { type, text })
+    }
+  }
+
+  // Remember the last non-blank prose line as a possible label for the next block
+  trackProse(text) {
+    const newline = text.lastIndexOf('\n')
+    if (newline === -1) {
+      this.proseLine += text
+      return
+    }
+    const lines = (this.proseLine + text.slice(0, newline)).split('\n')
+    this.proseLine = text.slice(newline + 1)
+    const label = lines.reverse().find(line => line.trim())
+    if (label !== undefined) this.labelLine = label
+  }
+}
+
+// Parse a complete response in one pass
+export function parseFencedBlocks(text) {
+  const parser = new FencedBlockParser()
+  parser.push(text)
+  parser.end()
+  return parser.result()
+}
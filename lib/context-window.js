@@ -0,0 +1,78 @@
+// Token-budgeted conversation context for provider requests
+//
+// Turns are { role: 'user' | 'assistant', content }. The newest turns are
+// kept verbatim while they fit the budget; the first one that does not fit
+// is truncated, and everything older is represented only by the session's
+// summary (if any), so the prompt size stays flat as a session grows.
+
+// Rough token estimate (~4 characters per token), good enough for budgeting
+export function estimateTokens(text) {
+  return Math.ceil(String(text || '').length / 4)
+}
+
+function truncateToTokens(text, tokens) {
+  const maxChars = tokens * 4
+  return text.length > maxChars ? `${text.slice(0, maxChars)}…` : text
+}
+
+// Returns { messages, dropped, usage } where messages are provider chat
+// messages (oldest first) and dropped are the turns left out of the window.
+export function buildContextWindow(turns, { budget = 2000, summary = '', summaryShare = 0.25, minTruncatedTokens = 32 } = {}) {
+  const summaryText = summary ? truncateToTokens(summary, Math.floor(budget * summaryShare)) : ''
+  const summaryTokens = summaryText ? estimateTokens(summaryText) : 0
+  let remaining = budget - summaryTokens
+
+  const kept = []
+  let truncatedTurns = 0
+  let index = turns.length - 1
+  for (; index >= 0; index--) {
+    const turn = turns[index]
+    const tokens = estimateTokens(turn.content)
+    if (tokens <= remaining) {
+      kept.unshift({ role: turn.role, content: turn.content })
+      remaining -= tokens
+      continue
+    }
+    if (remaining >= minTruncatedTokens) {
+      kept.unshift({ role: turn.role, content: truncateToTokens(turn.content, remaining) })
+      remaining = 0
+      truncatedTurns++
+      index--
+    }
+    break
+  }
+
+  const dropped = turns.slice(0, index + 1)
+  const messages = summaryText ?
+    [{ role: 'system', content: `Resumo da conversa anterior:\n${summaryText}` }, ...kept] :
+    kept
+
+  return {
+    messages,
+    dropped,
+    usage: {
+      budget,
+      contextTokens: budget - remaining,
+      summaryTokens,
+      historyTurns: turns.length,
+      verbatimTurns: kept.length - truncatedTurns,
+      truncatedTurns,
+      droppedTurns: dropped.length
+    }
+  }
+}
+
+// Cheap extractive summary: one bullet per user request, newest kept when
+// the summary outgrows maxTokens. No provider call is needed to build it.
+export function summarizeTurns(previousSummary, turns, { maxTokens = 300 } = {}) {
+  const bullets = previousSummary ? previousSummary.split('\n').filter(Boolean) : []
+  for (const turn of turns) {
+    if (turn.role !== 'user') continue
+    const firstSentence = turn.content.split(/(?<=[.!?])\s|\n/)[0].trim()
+    bullets.push(`- ${truncateToTokens(firstSentence, 25)}`)
+  }
+  while (bullets.length > 1 && estimateTokens(bullets.join('\n')) > maxTokens) {
+    bullets.shift()
+  }
+  return bullets.join('\n')
+}
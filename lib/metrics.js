@@ -0,0 +1,198 @@
+import { readdirSync } from 'fs'
+
+// In-process metrics rendered in the Prometheus text exposition format
+//
+// Counters, gauges and histograms take a label object on every update.
+// Metrics whose value lives elsewhere (cache stats, queue sizes, breaker
+// states) pass a collect() callback returning [[labels, value], ...] that is
+// read at scrape time instead of being updated on the hot path.
+export const DEFAULT_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+function escapeLabelValue(value) {
+  return String(value).replace(/\\/g, '\\\\').replace(/\n/g, '\\n').replace(/"/g, '\\"')
+}
+
+function formatLabels(labels) {
+  const pairs = Object.entries(labels).map(([name, value]) => `${name}="${escapeLabelValue(value)}"`)
+  return pairs.length ? `{${pairs.join(',')}}` : ''
+}
+
+function labelKey(labels) {
+  return JSON.stringify(Object.entries(labels).sort(([a], [b]) => (a < b ? -1 : 1)))
+}
+
+class Metric {
+  constructor(name, help, type, { collect } = {}) {
+    this.name = name
+    this.help = help
+    this.type = type
+    this.collect = collect
+    this.series = new Map()
+  }
+
+  entry(labels, create) {
+    const key = labelKey(labels)
+    let entry = this.series.get(key)
+    if (!entry) {
+      entry = { labels, ...create() }
+      this.series.set(key, entry)
+    }
+    return entry
+  }
+
+  samples() {
+    if (this.collect) return this.collect().map(([labels, value]) => `${this.name}${formatLabels(labels)} ${value}`)
+    return [...this.series.values()].map(({ labels, value }) => `${this.name}${formatLabels(labels)} ${value}`)
+  }
+
+  render() {
+    return [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} ${this.type}`, ...this.samples()].join('\n')
+  }
+}
+
+export class Counter extends Metric {
+  constructor(name, help, options) {
+    super(name, help, 'counter', options)
+  }
+
+  inc(labels = {}, value = 1) {
+    this.entry(labels, () => ({ value: 0 })).value += value
+  }
+}
+
+export class Gauge extends Metric {
+  constructor(name, help, options) {
+    super(name, help, 'gauge', options)
+  }
+
+  set(labels, value) {
+    this.entry(labels, () => ({ value: 0 })).value = value
+  }
+
+  inc(labels = {}, value = 1) {
+    this.entry(labels, () => ({ value: 0 })).value += value
+  }
+
+  dec(labels = {}, value = 1) {
+    this.inc(labels, -value)
+  }
+}
+
+export class Histogram extends Metric {
+  constructor(name, help, { buckets = DEFAULT_BUCKETS } = {}) {
+    super(name, help, 'histogram')
+    this.buckets = buckets
+  }
+
+  // value in seconds
+  observe(labels, value) {
+    const entry = this.entry(labels, () => ({ counts: new Array(this.buckets.length).fill(0), sum: 0, count: 0 }))
+    const index = this.buckets.findIndex(bound => value <= bound)
+    if (index !== -1) entry.counts[index]++
+    entry.sum += value
+    entry.count++
+  }
+
+  samples() {
+    const lines = []
+    for (const { labels, counts, sum, count } of this.series.values()) {
+      let cumulative = 0
+      this.buckets.forEach((bound, i) => {
+        cumulative += counts[i]
+        lines.push(`${this.name}_bucket${formatLabels({ ...labels, le: bound })} ${cumulative}`)
+      })
+      lines.push(`${this.name}_bucket${formatLabels({ ...labels, le: '+Inf' })} ${count}`)
+      lines.push(`${this.name}_sum${formatLabels(labels)} ${sum}`)
+      lines.push(`${this.name}_count${formatLabels(labels)} ${count}`)
+    }
+    return lines
+  }
+}
+
+export class Registry {
+  constructor() {
+    this.metrics = new Map()
+  }
+
+  register(metric) {
+    // Registering a name twice returns the metric registered first
+    if (!this.metrics.has(metric.name)) this.metrics.set(metric.name, metric)
+    return this.metrics.get(metric.name)
+  }
+
+  counter(name, help, options) {
+    return this.register(new Counter(name, help, options))
+  }
+
+  gauge(name, help, options) {
+    return this.register(new Gauge(name, help, options))
+  }
+
+  histogram(name, help, options) {
+    return this.register(new Histogram(name, help, options))
+  }
+
+  render() {
+    return [...this.metrics.values()].map(metric => metric.render()).join('\n') + '\n'
+  }
+}
+
+// Process-level gauges, read at scrape time
+export function registerProcessMetrics(registry) {
+  const memory = (field) => () => [[{}, process.memoryUsage()[field]]]
+  registry.gauge('process_resident_memory_bytes', 'Resident set size in bytes', { collect: memory('rss') })
+  registry.gauge('nodejs_heap_used_bytes', 'V8 heap in use in bytes', { collect: memory('heapUsed') })
+  registry.gauge('nodejs_heap_total_bytes', 'V8 heap allocated in bytes', { collect: memory('heapTotal') })
+  registry.gauge('nodejs_external_memory_bytes', 'Memory of C++ objects bound to JS objects in bytes', { collect: memory('external') })
+  registry.gauge('process_uptime_seconds', 'Process uptime in seconds', { collect: () => [[{}, process.uptime()]] })
+  registry.gauge('process_open_fds', 'Open file descriptors (Linux only)', {
+    collect: () => {
+      try {
+        return [[{}, readdirSync('/proc/self/fd').length]]
+      } catch {
+        return []
+      }
+    }
+  })
+}
+
+// Per-request phase timings, rendered as a Server-Timing header
+export class RequestTiming {
+  constructor() {
+    this.startedAt = performance.now()
+    this.phases = new Map()
+  }
+
+  // Repeated phases (e.g. several Mongo reads) accumulate
+  add(name, ms) {
+    this.phases.set(name, (this.phases.get(name) || 0) + ms)
+  }
+
+  async measure(name, fn) {
+    const start = performance.now()
+    try {
+      return await fn()
+    } finally {
+      this.add(name, performance.now() - start)
+    }
+  }
+
+  measureSync(name, fn) {
+    const start = performance.now()
+    try {
+      return fn()
+    } finally {
+      this.add(name, performance.now() - start)
+    }
+  }
+
+  elapsed() {
+    return performance.now() - this.startedAt
+  }
+
+  header() {
+    const entries = [...this.phases].map(([name, ms]) => `${name};dur=${ms.toFixed(1)}`)
+    entries.push(`total;dur=${this.elapsed().toFixed(1)}`)
+    return entries.join(', ')
+  }
+}
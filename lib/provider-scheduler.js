@@ -0,0 +1,125 @@
+// Scheduling of LLM provider attempts
+//
+// sequential -> try providers in order, starting the next one only when the
+//               previous one fails (the original fallback chain)
+// hedged     -> also start the next provider once the current one has been
+//               running longer than its hedge delay (p95 latency by default)
+// race       -> start every provider at once
+//
+// In every mode the first successful answer wins and the other in-flight
+// attempts are aborted. Providers whose circuit breaker is open, or that are
+// at their concurrency limit, are skipped.
+export const SCHEDULING_MODES = ['sequential', 'hedged', 'race']
+
+// Fixed-size window of recent latencies used to derive hedge delays
+export class LatencyTracker {
+  constructor(size = 100) {
+    this.size = size
+    this.samples = []
+  }
+
+  record(ms) {
+    this.samples.push(ms)
+    if (this.samples.length > this.size) this.samples.shift()
+  }
+
+  percentile(p) {
+    if (this.samples.length === 0) return null
+    const sorted = [...this.samples].sort((a, b) => a - b)
+    const index = Math.min(sorted.length - 1, Math.ceil((p / 100) * sorted.length) - 1)
+    return sorted[Math.max(index, 0)]
+  }
+}
+
+export class ProviderTimeoutError extends Error {
+  constructor(provider, timeoutMs) {
+    super(`${provider} did not answer within ${timeoutMs}ms`)
+    this.name = 'ProviderTimeoutError'
+  }
+}
+
+// providers: [{ name, breaker, latency, limiter? }]
+// attempt(provider, signal) -> Promise of the provider's answer
+// Resolves with { provider, value }; rejects with an AggregateError when no provider succeeds.
+export function scheduleProviders(providers, attempt, { mode = 'sequential', timeoutMs = 60000, hedgeDelay = () => 2000 } = {}) {
+  return new Promise((resolve, reject) => {
+    const controllers = new Set()
+    const errors = []
+    let next = 0
+    let inFlight = 0
+    let settled = false
+    let hedgeTimer
+
+    const settle = () => {
+      settled = true
+      clearTimeout(hedgeTimer)
+      for (const controller of controllers) controller.abort()
+    }
+
+    const launchNext = () => {
+      clearTimeout(hedgeTimer)
+      while (next < providers.length) {
+        const provider = providers[next++]
+        if (provider.limiter && !provider.limiter.tryAcquire()) {
+          errors.push(new Error(`${provider.name} skipped: concurrency limit reached`))
+          continue
+        }
+        if (!provider.breaker.allowRequest()) {
+          provider.limiter?.release()
+          errors.push(new Error(`${provider.name} skipped: circuit open`))
+          continue
+        }
+        start(provider)
+        if (mode === 'race') continue
+        if (mode === 'hedged' && next < providers.length) {
+          hedgeTimer = setTimeout(launchNext, hedgeDelay(provider))
+        }
+        return
+      }
+      if (inFlight === 0 && !settled) {
+        settle()
+        reject(new AggregateError(errors, 'All providers failed'))
+      }
+    }
+
+    const start = (provider) => {
+      const controller = new AbortController()
+      const timer = setTimeout(() => controller.abort(new ProviderTimeoutError(provider.name, timeoutMs)), timeoutMs)
+      const startedAt = Date.now()
+      controllers.add(controller)
+      inFlight++
+
+      const done = () => {
+        clearTimeout(timer)
+        controllers.delete(controller)
+        provider.limiter?.release()
+        inFlight--
+      }
+
+      Promise.resolve()
+        .then(() => attempt(provider, controller.signal))
+        .then(value => {
+          done()
+          provider.breaker.recordSuccess()
+          provider.latency.record(Date.now() - startedAt)
+          if (settled) return
+          settle()
+          resolve({ provider, value })
+        }, error => {
+          done()
+          if (settled) {
+            // Lost the race and was cancelled; that says nothing about the provider's health
+            provider.breaker.releaseProbe()
+            return
+          }
+          const reason = controller.signal.aborted && controller.signal.reason ? controller.signal.reason : error
+          provider.breaker.recordFailure()
+          errors.push(reason)
+          console.log(`${provider.name} failed, trying next provider...`, reason.message)
+          launchNext()
+        })
+    }
+
+    launchNext()
+  })
+}
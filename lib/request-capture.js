@@ -0,0 +1,142 @@
+// Request capture: a sanitized JSONL log of API traffic for replay
+//
+// With REQUEST_CAPTURE_PATH set, every API request (except /metrics) is
+// appended to that file as one line once its response headers are ready:
+//   { t, route, method, status, durationMs, bodyBytes, projectType,
+//     messageChars, messageHash, historyLength, sessionKey, newSession,
+//     templateId, unknownTemplate, cache, batchItems, codeChars, codeHash,
+//     query }
+// Only shapes are kept, never prompt or code text: the hashes and
+// sessionKey are salted, so repeated prompts and turns of the same session
+// can be told apart without being readable. Set REQUEST_CAPTURE_SALT to
+// keep them comparable across restarts. backend_test.py's replay mode
+// reads the file.
+import { createHash, randomBytes } from 'crypto'
+import { appendFile } from 'fs/promises'
+import { findTemplate } from './templates.js'
+import { WriteBehindQueue } from './write-behind.js'
+
+const PROJECT_TYPES = new Set(['component', 'frontend', 'backend', 'fullstack'])
+const CONVERSATION_VIEWS = new Set(['summary', 'full'])
+// Upper bounds for recorded numbers, past anything the route accepts
+const MAX_BATCH_CONCURRENCY = 64
+const MAX_PAGE_LIMIT = 1000
+
+function hashValue(salt, value) {
+  return createHash('sha256').update(salt).update(String(value)).digest('hex').slice(0, 16)
+}
+
+// A positive integer no larger than max, or undefined for anything else
+function boundedInt(value, max) {
+  const number = Number(value)
+  return Number.isInteger(number) && number > 0 ? Math.min(number, max) : undefined
+}
+
+function cacheFlags(cache) {
+  if (!cache || typeof cache !== 'object') return undefined
+  const flags = {}
+  for (const key of ['noCache', 'noStore']) if (cache[key]) flags[key] = true
+  // Ages in seconds, as the route reads them
+  for (const key of ['maxAge', 'ttl']) {
+    if (cache[key] !== undefined && Number.isFinite(Number(cache[key]))) flags[key] = Number(cache[key])
+  }
+  return Object.keys(flags).length > 0 ? flags : undefined
+}
+
+// Shape of one generation request; used for /generate, /generate/stream and batch items.
+// Free-form client values are never copied: unknown project types and
+// template ids are only recorded as such, numbers are bounded integers.
+function generationShape(body, salt) {
+  const shape = {}
+  if (body.projectType) shape.projectType = PROJECT_TYPES.has(body.projectType) ? body.projectType : 'other'
+  if (typeof body.message === 'string') {
+    shape.messageChars = body.message.length
+    shape.messageHash = hashValue(salt, body.message)
+  }
+  if (Array.isArray(body.conversationHistory)) shape.historyLength = body.conversationHistory.length
+  if (typeof body.conversationId === 'string') shape.sessionKey = hashValue(salt, body.conversationId)
+  else if (body.newSession === true) shape.newSession = true
+  if (body.templateId !== undefined) {
+    if (findTemplate(body.templateId)) shape.templateId = body.templateId
+    else shape.unknownTemplate = true
+  }
+  const cache = cacheFlags(body.cache)
+  if (cache) shape.cache = cache
+  return shape
+}
+
+// Sanitized record of one request; bodyText is the raw request body (POST only)
+export function captureRecord({ arrivedAt, route, method, status, durationMs, bodyText, searchParams, salt }) {
+  const record = {
+    t: arrivedAt,
+    route,
+    method,
+    status,
+    durationMs: Math.round(durationMs * 10) / 10,
+    bodyBytes: bodyText ? Buffer.byteLength(bodyText) : 0
+  }
+
+  let body = null
+  if (bodyText) {
+    try {
+      body = JSON.parse(bodyText)
+    } catch {
+      record.invalidBody = true
+    }
+  }
+  if (body && typeof body === 'object') {
+    if (route === '/generate' || route === '/generate/stream') {
+      Object.assign(record, generationShape(body, salt))
+    } else if (route === '/generate/batch') {
+      const items = Array.isArray(body.items) ? body.items : []
+      record.batchItems = items.map(item => generationShape(item && typeof item === 'object' ? item : {}, salt))
+      const concurrency = boundedInt(body.concurrency, MAX_BATCH_CONCURRENCY)
+      if (concurrency !== undefined) record.concurrency = concurrency
+      const cache = cacheFlags(body.cache)
+      if (cache) record.cache = cache
+    } else if (route === '/preview' && typeof body.code === 'string') {
+      record.codeChars = body.code.length
+      record.codeHash = hashValue(salt, body.code)
+    }
+  }
+
+  if (route === '/conversations' && searchParams) {
+    const query = {}
+    if (searchParams.has('view')) {
+      const view = searchParams.get('view')
+      query.view = CONVERSATION_VIEWS.has(view) ? view : 'other'
+    }
+    const limit = boundedInt(searchParams.get('limit'), MAX_PAGE_LIMIT)
+    if (limit !== undefined) query.limit = limit
+    if (searchParams.has('before')) query.paged = true
+    if (Object.keys(query).length > 0) record.query = query
+  }
+  return record
+}
+
+// Buffered appender: records are batched like the other write-behind queues
+// and dropped, rather than delaying requests, when the file cannot keep up
+export class RequestCapture extends WriteBehindQueue {
+  constructor(path, { salt, ...options } = {}) {
+    super('request_capture', {
+      ...options,
+      flush: records => appendFile(path, records.map(record => JSON.stringify(record)).join('\n') + '\n')
+    })
+    this.path = path
+    this.salt = salt || randomBytes(16).toString('hex')
+  }
+
+  record(entry) {
+    if (this.buffer.length >= this.maxBuffered) {
+      this.stats.dropped++
+      return
+    }
+    this.enqueue(captureRecord({ ...entry, salt: this.salt }))
+  }
+}
+
+// Capture configured by the environment; null unless REQUEST_CAPTURE_PATH is set
+export function createRequestCapture(env, options = {}) {
+  if (!env.REQUEST_CAPTURE_PATH) return null
+  return new RequestCapture(env.REQUEST_CAPTURE_PATH, { ...options, salt: env.REQUEST_CAPTURE_SALT })
+}
@@ -0,0 +1,115 @@
+import { createHash } from 'crypto'
+
+// Whitespace- and case-insensitive form of a prompt used for cache keys
+function normalizeText(text) {
+  return String(text || '').trim().replace(/\s+/g, ' ').toLowerCase()
+}
+
+// Stable hash of a generation request: message, projectType and the
+// context messages ({ role, content }) actually sent to the provider
+export function generationCacheKey(message, projectType, contextMessages = []) {
+  const normalized = [
+    normalizeText(message),
+    projectType,
+    contextMessages.map(msg => [msg.role, normalizeText(msg.content)])
+  ]
+  return createHash('sha256').update(JSON.stringify(normalized)).digest('hex')
+}
+
+// In-process LRU bounded by entry count, with a TTL per entry
+export class LruCache {
+  constructor({ maxEntries = 500 } = {}) {
+    this.maxEntries = maxEntries
+    this.entries = new Map()
+  }
+
+  get(key, now = Date.now()) {
+    const entry = this.entries.get(key)
+    if (!entry) return undefined
+    if (entry.expiresAt <= now) {
+      this.entries.delete(key)
+      return undefined
+    }
+    // Re-insert to mark as most recently used
+    this.entries.delete(key)
+    this.entries.set(key, entry)
+    return entry
+  }
+
+  set(key, value, ttlMs, now = Date.now(), createdAt = now) {
+    this.entries.delete(key)
+    this.entries.set(key, { value, createdAt, expiresAt: now + ttlMs })
+    while (this.entries.size > this.maxEntries) {
+      this.entries.delete(this.entries.keys().next().value)
+    }
+  }
+
+  delete(key) {
+    this.entries.delete(key)
+  }
+
+  get size() {
+    return this.entries.size
+  }
+}
+
+// Two-tier cache: in-process LRU in front of a shared store.
+// store.get(key, now) resolves to an unexpired { key, value, createdAt, expiresAt }
+// entry or null; store.set(entry) writes one.
+export class ResponseCache {
+  constructor({ maxEntries = 500, ttlMs = 3600000, store }) {
+    this.ttlMs = ttlMs
+    this.memory = new LruCache({ maxEntries })
+    this.store = store
+    this.stats = { hits: { memory: 0, shared: 0 }, misses: 0, writes: 0, errors: 0 }
+  }
+
+  // Returns { value, tier, createdAt } or null. maxAgeMs rejects entries older than that.
+  async get(key, { maxAgeMs } = {}) {
+    const now = Date.now()
+    const fresh = createdAt => maxAgeMs === undefined || now - createdAt <= maxAgeMs
+
+    const entry = this.memory.get(key, now)
+    if (entry && fresh(entry.createdAt)) {
+      this.stats.hits.memory++
+      return { value: entry.value, tier: 'memory', createdAt: entry.createdAt }
+    }
+
+    try {
+      const doc = await this.store.get(key, new Date(now))
+      if (doc && fresh(doc.createdAt.getTime())) {
+        this.memory.set(key, doc.value, doc.expiresAt.getTime() - now, now, doc.createdAt.getTime())
+        this.stats.hits.shared++
+        return { value: doc.value, tier: 'shared', createdAt: doc.createdAt.getTime() }
+      }
+    } catch (error) {
+      this.stats.errors++
+      console.error('Erro ao ler cache de respostas:', error)
+    }
+
+    this.stats.misses++
+    return null
+  }
+
+  async set(key, value, ttlMs = this.ttlMs) {
+    const now = Date.now()
+    this.memory.set(key, value, ttlMs, now)
+    this.stats.writes++
+    try {
+      await this.store.set({ key, value, createdAt: new Date(now), expiresAt: new Date(now + ttlMs) })
+    } catch (error) {
+      this.stats.errors++
+      console.error('Erro ao salvar cache de respostas:', error)
+    }
+  }
+
+  snapshot() {
+    const hits = this.stats.hits.memory + this.stats.hits.shared
+    const lookups = hits + this.stats.misses
+    return {
+      ...this.stats,
+      hitRate: lookups ? hits / lookups : 0,
+      memoryEntries: this.memory.size
+    }
+  }
+}
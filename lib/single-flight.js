@@ -0,0 +1,50 @@
+// Coalescing of identical in-flight calls
+//
+// run(key, fn) calls fn() unless a call for the same key is already in
+// flight, in which case it waits for that call's result instead. Only the
+// waiters that joined an existing call get a timeout: giving up does not
+// cancel the shared call, which still settles for everyone else.
+export class SingleFlightTimeoutError extends Error {
+  constructor(timeoutMs) {
+    super(`Coalesced request did not complete within ${timeoutMs}ms`)
+    this.name = 'SingleFlightTimeoutError'
+  }
+}
+
+export class SingleFlight {
+  constructor({ waitTimeoutMs = 0 } = {}) {
+    this.waitTimeoutMs = waitTimeoutMs
+    this.calls = new Map()
+    this.stats = { leaders: 0, coalesced: 0, timeouts: 0 }
+  }
+
+  // Resolves with { value, shared }; shared is true for waiters that joined an existing call
+  async run(key, fn) {
+    const inFlight = this.calls.get(key)
+    if (inFlight) {
+      this.stats.coalesced++
+      return { value: await this.wait(inFlight), shared: true }
+    }
+
+    const call = Promise.resolve().then(fn).finally(() => this.calls.delete(key))
+    this.calls.set(key, call)
+    this.stats.leaders++
+    return { value: await call, shared: false }
+  }
+
+  wait(call) {
+    if (!this.waitTimeoutMs) return call
+    let timer
+    const timeout = new Promise((_, reject) => {
+      timer = setTimeout(() => {
+        this.stats.timeouts++
+        reject(new SingleFlightTimeoutError(this.waitTimeoutMs))
+      }, this.waitTimeoutMs)
+    })
+    return Promise.race([call, timeout]).finally(() => clearTimeout(timer))
+  }
+
+  snapshot() {
+    return { ...this.stats, inFlight: this.calls.size }
+  }
+}
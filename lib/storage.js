@@ -0,0 +1,375 @@
+import { MongoClient } from 'mongodb'
+
+// Storage backends for the API's persistent data
+//
+// Both backends implement the same async interface:
+//   conversations     insertConversations(docs), listConversations({ limit, before, summary }),
+//                     getConversation(id)
+//   previews          upsertPreviews(docs), getPreview(id)
+//   sessions          insertSessionTurns(docs), loadSession(sessionId, { limit }),
+//                     touchSession(sessionId, at),
+//                     updateSessionSummary(sessionId, summary, summarizedThrough)
+//   templates         getTemplateGeneration(templateId, promptHash), putTemplateGeneration(doc)
+//   response cache    getCachedResponse(key, now), putCachedResponse(entry)
+//
+// STORAGE_BACKEND=memory keeps everything in process (nothing survives a
+// restart, and retention does not apply); it exists to measure the API
+// without a database round trip.
+export const STORAGE_BACKENDS = ['mongo', 'memory']
+
+// Summary view of a conversation: enough to render a history list
+const SUMMARY_PROJECTION = { _id: 0, id: 1, message: 1, projectType: 1, 'result.model': 1, timestamp: 1 }
+
+function isDuplicateKeyOnly(error) {
+  const writeErrors = error.writeErrors || []
+  return error.code === 11000 || (writeErrors.length > 0 && writeErrors.every(e => e.code === 11000))
+}
+
+// Keyset filter for conversations strictly older than the cursor position
+function beforeFilter(before) {
+  return before ? {
+    $or: [
+      { timestamp: { $lt: before.timestamp } },
+      { timestamp: before.timestamp, id: { $lt: before.id } }
+    ]
+  } : {}
+}
+
+// Collections with a retention TTL, and the date field it is keyed on.
+// Previews are content-addressed and re-posted while in use, so they expire
+// by lastUsedAt (refreshed by POST /preview); sessions by their last update.
+export const RETENTION_FIELDS = {
+  conversations: 'timestamp',
+  previews: 'lastUsedAt',
+  sessions: 'updatedAt',
+  session_turns: 'timestamp'
+}
+export const RETENTION_COLLECTIONS = Object.keys(RETENTION_FIELDS)
+const RETENTION_INDEX = 'retention_ttl'
+
+export class MongoStorage {
+  // instrument(operation, fn) wraps the connect so it can be timed by the caller.
+  // retention maps a collection to the seconds after which Mongo deletes its
+  // documents (0 keeps them forever).
+  constructor({ url, dbName, clientOptions = {}, retention = {}, instrument = (operation, fn) => fn() }) {
+    this.name = 'mongo'
+    this.url = url
+    this.dbName = dbName
+    this.clientOptions = clientOptions
+    this.retention = retention
+    this.instrument = instrument
+    this.client = null
+    this.connecting = null
+  }
+
+  // Connects on first use; concurrent cold starts share one connect promise
+  db() {
+    if (!this.connecting) {
+      this.connecting = (async () => {
+        const client = new MongoClient(this.url, this.clientOptions)
+        await this.instrument('connect', () => client.connect())
+        this.client = client
+        const db = client.db(this.dbName)
+        await this.ensureIndexes(db)
+        return db
+      })().catch(error => {
+        // Let the next request retry instead of caching the failure
+        this.connecting = null
+        throw error
+      })
+    }
+    return this.connecting
+  }
+
+  async collection(name) {
+    return (await this.db()).collection(name)
+  }
+
+  // createIndex is a no-op when the index already exists
+  async ensureIndexes(db) {
+    try {
+      await Promise.all([
+        db.collection('conversations').createIndex({ timestamp: -1, id: -1 }),
+        db.collection('conversations').createIndex({ id: 1 }, { unique: true }),
+        db.collection('previews').createIndex({ id: 1 }, { unique: true }),
+        db.collection('sessions').createIndex({ id: 1 }, { unique: true }),
+        db.collection('session_turns').createIndex({ sessionId: 1, timestamp: -1 }),
+        db.collection('session_turns').createIndex({ id: 1 }, { unique: true }),
+        db.collection('template_generations').createIndex({ templateId: 1 }, { unique: true }),
+        db.collection('generation_cache').createIndex({ key: 1 }, { unique: true }),
+        db.collection('generation_cache').createIndex({ expiresAt: 1 }, { expireAfterSeconds: 0 }),
+        ...RETENTION_COLLECTIONS.map(name => this.ensureRetentionIndex(db, name, this.retention[name] || 0))
+      ])
+    } catch (error) {
+      console.error('Erro ao criar índices:', error)
+    }
+  }
+
+  // Create, retune (collMod) or drop the TTL index so it matches the configured retention
+  async ensureRetentionIndex(db, name, seconds) {
+    const collection = db.collection(name)
+    const field = RETENTION_FIELDS[name]
+    let existing
+    try {
+      existing = (await collection.indexes()).find(index => index.name === RETENTION_INDEX)
+    } catch (error) {
+      // NamespaceNotFound: the collection does not exist yet
+      if (error.code !== 26) throw error
+    }
+
+    // An index on another field (previews used to expire by timestamp) is rebuilt
+    if (existing && !(field in existing.key)) {
+      await collection.dropIndex(RETENTION_INDEX)
+      existing = null
+    }
+
+    if (!seconds) {
+      if (existing) await collection.dropIndex(RETENTION_INDEX)
+    } else if (!existing) {
+      // Documents written before the field existed would never expire: start them at their timestamp
+      if (field !== 'timestamp') {
+        await collection.updateMany({ [field]: { $exists: false } }, [{ $set: { [field]: '$timestamp' } }])
+      }
+      await collection.createIndex({ [field]: 1 }, { name: RETENTION_INDEX, expireAfterSeconds: seconds })
+    } else if (existing.expireAfterSeconds !== seconds) {
+      await db.command({ collMod: name, index: { name: RETENTION_INDEX, expireAfterSeconds: seconds } })
+    }
+  }
+
+  async insertMany(collectionName, docs) {
+    if (docs.length === 0) return
+    const collection = await this.collection(collectionName)
+    try {
+      await collection.insertMany(docs, { ordered: false })
+    } catch (error) {
+      // A retried batch may have been partially written already
+      if (!isDuplicateKeyOnly(error)) throw error
+    }
+  }
+
+  insertConversations(docs) {
+    return this.insertMany('conversations', docs)
+  }
+
+  async listConversations({ limit, before, summary }) {
+    const collection = await this.collection('conversations')
+    return collection
+      .find(beforeFilter(before), { projection: summary ? SUMMARY_PROJECTION : { _id: 0 } })
+      .sort({ timestamp: -1, id: -1 })
+      .limit(limit)
+      .toArray()
+  }
+
+  async getConversation(id) {
+    const collection = await this.collection('conversations')
+    return collection.findOne({ id }, { projection: { _id: 0 } })
+  }
+
+  // Previews are content-addressed, so duplicates collapse to one document;
+  // a repeated upsert only moves lastUsedAt forward
+  async upsertPreviews(docs) {
+    if (docs.length === 0) return
+    const collection = await this.collection('previews')
+    try {
+      await collection.bulkWrite(docs.map(({ lastUsedAt, ...doc }) => ({
+        updateOne: { filter: { id: doc.id }, update: { $setOnInsert: doc, $max: { lastUsedAt } }, upsert: true }
+      })), { ordered: false })
+    } catch (error) {
+      // Two instances racing to insert the same preview
+      if (!isDuplicateKeyOnly(error)) throw error
+    }
+  }
+
+  async getPreview(id) {
+    const collection = await this.collection('previews')
+    return collection.findOne({ id })
+  }
+
+  insertSessionTurns(docs) {
+    return this.insertMany('session_turns', docs)
+  }
+
+  // Newest `limit` turns (newest first) and the session document
+  async loadSession(sessionId, { limit }) {
+    const db = await this.db()
+    const [session, turns] = await Promise.all([
+      db.collection('sessions').findOne({ id: sessionId }, { projection: { _id: 0 } }),
+      db.collection('session_turns')
+        .find({ sessionId }, { projection: { _id: 0 } })
+        .sort({ timestamp: -1 })
+        .limit(limit)
+        .toArray()
+    ])
+    return { session, turns }
+  }
+
+  // Keeps an active session's document from expiring while its summary is unchanged
+  async touchSession(sessionId, at) {
+    const collection = await this.collection('sessions')
+    await collection.updateOne({ id: sessionId }, { $max: { updatedAt: at } })
+  }
+
+  // Only moves the summary forward; a concurrent update that summarized further wins
+  async updateSessionSummary(sessionId, summary, summarizedThrough) {
+    const collection = await this.collection('sessions')
+    try {
+      await collection.updateOne(
+        { id: sessionId, $or: [{ summarizedThrough: { $lt: summarizedThrough } }, { summarizedThrough: { $exists: false } }] },
+        { $set: { summary, summarizedThrough, updatedAt: new Date() } },
+        { upsert: true }
+      )
+    } catch (error) {
+      if (!isDuplicateKeyOnly(error)) throw error
+    }
+  }
+
+  async getTemplateGeneration(templateId, promptHash) {
+    const collection = await this.collection('template_generations')
+    return collection.findOne({ templateId, promptHash }, { projection: { _id: 0 } })
+  }
+
+  async putTemplateGeneration(doc) {
+    const collection = await this.collection('template_generations')
+    await collection.updateOne({ templateId: doc.templateId }, { $set: doc }, { upsert: true })
+  }
+
+  async getCachedResponse(key, now) {
+    const collection = await this.collection('generation_cache')
+    return collection.findOne({ key, expiresAt: { $gt: now } })
+  }
+
+  async putCachedResponse(entry) {
+    const collection = await this.collection('generation_cache')
+    await collection.updateOne({ key: entry.key }, { $set: entry }, { upsert: true })
+  }
+}
+
+function compareNewestFirst(a, b) {
+  return (b.timestamp - a.timestamp) || (a.id < b.id ? 1 : a.id > b.id ? -1 : 0)
+}
+
+// In-process backend with the same semantics as MongoStorage
+export class MemoryStorage {
+  constructor() {
+    this.name = 'memory'
+    this.conversations = new Map()
+    this.previews = new Map()
+    this.sessions = new Map()
+    this.sessionTurns = new Map()
+    this.templateGenerations = new Map()
+    this.responses = new Map()
+  }
+
+  async insertConversations(docs) {
+    for (const doc of docs) {
+      if (!this.conversations.has(doc.id)) this.conversations.set(doc.id, doc)
+    }
+  }
+
+  async listConversations({ limit, before }) {
+    return [...this.conversations.values()]
+      .filter(doc => !before || compareNewestFirst(before, doc) < 0)
+      .sort(compareNewestFirst)
+      .slice(0, limit)
+  }
+
+  async getConversation(id) {
+    return this.conversations.get(id) || null
+  }
+
+  async upsertPreviews(docs) {
+    for (const doc of docs) {
+      const existing = this.previews.get(doc.id)
+      if (!existing) {
+        this.previews.set(doc.id, doc)
+      } else if (doc.lastUsedAt > existing.lastUsedAt) {
+        existing.lastUsedAt = doc.lastUsedAt
+      }
+    }
+  }
+
+  async getPreview(id) {
+    return this.previews.get(id) || null
+  }
+
+  async insertSessionTurns(docs) {
+    for (const doc of docs) {
+      const turns = this.sessionTurns.get(doc.sessionId) || []
+      if (!turns.some(turn => turn.id === doc.id)) turns.push(doc)
+      this.sessionTurns.set(doc.sessionId, turns)
+    }
+  }
+
+  async loadSession(sessionId, { limit }) {
+    const turns = [...(this.sessionTurns.get(sessionId) || [])]
+      .sort((a, b) => b.timestamp - a.timestamp)
+      .slice(0, limit)
+    return { session: this.sessions.get(sessionId) || null, turns }
+  }
+
+  async touchSession(sessionId, at) {
+    const session = this.sessions.get(sessionId)
+    if (session && session.updatedAt < at) session.updatedAt = at
+  }
+
+  async updateSessionSummary(sessionId, summary, summarizedThrough) {
+    const session = this.sessions.get(sessionId)
+    if (session && session.summarizedThrough >= summarizedThrough) return
+    this.sessions.set(sessionId, { id: sessionId, summary, summarizedThrough, updatedAt: new Date() })
+  }
+
+  async getTemplateGeneration(templateId, promptHash) {
+    const doc = this.templateGenerations.get(templateId)
+    return doc && doc.promptHash === promptHash ? doc : null
+  }
+
+  async putTemplateGeneration(doc) {
+    this.templateGenerations.set(doc.templateId, doc)
+  }
+
+  async getCachedResponse(key, now) {
+    const entry = this.responses.get(key)
+    if (!entry) return null
+    if (entry.expiresAt <= now) {
+      this.responses.delete(key)
+      return null
+    }
+    return entry
+  }
+
+  async putCachedResponse(entry) {
+    this.responses.set(entry.key, entry)
+  }
+}
+
+// TTL per collection: RETENTION_<COLLECTION>_DAYS (e.g. RETENTION_SESSION_TURNS_DAYS)
+// plus RETENTION_GRACE_DAYS.
+// The grace period leaves the archival job (retention.py) time to copy
+// expired documents to disk before Mongo deletes them.
+export function retentionSeconds(env = process.env) {
+  const graceDays = Number(env.RETENTION_GRACE_DAYS || 7)
+  return Object.fromEntries(RETENTION_COLLECTIONS.map(name => {
+    const days = Number(env[`RETENTION_${name.toUpperCase()}_DAYS`] || 0)
+    return [name, days > 0 ? Math.round((days + graceDays) * 86400) : 0]
+  }))
+}
+
+// Backend selected by STORAGE_BACKEND (default mongo). Pool and timeout
+// settings are explicit so a slow or unreachable database fails fast.
+export function createStorage(env = process.env, { instrument } = {}) {
+  if (env.STORAGE_BACKEND === 'memory') return new MemoryStorage()
+  return new MongoStorage({
+    url: env.MONGO_URL,
+    dbName: env.DB_NAME,
+    retention: retentionSeconds(env),
+    instrument,
+    clientOptions: {
+      maxPoolSize: Number(env.MONGO_MAX_POOL_SIZE || 20),
+      minPoolSize: Number(env.MONGO_MIN_POOL_SIZE || 0),
+      maxIdleTimeMS: Number(env.MONGO_MAX_IDLE_MS || 60000),
+      serverSelectionTimeoutMS: Number(env.MONGO_SERVER_SELECTION_TIMEOUT_MS || 5000),
+      connectTimeoutMS: Number(env.MONGO_CONNECT_TIMEOUT_MS || 5000),
+      socketTimeoutMS: Number(env.MONGO_SOCKET_TIMEOUT_MS || 30000),
+    }
+  })
+}
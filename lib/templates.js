@@ -0,0 +1,56 @@
+import { createHash } from 'crypto'
+
+// Project templates offered by /api/templates. `prompt` is what gets sent to
+// the providers when a template's code is (re)generated; it is not exposed.
+export const TEMPLATES = [
+  {
+    id: 'todo-app',
+    name: 'Aplicação de Tarefas',
+    description: 'Um app completo de tarefas com operações CRUD',
+    type: 'fullstack',
+    tags: ['React', 'Node.js', 'MongoDB'],
+    prompt: 'Crie uma aplicação de tarefas completa com React no frontend e uma API Node.js/Express com MongoDB no backend, com operações para criar, listar, concluir e excluir tarefas.'
+  },
+  {
+    id: 'dashboard',
+    name: 'Dashboard de Analytics',
+    description: 'Dashboard com gráficos e visualização de dados',
+    type: 'frontend',
+    tags: ['React', 'Gráficos', 'Tailwind'],
+    prompt: 'Crie um dashboard de analytics em React com Tailwind CSS, com cards de métricas, um gráfico de linhas e um gráfico de barras usando dados de exemplo.'
+  },
+  {
+    id: 'landing-page',
+    name: 'Landing Page SaaS',
+    description: 'Landing page moderna com seção hero e recursos',
+    type: 'frontend',
+    tags: ['React', 'Tailwind', 'Responsivo'],
+    prompt: 'Crie uma landing page responsiva para um produto SaaS em React com Tailwind CSS, com seção hero, lista de recursos, planos de preço e rodapé.'
+  },
+  {
+    id: 'chat-app',
+    name: 'Chat em Tempo Real',
+    description: 'Aplicação de chat com mensagens em tempo real',
+    type: 'fullstack',
+    tags: ['React', 'Socket.io', 'MongoDB'],
+    prompt: 'Crie uma aplicação de chat em tempo real com React no frontend e um servidor Node.js com Socket.io e MongoDB para salvar o histórico de mensagens.'
+  },
+  {
+    id: 'blog-platform',
+    name: 'Plataforma de Blog',
+    description: 'Blog com suporte a markdown e CMS',
+    type: 'fullstack',
+    tags: ['React', 'Markdown', 'CMS'],
+    prompt: 'Crie uma plataforma de blog com React no frontend, renderização de posts em markdown e uma API Node.js/Express com MongoDB para criar e editar posts.'
+  }
+]
+
+export function findTemplate(id) {
+  return TEMPLATES.find(template => template.id === id) || null
+}
+
+// Identifies the prompt a stored generation was made from, so editing a
+// template's prompt invalidates its stored code
+export function templatePromptHash(template) {
+  return createHash('sha256').update(`${template.type}\n${template.prompt}`).digest('hex')
+}
@@ -0,0 +1,129 @@
+// Write-behind buffer that batches documents into bulk writes
+//
+// enqueue() returns as soon as the document is buffered; a flush runs once
+// `maxBatch` documents are waiting or `flushIntervalMs` has passed. When
+// `maxBuffered` documents are waiting (the database is slower than the
+// request rate), enqueue() waits for a flush to make room. Buffered and
+// in-flight documents stay readable through find() and pending(). A batch
+// that still fails after `maxRetries` is dropped and passed to onDrop.
+export class WriteBehindQueue {
+  constructor(name, { flush, onDrop, maxBatch = 100, flushIntervalMs = 250, maxBuffered = 5000, maxRetries = 3 }) {
+    this.name = name
+    this.flushBatch = flush
+    this.onDrop = onDrop
+    this.maxBatch = maxBatch
+    this.flushIntervalMs = flushIntervalMs
+    this.maxBuffered = maxBuffered
+    this.maxRetries = maxRetries
+    this.buffer = []
+    this.inFlight = []
+    this.timer = null
+    this.flushing = null
+    this.failures = 0
+    this.drainWaiters = []
+    this.stats = { enqueued: 0, flushed: 0, batches: 0, failures: 0, dropped: 0, backpressureWaits: 0 }
+  }
+
+  async enqueue(doc) {
+    while (this.buffer.length >= this.maxBuffered) {
+      this.stats.backpressureWaits++
+      this.runFlush()
+      await new Promise(resolve => this.drainWaiters.push(resolve))
+    }
+    this.buffer.push(doc)
+    this.stats.enqueued++
+    this.scheduleFlush()
+  }
+
+  // Documents not yet confirmed by the database, oldest first
+  pending() {
+    return [...this.inFlight, ...this.buffer]
+  }
+
+  find(predicate) {
+    return this.buffer.find(predicate) || this.inFlight.find(predicate)
+  }
+
+  scheduleFlush() {
+    if (this.flushing) return
+    if (this.buffer.length >= this.maxBatch) {
+      this.runFlush()
+    } else if (!this.timer && this.buffer.length > 0) {
+      this.timer = setTimeout(() => {
+        this.timer = null
+        this.runFlush()
+      }, this.flushIntervalMs)
+      this.timer.unref?.()
+    }
+  }
+
+  runFlush({ all = false } = {}) {
+    if (this.flushing) return this.flushing
+    clearTimeout(this.timer)
+    this.timer = null
+
+    this.flushing = (async () => {
+      while (this.buffer.length > 0) {
+        const batch = this.buffer.splice(0, this.maxBatch)
+        this.inFlight = batch
+        try {
+          await this.flushBatch(batch)
+          this.failures = 0
+          this.stats.flushed += batch.length
+          this.stats.batches++
+        } catch (error) {
+          this.stats.failures++
+          if (++this.failures <= this.maxRetries) {
+            console.error(`Falha ao gravar lote de ${this.name}, tentando novamente:`, error.message)
+            this.buffer.unshift(...batch)
+            await new Promise(resolve => setTimeout(resolve, Math.min(100 * 2 ** this.failures, 5000)))
+          } else {
+            console.error(`Descartando lote de ${batch.length} documento(s) de ${this.name}:`, error)
+            this.failures = 0
+            this.stats.dropped += batch.length
+            this.onDrop?.(batch)
+          }
+        } finally {
+          this.inFlight = []
+        }
+
+        this.drainWaiters.splice(0).forEach(resolve => resolve())
+        // A partial batch waits for the timer unless we are draining
+        if (!all && this.buffer.length < this.maxBatch) break
+      }
+    })().finally(() => {
+      this.flushing = null
+      this.drainWaiters.splice(0).forEach(resolve => resolve())
+      this.scheduleFlush()
+    })
+
+    return this.flushing
+  }
+
+  // Flush everything buffered, e.g. before shutdown
+  async drain() {
+    while (this.buffer.length > 0 || this.flushing) {
+      await this.runFlush({ all: true })
+    }
+  }
+
+  snapshot() {
+    return { ...this.stats, buffered: this.buffer.length, inFlight: this.inFlight.length }
+  }
+}
+
+// Drain the queues when the process is shutting down
+export function flushOnShutdown(queues) {
+  const drainAll = () => Promise.all(queues.map(queue => queue.drain())).catch(error => {
+    console.error('Erro ao esvaziar filas de escrita no encerramento:', error)
+  })
+
+  process.once('beforeExit', drainAll)
+  for (const signal of ['SIGTERM', 'SIGINT']) {
+    process.once(signal, async () => {
+      await drainAll()
+      // Re-raise for the default handler unless someone else handles the signal
+      if (process.listenerCount(signal) === 0) process.kill(process.pid, signal)
+    })
+  }
+}
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for extracting code from LLM responses
+Feeds large responses to lib/code-parser.js under Node and compares its
+throughput with the regex pipeline generateCode() used before it (a global
+```-block match, two replaces per block and a split for the explanation).
+The parser is measured both on the whole response and fed in small chunks,
+as it is while streaming.
+
+Responses are read from --responses (text/markdown files, or .jsonl/.json
+with a "response" or "text" field per record); without it, --count
+synthetic multi-file responses of --size-kb each are generated from --seed.
+
+    python parser_benchmark.py --size-kb 512 --iterations 20
+    python parser_benchmark.py --responses recorded/*.jsonl --json parser.json
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Runs inside Node; argv[1] is the parser module, argv[2] the input JSON file
+NODE_HARNESS = r"""
+import { readFileSync } from 'fs'
+import { pathToFileURL } from 'url'
+
+const { FencedBlockParser, parseFencedBlocks } = await import(pathToFileURL(process.argv[1]).href)
+const { responses, iterations, chunkSize } = JSON.parse(readFileSync(process.argv[2], 'utf8'))
+
+// The extraction generateCode() used before the incremental parser
+function regexPipeline(response) {
+  const codeBlocks = response.match(/```[\s\S]*?```/g) || []
+  const code = codeBlocks.length > 0 ?
+    codeBlocks.map(block => block.replace(/```[\w]*\n?/, '').replace(/\n?```$/, '')).join('\n\n') :
+    ''
+  const explanation = response.split('```')[0].trim()
+  return { explanation, code, blocks: codeBlocks.length }
+}
+
+function parserWhole(response) {
+  const { explanation, blocks } = parseFencedBlocks(response)
+  return { explanation, code: blocks.map(block => block.content).join('\n\n'), blocks: blocks.length }
+}
+
+function parserChunked(response) {
+  const parser = new FencedBlockParser()
+  for (let i = 0; i < response.length; i += chunkSize) parser.push(response.slice(i, i + chunkSize))
+  parser.end()
+  const { explanation, blocks } = parser.result()
+  return { explanation, code: blocks.map(block => block.content).join('\n\n'), blocks: blocks.length }
+}
+
+const pipelines = { regex: regexPipeline, parser: parserWhole, parser_chunked: parserChunked }
+const bytes = responses.reduce((total, response) => total + Buffer.byteLength(response), 0)
+const results = {}
+
+for (const [name, run] of Object.entries(pipelines)) {
+  for (const response of responses) run(response)  // warm up
+  const samples = []
+  for (let i = 0; i < iterations; i++) {
+    const started = process.hrtime.bigint()
+    for (const response of responses) run(response)
+    samples.push(Number(process.hrtime.bigint() - started) / 1e6)
+  }
+  results[name] = { samples_ms: samples, blocks: responses.map(response => run(response).blocks) }
+}
+
+// Responses where the parser's joined code differs from the regex pipeline's
+const mismatches = responses.filter(response => {
+  const a = regexPipeline(response)
+  const b = parserWhole(response)
+  return a.code !== b.code || a.explanation !== b.explanation
+}).length
+
+console.log(JSON.stringify({ bytes, results, mismatches }))
+"""
+
+PROSE = [
+    'Vou criar uma aplicação completa com frontend React e backend Node.js/Express.',
+    'O componente abaixo usa hooks para controlar o estado da lista.',
+    'Este arquivo define as rotas da API e a conexão com o MongoDB.',
+    'Ajuste as variáveis de ambiente antes de iniciar o servidor.',
+    'A validação de entrada evita que dados inválidos cheguem ao banco.',
+]
+FILES = [
+    ('frontend/src/App.jsx', 'jsx'),
+    ('frontend/src/components/TodoList.jsx', 'jsx'),
+    ('backend/server.js', 'javascript'),
+    ('backend/models/Todo.js', 'javascript'),
+    ('backend/routes/todos.js', 'javascript'),
+    ('frontend/src/index.css', 'css'),
+]
+CODE_LINES = [
+    "const [items, setItems] = useState([])",
+    "app.get('/api/todos', async (req, res) => res.json(await Todo.find()))",
+    "  return <li className=\"p-2 border-b\">{item.title} — concluída: {String(item.done)}</li>",
+    "const TodoSchema = new mongoose.Schema({ title: String, done: Boolean })",
+    "// Atualiza a lista após criar uma nova tarefa",
+    "if (!req.body.title) return res.status(400).json({ error: 'Título obrigatório' })",
+    ".card { padding: 1rem; border-radius: 0.5rem; }",
+]
+
+
+def synthetic_response(rng, size_bytes):
+    """A fullstack-style answer: prose, then labelled code blocks until size_bytes"""
+    parts = [rng.choice(PROSE), '']
+    size = 0
+    while size < size_bytes:
+        filename, language = rng.choice(FILES)
+        parts.append(f"### {filename}")
+        parts.append(f"```{language}")
+        for _ in range(rng.randint(20, 120)):
+            parts.append(' ' * rng.choice((0, 2, 4)) + rng.choice(CODE_LINES))
+        parts.append('```')
+        parts.append('')
+        parts.append(rng.choice(PROSE))
+        parts.append('')
+        size = sum(len(part.encode()) + 1 for part in parts)
+    return '\n'.join(parts)
+
+
+def load_responses(paths):
+    """Read recorded responses from text files or JSON/JSONL records"""
+    responses = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            if path.endswith('.jsonl'):
+                records = [json.loads(line) for line in f if line.strip()]
+            elif path.endswith('.json'):
+                data = json.load(f)
+                records = data if isinstance(data, list) else [data]
+            else:
+                responses.append(f.read())
+                continue
+        for record in records:
+            text = record if isinstance(record, str) else record.get('response') or record.get('text')
+            if text:
+                responses.append(text)
+    return responses
+
+
+def run_benchmark(responses, iterations=10, chunk_size=16, node='node'):
+    """Run the Node harness and return throughput per pipeline"""
+    workdir = tempfile.mkdtemp(prefix='parser-bench-')
+    try:
+        # Copied to .mjs so Node loads it as an ES module whatever package.json says
+        module_path = os.path.join(workdir, 'code-parser.mjs')
+        shutil.copy(os.path.join(ROOT, 'lib', 'code-parser.js'), module_path)
+        input_path = os.path.join(workdir, 'input.json')
+        with open(input_path, 'w', encoding='utf-8') as f:
+            json.dump({'responses': responses, 'iterations': iterations, 'chunkSize': chunk_size}, f)
+
+        completed = subprocess.run(
+            [node, '--no-warnings', '--input-type=module', '-e', NODE_HARNESS, module_path, input_path],
+            capture_output=True, text=True, check=True
+        )
+        raw = json.loads(completed.stdout)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    mb = raw['bytes'] / 1e6
+    report = {'responses': len(responses), 'bytes': raw['bytes'], 'iterations': iterations,
+              'chunk_size': chunk_size, 'mismatches': raw['mismatches'], 'pipelines': {}}
+    for name, result in raw['results'].items():
+        samples = result['samples_ms']
+        median = statistics.median(samples)
+        report['pipelines'][name] = {
+            'median_ms': median,
+            'min_ms': min(samples),
+            'max_ms': max(samples),
+            'mb_per_s': mb / (median / 1000) if median else float('inf'),
+            'blocks': sum(result['blocks']),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"📄 {report['responses']} response(s), {report['bytes'] / 1e6:.2f} MB, "
+          f"{report['iterations']} iteration(s), chunk size {report['chunk_size']}")
+    print(f"{'pipeline':<16}{'median ms':>12}{'min ms':>10}{'max ms':>10}{'MB/s':>10}{'blocks':>9}")
+    for name, stats in report['pipelines'].items():
+        print(f"{name:<16}{stats['median_ms']:>12.2f}{stats['min_ms']:>10.2f}{stats['max_ms']:>10.2f}"
+              f"{stats['mb_per_s']:>10.1f}{stats['blocks']:>9}")
+    regex = report['pipelines']['regex']['median_ms']
+    for name in ('parser', 'parser_chunked'):
+        parser = report['pipelines'][name]['median_ms']
+        if parser:
+            print(f"{name} vs regex: {regex / parser:.2f}x")
+    if report['mismatches']:
+        print(f"⚠️  {report['mismatches']} response(s) extract differently from the regex pipeline "
+              f"(unterminated blocks, fence info strings)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark lib/code-parser.js against the regex extraction")
+    parser.add_argument('--responses', nargs='*', default=[], help="Recorded responses (.txt/.md, .json, .jsonl)")
+    parser.add_argument('--count', type=int, default=8, help="Synthetic responses to generate")
+    parser.add_argument('--size-kb', type=int, default=256, help="Size of each synthetic response")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--chunk-size', type=int, default=16, help="Characters per push() in the chunked run")
+    parser.add_argument('--node', default='node', help="Node.js binary")
+    parser.add_argument('--json', dest='json_output', help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.responses:
+        responses = load_responses(args.responses)
+    else:
+        rng = random.Random(args.seed)
+        responses = [synthetic_response(rng, args.size_kb * 1024) for _ in range(args.count)]
+    if not responses:
+        print("❌ No responses to benchmark")
+        return 1
+
+    try:
+        report = run_benchmark(responses, args.iterations, args.chunk_size, args.node)
+    except subprocess.CalledProcessError as e:
+        print(f"❌ Node harness failed:\n{e.stderr}")
+        return 1
+
+    print_report(report)
+    if args.json_output:
+        with open(args.json_output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Retention and archival for the AI Code Generator's MongoDB collections
+The API keeps a TTL index on each collection below, keyed on its date field
+in RETENTION_FIELDS and set to RETENTION_<COLLECTION>_DAYS (e.g.
+RETENTION_SESSION_TURNS_DAYS) plus RETENTION_GRACE_DAYS (see lib/storage.js).
+Run this job more often than the grace period (e.g. daily from cron). It
+copies documents older than the retention period into gzip-compressed JSONL
+segments and deletes them only once their segment has been written and
+synced to disk. The TTL index is the backstop if the job stops running.
+
+Segments are written as <out-dir>/<collection>/<collection>-<first>-<last>-<n>.jsonl.gz,
+with one MongoDB Extended JSON document per line, so dates and binary
+preview bodies round-trip exactly. Each segment is also recorded in
+<out-dir>/index.jsonl.
+
+    python retention.py status
+    python retention.py archive --collection conversations --older-than-days 30
+    python retention.py restore archive/conversations/conversations-....jsonl.gz
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+from env_config import env_value
+
+# Collection -> date field its retention is keyed on (kept in sync with lib/storage.js)
+RETENTION_FIELDS = {
+    'conversations': 'timestamp',
+    'previews': 'lastUsedAt',
+    'sessions': 'updatedAt',
+    'session_turns': 'timestamp',
+}
+RETENTION_COLLECTIONS = list(RETENTION_FIELDS)
+RETENTION_INDEX = 'retention_ttl'
+
+
+def retention_days(collection):
+    """Configured retention for a collection in days (0 keeps documents forever)"""
+    return float(env_value(f"RETENTION_{collection.upper()}_DAYS", 0) or 0)
+
+
+def connect(mongo_url, db_name):
+    # Imported here so --help works without pymongo installed
+    from pymongo import MongoClient
+    client = MongoClient(mongo_url, serverSelectionTimeoutMS=5000)
+    return client[db_name]
+
+
+class SegmentWriter:
+    """Gzip JSONL segment that is renamed into place only once complete"""
+
+    def __init__(self, out_dir, collection):
+        from bson import json_util
+        self.json_util = json_util
+        self.directory = os.path.join(out_dir, collection)
+        os.makedirs(self.directory, exist_ok=True)
+        self.collection = collection
+        self.field = RETENTION_FIELDS[collection]
+        self.tmp_path = os.path.join(self.directory, f".{collection}-{os.getpid()}.partial")
+        self.file = gzip.open(self.tmp_path, 'wt', encoding='utf-8')
+        self.ids = []
+        self.first = None
+        self.last = None
+
+    def write(self, doc):
+        self.file.write(self.json_util.dumps(doc, json_options=self.json_util.CANONICAL_JSON_OPTIONS))
+        self.file.write('\n')
+        self.ids.append(doc['_id'])
+        stamp = doc.get(self.field)
+        if isinstance(stamp, datetime):
+            self.first = stamp if self.first is None else min(self.first, stamp)
+            self.last = stamp if self.last is None else max(self.last, stamp)
+
+    def close(self):
+        """Flush, fsync and move the segment to its final name; returns its path"""
+        self.file.close()
+        with open(self.tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+            digest = hashlib.sha256(f.read()).hexdigest()
+
+        def stamp(value):
+            return value.strftime('%Y%m%dT%H%M%S') if value else 'unknown'
+
+        name = f"{self.collection}-{stamp(self.first)}-{stamp(self.last)}-{len(self.ids)}.jsonl.gz"
+        path = os.path.join(self.directory, name)
+        suffix = 1
+        while os.path.exists(path):
+            path = os.path.join(self.directory, name.replace('.jsonl.gz', f".{suffix}.jsonl.gz"))
+            suffix += 1
+        os.replace(self.tmp_path, path)
+        return path, digest
+
+
+def retention_query(collection, cutoff):
+    """Documents whose retention field is older than cutoff
+
+    Documents written before the field existed (previews without lastUsedAt)
+    fall back to their timestamp.
+    """
+    field = RETENTION_FIELDS[collection]
+    if field == 'timestamp':
+        return {'timestamp': {'$lt': cutoff}}
+    return {'$or': [
+        {field: {'$lt': cutoff}},
+        {field: {'$exists': False}, 'timestamp': {'$lt': cutoff}},
+    ]}
+
+
+def archive(db, collection, older_than_days, out_dir, segment_docs=10000, batch_size=500, dry_run=False):
+    """Move documents older than the cutoff into segments; returns a summary"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    query = retention_query(collection, cutoff)
+    pending = db[collection].count_documents(query)
+    print(f"📦 {collection}: {pending} document(s) older than {cutoff.isoformat()}")
+    if dry_run or pending == 0:
+        return {'collection': collection, 'cutoff': cutoff.isoformat(), 'matched': pending, 'archived': 0, 'segments': []}
+
+    segments = []
+    archived = 0
+    writer = None
+    cursor = db[collection].find(query).sort(RETENTION_FIELDS[collection], 1).batch_size(batch_size)
+    try:
+        for doc in cursor:
+            if writer is None:
+                writer = SegmentWriter(out_dir, collection)
+            writer.write(doc)
+            if len(writer.ids) >= segment_docs:
+                archived += finish_segment(db, collection, writer, out_dir, segments)
+                writer = None
+        if writer is not None:
+            archived += finish_segment(db, collection, writer, out_dir, segments)
+            writer = None
+    finally:
+        cursor.close()
+        if writer is not None:
+            # Interrupted mid-segment: nothing from it was deleted, drop the partial file
+            writer.file.close()
+            os.remove(writer.tmp_path)
+
+    return {'collection': collection, 'cutoff': cutoff.isoformat(), 'matched': pending, 'archived': archived, 'segments': segments}
+
+
+def finish_segment(db, collection, writer, out_dir, segments):
+    """Close a segment, record it in the index, then delete its documents"""
+    path, digest = writer.close()
+    entry = {
+        'collection': collection,
+        'path': os.path.relpath(path, out_dir),
+        'documents': len(writer.ids),
+        'sha256': digest,
+        'first': writer.first.isoformat() if writer.first else None,
+        'last': writer.last.isoformat() if writer.last else None,
+        'archivedAt': datetime.now(timezone.utc).isoformat(),
+    }
+    with open(os.path.join(out_dir, 'index.jsonl'), 'a') as index:
+        index.write(json.dumps(entry) + '\n')
+
+    deleted = 0
+    for start in range(0, len(writer.ids), 1000):
+        deleted += db[collection].delete_many({'_id': {'$in': writer.ids[start:start + 1000]}}).deleted_count
+    segments.append(entry)
+    print(f"  ✅ {entry['path']}: {entry['documents']} document(s), {deleted} deleted")
+    return len(writer.ids)
+
+
+def restore(db, segment_path, collection=None, batch_size=500):
+    """Load a segment back; documents already present are left untouched"""
+    from bson import json_util
+    from pymongo.errors import BulkWriteError
+
+    name = os.path.basename(segment_path)
+    collection = collection or next((c for c in RETENTION_COLLECTIONS if name.startswith(f"{c}-")), None)
+    if not collection:
+        raise SystemExit(f"Cannot infer the collection from {name}; pass --collection")
+
+    restored = 0
+    skipped = 0
+
+    def flush(batch):
+        nonlocal restored, skipped
+        if not batch:
+            return
+        try:
+            restored += len(db[collection].insert_many(batch, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            duplicates = sum(1 for error in e.details.get('writeErrors', []) if error.get('code') == 11000)
+            if duplicates != len(e.details.get('writeErrors', [])):
+                raise
+            restored += e.details.get('nInserted', 0)
+            skipped += duplicates
+
+    batch = []
+    oldest = None
+    with gzip.open(segment_path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            doc = json_util.loads(line)
+            stamp = doc.get(RETENTION_FIELDS.get(collection, 'timestamp')) or doc.get('timestamp')
+            if isinstance(stamp, datetime):
+                oldest = stamp if oldest is None else min(oldest, stamp)
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+    flush(batch)
+
+    print(f"♻️  {collection}: restored {restored} document(s), {skipped} already present")
+    ttl = next((index for index in db[collection].list_indexes() if index['name'] == RETENTION_INDEX), None)
+    if ttl and oldest is not None:
+        if oldest.tzinfo is None:
+            oldest = oldest.replace(tzinfo=timezone.utc)
+        expires = oldest + timedelta(seconds=ttl['expireAfterSeconds'])
+        if expires <= datetime.now(timezone.utc):
+            print(f"⚠️  The {RETENTION_INDEX} index ({ttl['expireAfterSeconds']}s) will delete restored documents "
+                  f"again shortly; restore into another collection with --collection to keep them")
+    return {'collection': collection, 'restored': restored, 'skipped': skipped}
+
+
+def status(db, out_dir):
+    """Document counts, sizes, oldest document and TTL setting per collection"""
+    report = {}
+    for collection in RETENTION_COLLECTIONS:
+        field = RETENTION_FIELDS[collection]
+        stats = db.command('collStats', collection) if collection in db.list_collection_names() else {}
+        oldest = db[collection].find_one({field: {'$exists': True}}, sort=[(field, 1)], projection={field: 1})
+        ttl = next((index for index in db[collection].list_indexes() if index['name'] == RETENTION_INDEX), None)
+        report[collection] = {
+            'documents': stats.get('count', 0),
+            'size_bytes': stats.get('size', 0),
+            'storage_bytes': stats.get('storageSize', 0),
+            'oldest': oldest[field].isoformat() if oldest and oldest.get(field) else None,
+            'ttl_seconds': ttl['expireAfterSeconds'] if ttl else None,
+            'retention_days': retention_days(collection),
+        }
+
+    segments = []
+    index_path = os.path.join(out_dir, 'index.jsonl')
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            segments = [json.loads(line) for line in f if line.strip()]
+    report['archive'] = {
+        'segments': len(segments),
+        'documents': sum(segment['documents'] for segment in segments),
+    }
+
+    for collection in RETENTION_COLLECTIONS:
+        info = report[collection]
+        ttl = f"{info['ttl_seconds']}s" if info['ttl_seconds'] else 'none'
+        print(f"{collection:<15}{info['documents']:>10} docs{info['size_bytes'] / 1e6:>10.1f} MB  "
+              f"oldest {info['oldest'] or '-'}  ttl {ttl}  retention {info['retention_days']:g}d")
+    print(f"archive: {report['archive']['segments']} segment(s), {report['archive']['documents']} document(s) in {out_dir}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retention, archival and restore for the API's collections")
+    parser.add_argument('--mongo-url', default=env_value('MONGO_URL', 'mongodb://localhost:27017'))
+    parser.add_argument('--db-name', default=env_value('DB_NAME', 'test_database'))
+    parser.add_argument('--out-dir', default='archive', help="Directory holding the archive segments")
+    parser.add_argument('--json', dest='json_output', help="Also write the result to this JSON file")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('status', help="Show collection sizes, TTL indexes and archive contents")
+
+    archive_parser = subparsers.add_parser('archive', help="Archive and delete documents past their retention")
+    archive_parser.add_argument('--collection', choices=RETENTION_COLLECTIONS + ['all'], default='all')
+    archive_parser.add_argument('--older-than-days', type=float,
+                                help="Cutoff in days (default: RETENTION_<COLLECTION>_DAYS)")
+    archive_parser.add_argument('--segment-docs', type=int, default=10000, help="Documents per segment file")
+    archive_parser.add_argument('--dry-run', action='store_true', help="Only count what would be archived")
+
+    restore_parser = subparsers.add_parser('restore', help="Load an archive segment back into MongoDB")
+    restore_parser.add_argument('segment', help="Path to a .jsonl.gz segment")
+    restore_parser.add_argument('--collection', help="Target collection (default: inferred from the file name)")
+
+    args = parser.parse_args(argv)
+    db = connect(args.mongo_url, args.db_name)
+
+    if args.command == 'status':
+        result = status(db, args.out_dir)
+    elif args.command == 'archive':
+        collections = RETENTION_COLLECTIONS if args.collection == 'all' else [args.collection]
+        result = []
+        for collection in collections:
+            days = args.older_than_days if args.older_than_days is not None else retention_days(collection)
+            if days <= 0:
+                print(f"⏭️  {collection}: no retention configured (RETENTION_{collection.upper()}_DAYS), skipping")
+                continue
+            result.append(archive(db, collection, days, args.out_dir, args.segment_docs, dry_run=args.dry_run))
+    else:
+        result = restore(db, args.segment, args.collection)
+
+    if args.json_output:
+        with open(args.json_output, 'w') as f:
+            json.dump(result, f, indent=2, default=str)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+// Bundle-size report for `next build` output, checked against bundle-budgets.json
+//
+// For each app route, the initial load is the root main files plus the chunks
+// of the route's page and of every layout above it; anything else under
+// static/chunks is loaded on demand (next/dynamic). Sizes are raw and gzip.
+//
+//   node scripts/bundle-report.mjs [--dir .next] [--budgets bundle-budgets.json] [--json report.json]
+//
+// Exits with status 1 when a route is over its budget.
+import { existsSync, readdirSync, readFileSync, writeFileSync } from 'fs'
+import { join, sep } from 'path'
+import { gzipSync } from 'zlib'
+
+function parseArgs(argv) {
+  const args = { dir: '.next', budgets: 'bundle-budgets.json', json: null }
+  for (let i = 0; i < argv.length; i += 2) {
+    const key = argv[i].replace(/^--/, '')
+    if (!(key in args)) throw new Error(`Unknown option ${argv[i]}`)
+    args[key] = argv[i + 1]
+  }
+  return args
+}
+
+function readJson(path) {
+  return JSON.parse(readFileSync(path, 'utf8'))
+}
+
+const sizes = new Map()
+function fileSize(dir, file) {
+  if (!sizes.has(file)) {
+    const content = readFileSync(join(dir, file))
+    sizes.set(file, { raw: content.length, gzip: gzipSync(content).length })
+  }
+  return sizes.get(file)
+}
+
+function total(dir, files) {
+  return files.reduce((sum, file) => {
+    const size = fileSize(dir, file)
+    return { raw: sum.raw + size.raw, gzip: sum.gzip + size.gzip }
+  }, { raw: 0, gzip: 0 })
+}
+
+// "/foo/bar/page" -> ["/layout", "/foo/layout", "/foo/bar/layout", "/foo/bar/page"]
+function routeEntries(pageKey) {
+  const segments = pageKey.split('/').slice(1, -1)
+  const layouts = segments.map((_, i) => `/${segments.slice(0, i + 1).join('/')}/layout`)
+  return ['/layout', ...layouts, pageKey]
+}
+
+function routeName(pageKey) {
+  const route = pageKey.replace(/\/page$/, '').replace(/\/\([^)]+\)/g, '')
+  return route || '/'
+}
+
+const kb = bytes => (bytes / 1024).toFixed(1)
+
+function main() {
+  const args = parseArgs(process.argv.slice(2))
+  const appManifestPath = join(args.dir, 'app-build-manifest.json')
+  if (!existsSync(appManifestPath)) {
+    console.error(`${appManifestPath} not found; run \`next build\` first`)
+    process.exit(2)
+  }
+  const appManifest = readJson(appManifestPath).pages
+  const buildManifest = readJson(join(args.dir, 'build-manifest.json'))
+  const budgets = existsSync(args.budgets) ? readJson(args.budgets).routes : {}
+
+  const initialFiles = new Set()
+  const routes = Object.keys(appManifest).filter(key => key.endsWith('/page')).sort().map(pageKey => {
+    const files = new Set(buildManifest.rootMainFiles || [])
+    for (const entry of routeEntries(pageKey)) {
+      for (const file of appManifest[entry] || []) files.add(file)
+    }
+    files.forEach(file => initialFiles.add(file))
+
+    const route = routeName(pageKey)
+    const js = total(args.dir, [...files].filter(file => file.endsWith('.js')))
+    const css = total(args.dir, [...files].filter(file => file.endsWith('.css')))
+    const budget = budgets[route] || {}
+    const over = []
+    if (budget.initialJsGzipKb && js.gzip > budget.initialJsGzipKb * 1024) over.push('js')
+    if (budget.initialCssGzipKb && css.gzip > budget.initialCssGzipKb * 1024) over.push('css')
+    return { route, files: files.size, js, css, budget, over }
+  })
+
+  // Chunks no route loads up front: the next/dynamic splits (and pages-router chunks)
+  const lazy = readdirSync(join(args.dir, 'static', 'chunks'), { recursive: true })
+    .map(file => join('static', 'chunks', file).split(sep).join('/'))
+    .filter(file => file.endsWith('.js') && !initialFiles.has(file))
+  const lazyChunks = lazy.map(file => ({ file, ...fileSize(args.dir, file) })).sort((a, b) => b.gzip - a.gzip)
+
+  console.log(`${'route'.padEnd(32)}${'files'.padStart(6)}${'js KB'.padStart(10)}${'js gz KB'.padStart(10)}${'css gz KB'.padStart(11)}${'budget gz KB'.padStart(14)}`)
+  for (const route of routes) {
+    const budget = route.budget.initialJsGzipKb ? String(route.budget.initialJsGzipKb) : '-'
+    console.log(
+      `${route.route.padEnd(32)}${String(route.files).padStart(6)}${kb(route.js.raw).padStart(10)}` +
+      `${kb(route.js.gzip).padStart(10)}${kb(route.css.gzip).padStart(11)}${budget.padStart(14)}` +
+      (route.over.length ? `  OVER (${route.over.join(', ')})` : '')
+    )
+  }
+  if (lazyChunks.length > 0) {
+    console.log(`\nlazy chunks: ${lazyChunks.length}, ${kb(lazyChunks.reduce((sum, chunk) => sum + chunk.gzip, 0))} KB gzip`)
+    for (const chunk of lazyChunks.slice(0, 5)) console.log(`  ${chunk.file} ${kb(chunk.gzip)} KB gzip`)
+  }
+
+  if (args.json) {
+    writeFileSync(args.json, JSON.stringify({ routes, lazyChunks }, null, 2))
+  }
+  const failed = routes.filter(route => route.over.length > 0)
+  if (failed.length > 0) {
+    console.error(`\n${failed.length} route(s) over budget`)
+    process.exit(1)
+  }
+}
+
+main()
@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+Local stub for the LLM providers used by the AI Code Generator API
+Speaks the OpenAI chat-completions wire format (OpenAI and DeepSeek) and the
+Gemini generateContent format (both also in their streaming variants), with
+configurable latency, token counts, error rates and timeouts per provider.
+In streaming mode the sampled latency is the time to first token and
+token_rate paces the rest of the stream.
+
+Point the Next.js route at it with:
+    OPENAI_BASE_URL=http://localhost:4010/openai/v1
+    GEMINI_BASE_URL=http://localhost:4010/gemini
+    DEEPSEEK_BASE_URL=http://localhost:4010/deepseek
+
+Control endpoints:
+    GET  /_stub/config   current provider profiles
+    POST /_stub/config   merge {"openai": {...}, ...} into the profiles
+    GET  /_stub/stats    request counts per provider and outcome
+    POST /_stub/reset    restore the startup profiles and clear stats
+"""
+
+import argparse
+import copy
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROVIDERS = ('openai', 'gemini', 'deepseek')
+
+DEFAULT_PROFILE = {
+    # dist: fixed (ms) | uniform (min_ms, max_ms) | normal (mean_ms, std_ms) | lognormal (median_ms, sigma)
+    'latency': {'dist': 'lognormal', 'median_ms': 800, 'sigma': 0.5},
+    'tokens': {'min': 200, 'max': 800},
+    'error_rate': 0.0,
+    'error_status': 500,
+    'timeout_rate': 0.0,
+    'timeout_s': 60,
+    'token_rate': 200,
+}
+
+# Characters per streamed chunk (~4 tokens)
+STREAM_CHUNK_CHARS = 16
+
+CODE_LINES = [
+    "import React, { useState } from 'react'",
+    "",
+    "export default function GeneratedComponent() {",
+    "  const [items, setItems] = useState([])",
+    "  const [value, setValue] = useState('')",
+    "",
+    "  const addItem = () => {",
+    "    if (!value.trim()) return",
+    "    setItems([...items, { id: Date.now(), text: value }])",
+    "    setValue('')",
+    "  }",
+    "",
+    "  return (",
+    "    <div className=\"p-6 max-w-md mx-auto bg-white rounded-xl shadow-lg\">",
+    "      <input value={value} onChange={(e) => setValue(e.target.value)} />",
+    "      <button onClick={addItem} className=\"bg-blue-500 text-white px-4 py-2 rounded\">",
+    "        Adicionar",
+    "      </button>",
+    "      {items.map(item => <p key={item.id}>{item.text}</p>)}",
+    "    </div>",
+    "  )",
+    "}",
+]
+
+
+def estimate_tokens(text):
+    """Rough token estimate (~4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+def merge_profile(base, overrides):
+    """Return base updated with overrides, merging nested dicts
+
+    A latency spec that names a new 'dist' replaces the old spec entirely.
+    """
+    merged = copy.deepcopy(base)
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict) and 'dist' not in value:
+            merged[key] = {**merged[key], **value}
+        else:
+            merged[key] = value
+    return merged
+
+
+def sample_latency(latency, rng):
+    """Draw a latency in seconds from a latency distribution spec"""
+    dist = latency.get('dist', 'fixed')
+    if dist == 'fixed':
+        ms = latency.get('ms', 0)
+    elif dist == 'uniform':
+        ms = rng.uniform(latency.get('min_ms', 0), latency.get('max_ms', 0))
+    elif dist == 'normal':
+        ms = rng.gauss(latency.get('mean_ms', 0), latency.get('std_ms', 0))
+    elif dist == 'lognormal':
+        ms = rng.lognormvariate(math.log(max(latency.get('median_ms', 1), 1)), latency.get('sigma', 0.5))
+    else:
+        raise ValueError(f"Unknown latency distribution '{dist}'")
+    return max(ms, 0) / 1000.0
+
+
+def build_completion_text(prompt, tokens):
+    """Build a response shaped like a real generation: explanation plus one fenced code block"""
+    explanation = f"Aqui está uma implementação para: {prompt[:120]}"
+    lines = []
+    while estimate_tokens('\n'.join(lines)) < tokens:
+        lines.extend(CODE_LINES)
+    return f"{explanation}\n\n```jsx\n" + '\n'.join(lines) + "\n```\n\nInstale as dependências e rode o projeto."
+
+
+class StubState:
+    """Provider profiles and request statistics shared by all handler threads"""
+
+    def __init__(self, profiles=None, seed=None):
+        self.initial_profiles = {
+            name: merge_profile(DEFAULT_PROFILE, (profiles or {}).get(name))
+            for name in PROVIDERS
+        }
+        self.profiles = copy.deepcopy(self.initial_profiles)
+        self.stats = defaultdict(Counter)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def configure(self, overrides):
+        with self.lock:
+            for name, profile in overrides.items():
+                if name not in self.profiles:
+                    raise ValueError(f"Unknown provider '{name}'")
+                self.profiles[name] = merge_profile(self.profiles[name], profile)
+
+    def reset(self):
+        with self.lock:
+            self.profiles = copy.deepcopy(self.initial_profiles)
+            self.stats.clear()
+
+    def plan(self, provider):
+        """Decide the outcome of one request: ('ok' | 'error' | 'timeout', delay_s, tokens)"""
+        with self.lock:
+            profile = self.profiles[provider]
+            roll = self.rng.random()
+            if roll < profile['timeout_rate']:
+                outcome = 'timeout'
+            elif roll < profile['timeout_rate'] + profile['error_rate']:
+                outcome = 'error'
+            else:
+                outcome = 'ok'
+            delay = sample_latency(profile['latency'], self.rng)
+            tokens = self.rng.randint(profile['tokens']['min'], profile['tokens']['max'])
+            self.stats[provider][outcome] += 1
+            return outcome, delay, tokens, dict(profile)
+
+
+class StubProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'StubProvider/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        return json.loads(raw or b'{}')
+
+    def do_GET(self):
+        state = self.server.state
+        if self.path == '/_stub/config':
+            return self._send_json(200, state.profiles)
+        if self.path == '/_stub/stats':
+            return self._send_json(200, {name: dict(counts) for name, counts in state.stats.items()})
+        self._send_json(404, {'error': {'message': f'No stub route for {self.path}'}})
+
+    def do_POST(self):
+        state = self.server.state
+        path = self.path.split('?', 1)[0]
+        try:
+            body = self._read_json()
+        except json.JSONDecodeError:
+            return self._send_json(400, {'error': {'message': 'Invalid JSON body'}})
+
+        if path == '/_stub/config':
+            try:
+                state.configure(body)
+            except ValueError as e:
+                return self._send_json(400, {'error': {'message': str(e)}})
+            return self._send_json(200, state.profiles)
+        if path == '/_stub/reset':
+            state.reset()
+            return self._send_json(200, state.profiles)
+
+        provider = path.strip('/').split('/', 1)[0]
+        if provider in ('openai', 'deepseek') and path.endswith('/chat/completions'):
+            return self._handle_chat_completion(provider, body)
+        if provider == 'gemini' and ':generateContent' in path:
+            return self._handle_generate_content(body, stream=False)
+        if provider == 'gemini' and ':streamGenerateContent' in path:
+            return self._handle_generate_content(body, stream=True)
+        self._send_json(404, {'error': {'message': f'No stub route for {path}'}})
+
+    def _simulate(self, provider):
+        """Apply the provider's latency/failure profile; returns (tokens, error, profile) or None on timeout"""
+        outcome, delay, tokens, profile = self.server.state.plan(provider)
+        if outcome == 'timeout':
+            # Hang, then drop the connection without answering
+            time.sleep(profile['timeout_s'])
+            self.close_connection = True
+            return None
+        time.sleep(delay)
+        return tokens, (profile['error_status'] if outcome == 'error' else None), profile
+
+    def _stream_events(self, text, token_rate, make_event, done_marker=None):
+        """Send text as Server-Sent Events of STREAM_CHUNK_CHARS each, paced at token_rate"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        delay = estimate_tokens('x' * STREAM_CHUNK_CHARS) / token_rate if token_rate else 0
+        chunks = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)]
+        for index, chunk in enumerate(chunks):
+            event = make_event(chunk, index == len(chunks) - 1)
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(delay)
+        if done_marker:
+            self.wfile.write(f"data: {done_marker}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+    def _handle_chat_completion(self, provider, body):
+        simulated = self._simulate(provider)
+        if simulated is None:
+            return
+        tokens, error_status, profile = simulated
+        if error_status:
+            return self._send_json(error_status, {
+                'error': {'message': f'Stub {provider} failure', 'type': 'server_error', 'code': None}
+            })
+
+        messages = body.get('messages') or []
+        prompt = messages[-1].get('content', '') if messages else ''
+        content = build_completion_text(prompt, tokens)
+        completion_id = f'chatcmpl-stub-{uuid.uuid4().hex[:12]}'
+        model = body.get('model', provider)
+
+        if body.get('stream'):
+            return self._stream_events(content, profile['token_rate'], lambda chunk, last: {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'delta': {'content': chunk},
+                    'finish_reason': 'stop' if last else None,
+                }],
+            }, done_marker='[DONE]')
+
+        prompt_tokens = sum(estimate_tokens(m.get('content') or '') for m in messages)
+        completion_tokens = estimate_tokens(content)
+        self._send_json(200, {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        })
+
+    def _handle_generate_content(self, body, stream):
+        simulated = self._simulate('gemini')
+        if simulated is None:
+            return
+        tokens, error_status, profile = simulated
+        if error_status:
+            return self._send_json(error_status, {
+                'error': {'code': error_status, 'message': 'Stub gemini failure', 'status': 'INTERNAL'}
+            })
+
+        parts = [
+            part.get('text', '')
+            for content in body.get('contents') or []
+            for part in content.get('parts') or []
+        ]
+        prompt = parts[-1] if parts else ''
+        text = build_completion_text(prompt, tokens)
+
+        if stream:
+            return self._stream_events(text, profile['token_rate'], lambda chunk, last: {
+                'candidates': [{
+                    'content': {'parts': [{'text': chunk}], 'role': 'model'},
+                    'index': 0,
+                    **({'finishReason': 'STOP'} if last else {}),
+                }],
+            })
+
+        prompt_tokens = sum(estimate_tokens(part) for part in parts)
+        completion_tokens = estimate_tokens(text)
+        self._send_json(200, {
+            'candidates': [{
+                'content': {'parts': [{'text': text}], 'role': 'model'},
+                'finishReason': 'STOP',
+                'index': 0,
+            }],
+            'usageMetadata': {
+                'promptTokenCount': prompt_tokens,
+                'candidatesTokenCount': completion_tokens,
+                'totalTokenCount': prompt_tokens + completion_tokens,
+            },
+        })
+
+
+class StubProviderServer:
+    """Runs the stub in a background thread so test harnesses can start and stop it"""
+
+    def __init__(self, host='127.0.0.1', port=4010, profiles=None, seed=None, verbose=False):
+        self.httpd = ThreadingHTTPServer((host, port), StubProviderHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = StubState(profiles, seed)
+        self.httpd.verbose = verbose
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def state(self):
+        return self.httpd.state
+
+    def env(self):
+        """Environment variables that point route.js at this stub"""
+        return {
+            'OPENAI_BASE_URL': f"{self.url}/openai/v1",
+            'GEMINI_BASE_URL': f"{self.url}/gemini",
+            'DEEPSEEK_BASE_URL': f"{self.url}/deepseek",
+        }
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='stub-provider', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def parse_provider_options(values, convert):
+    """Parse repeated 'provider=value' options into {provider: converted value}"""
+    parsed = {}
+    for item in values or []:
+        name, _, value = item.partition('=')
+        if name not in PROVIDERS:
+            raise SystemExit(f"Unknown provider '{name}', expected one of {', '.join(PROVIDERS)}")
+        parsed[name] = convert(value)
+    return parsed
+
+
+def parse_latency(spec):
+    """Parse 'fixed:MS', 'uniform:MIN:MAX', 'normal:MEAN:STD' or 'lognormal:MEDIAN:SIGMA'"""
+    dist, *params = spec.split(':')
+    params = [float(p) for p in params]
+    keys = {
+        'fixed': ('ms',),
+        'uniform': ('min_ms', 'max_ms'),
+        'normal': ('mean_ms', 'std_ms'),
+        'lognormal': ('median_ms', 'sigma'),
+    }
+    if dist not in keys or len(params) != len(keys[dist]):
+        raise SystemExit(f"Invalid latency spec '{spec}'")
+    return {'dist': dist, **dict(zip(keys[dist], params))}
+
+
+def parse_tokens(spec):
+    low, _, high = spec.partition(':')
+    return {'min': int(low), 'max': int(high or low)}
+
+
+def build_profiles(args):
+    """Combine --config file and per-provider command-line overrides"""
+    profiles = {}
+    if args.config:
+        with open(args.config) as f:
+            profiles = json.load(f)
+
+    overrides = [
+        ('latency', parse_provider_options(args.latency, parse_latency)),
+        ('tokens', parse_provider_options(args.tokens, parse_tokens)),
+        ('error_rate', parse_provider_options(args.error_rate, float)),
+        ('error_status', parse_provider_options(args.error_status, int)),
+        ('timeout_rate', parse_provider_options(args.timeout_rate, float)),
+        ('timeout_s', parse_provider_options(args.timeout_s, float)),
+        ('token_rate', parse_provider_options(args.token_rate, float)),
+    ]
+    for key, values in overrides:
+        for name, value in values.items():
+            profiles.setdefault(name, {})[key] = value
+    return profiles
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stub OpenAI/Gemini/DeepSeek provider server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4010)
+    parser.add_argument('--config', help="JSON file with {provider: profile} overrides")
+    parser.add_argument('--seed', type=int, help="Seed for latency and failure sampling")
+    parser.add_argument('--latency', action='append', metavar='PROVIDER=SPEC',
+                        help="e.g. openai=lognormal:800:0.5, gemini=fixed:300")
+    parser.add_argument('--tokens', action='append', metavar='PROVIDER=MIN:MAX')
+    parser.add_argument('--error-rate', action='append', metavar='PROVIDER=RATE')
+    parser.add_argument('--error-status', action='append', metavar='PROVIDER=STATUS')
+    parser.add_argument('--timeout-rate', action='append', metavar='PROVIDER=RATE')
+    parser.add_argument('--timeout-s', action='append', metavar='PROVIDER=SECONDS')
+    parser.add_argument('--token-rate', action='append', metavar='PROVIDER=TOKENS_PER_S',
+                        help="Streaming pace after the first token")
+    parser.add_argument('--verbose', action='store_true', help="Log every request")
+    args = parser.parse_args(argv)
+
+    server = StubProviderServer(args.host, args.port, build_profiles(args), args.seed, args.verbose)
+    print(f"🧪 Stub provider server listening on {server.url}")
+    for key, value in server.env().items():
+        print(f"   {key}={value}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import assert from 'node:assert/strict'
+import { test } from 'node:test'
+import { AdmissionController, AdmissionRejectedError, ConcurrencyLimiter } from '../lib/admission.js'
+
+test('admits up to maxConcurrent callers without queueing', async () => {
+  const admission = new AdmissionController({ maxConcurrent: 2, maxQueue: 1 })
+  const first = await admission.acquire()
+  const second = await admission.acquire()
+  assert.equal(first.queuedMs, 0)
+  assert.equal(admission.active, 2)
+  first.release()
+  second.release()
+  assert.equal(admission.active, 0)
+})
+
+test('queued callers run in priority order once a permit is released', async () => {
+  const admission = new AdmissionController({ maxConcurrent: 1, maxQueue: 4 })
+  const holder = await admission.acquire()
+  const order = []
+  const low = admission.acquire(5).then(permit => { order.push('low'); permit.release() })
+  const high = admission.acquire(0).then(permit => { order.push('high'); permit.release() })
+  holder.release()
+  await Promise.all([low, high])
+  assert.deepEqual(order, ['high', 'low'])
+})
+
+test('rejects with 429 queue_full and a Retry-After when the queue is full', async () => {
+  const admission = new AdmissionController({ maxConcurrent: 1, maxQueue: 1 })
+  const holder = await admission.acquire()
+  const waiting = admission.acquire()
+  await assert.rejects(admission.acquire(), error => {
+    assert.ok(error instanceof AdmissionRejectedError)
+    assert.equal(error.status, 429)
+    assert.equal(error.reason, 'queue_full')
+    assert.ok(error.retryAfterS >= 1 && error.retryAfterS <= 60)
+    return true
+  })
+  holder.release()
+  ;(await waiting).release()
+})
+
+test('a higher-priority arrival sheds the worst waiter with 429', async () => {
+  const admission = new AdmissionController({ maxConcurrent: 1, maxQueue: 1 })
+  const holder = await admission.acquire()
+  const shed = admission.acquire(5)
+  const urgent = admission.acquire(0)
+  await assert.rejects(shed, { status: 429, reason: 'shed' })
+  holder.release()
+  ;(await urgent).release()
+  assert.equal(admission.snapshot().rejected.shed, 1)
+})
+
+test('rejects with 503 deadline when a waiter is not served in time', async () => {
+  const admission = new AdmissionController({ maxConcurrent: 1, maxQueue: 4, queueTimeoutMs: 20 })
+  const holder = await admission.acquire()
+  // The queue timer is unref'd; keep the event loop alive until it fires
+  const keepAlive = setTimeout(() => {}, 1000)
+  await assert.rejects(admission.acquire(), error => {
+    assert.equal(error.status, 503)
+    assert.equal(error.reason, 'deadline')
+    assert.ok(error.retryAfterS >= 1)
+    return true
+  })
+  clearTimeout(keepAlive)
+  assert.equal(admission.queue.length, 0)
+  holder.release()
+})
+
+test('rejects with 503 expected_wait when recent service times predict a timeout', async () => {
+  const admission = new AdmissionController({ maxConcurrent: 1, maxQueue: 4, queueTimeoutMs: 1000 })
+  admission.avgServiceMs = 5000
+  const holder = await admission.acquire()
+  await assert.rejects(admission.acquire(), error => {
+    assert.equal(error.status, 503)
+    assert.equal(error.reason, 'expected_wait')
+    // One caller ahead plus the new one, at 5s each
+    assert.equal(error.retryAfterS, 5)
+    return true
+  })
+  holder.release()
+})
+
+test('Retry-After is clamped to 1..60 seconds', () => {
+  const admission = new AdmissionController({ maxConcurrent: 1 })
+  assert.equal(admission.retryAfterSeconds(), 1)
+  admission.avgServiceMs = 10
+  assert.equal(admission.retryAfterSeconds(), 1)
+  admission.avgServiceMs = 600000
+  assert.equal(admission.retryAfterSeconds(), 60)
+})
+
+test('ConcurrencyLimiter refuses past its limit until released', () => {
+  const limiter = new ConcurrencyLimiter(1)
+  assert.equal(limiter.tryAcquire(), true)
+  assert.equal(limiter.tryAcquire(), false)
+  limiter.release()
+  assert.equal(limiter.tryAcquire(), true)
+})
@@ -0,0 +1,67 @@
+import assert from 'node:assert/strict'
+import { test } from 'node:test'
+import { CircuitBreaker } from '../lib/circuit-breaker.js'
+
+function breaker(options = {}) {
+  return new CircuitBreaker('test', { windowSize: 4, minRequests: 2, errorThreshold: 0.5, openMs: 1000, ...options })
+}
+
+test('opens once the error rate reaches the threshold', () => {
+  const b = breaker()
+  b.recordSuccess()
+  assert.equal(b.state, 'closed')
+  b.recordFailure(100)
+  assert.equal(b.state, 'open')
+  assert.equal(b.allowRequest(500), false)
+})
+
+test('needs minRequests outcomes before opening', () => {
+  const b = breaker({ minRequests: 3 })
+  b.recordFailure(0)
+  b.recordFailure(0)
+  assert.equal(b.state, 'closed')
+  b.recordFailure(0)
+  assert.equal(b.state, 'open')
+})
+
+test('goes half-open after openMs and lets a single probe through', () => {
+  const b = breaker()
+  b.recordFailure(0)
+  b.recordFailure(0)
+  assert.equal(b.allowRequest(999), false)
+  assert.equal(b.allowRequest(1000), true)
+  assert.equal(b.state, 'half-open')
+  assert.equal(b.allowRequest(1001), false)
+})
+
+test('a successful probe closes the breaker', () => {
+  const b = breaker()
+  b.recordFailure(0)
+  b.recordFailure(0)
+  b.allowRequest(1000)
+  b.recordSuccess()
+  assert.equal(b.state, 'closed')
+  assert.deepEqual(b.outcomes, [])
+  assert.equal(b.allowRequest(1001), true)
+})
+
+test('a failed probe opens the breaker again', () => {
+  const b = breaker()
+  b.recordFailure(0)
+  b.recordFailure(0)
+  b.allowRequest(1000)
+  b.recordFailure(1500)
+  assert.equal(b.state, 'open')
+  assert.equal(b.allowRequest(2000), false)
+  assert.equal(b.allowRequest(2500), true)
+})
+
+test('releaseProbe frees the probe slot without an outcome', () => {
+  const b = breaker()
+  b.recordFailure(0)
+  b.recordFailure(0)
+  assert.equal(b.allowRequest(1000), true)
+  b.releaseProbe()
+  assert.equal(b.state, 'half-open')
+  assert.equal(b.allowRequest(1001), true)
+})
@@ -0,0 +1,63 @@
+import assert from 'node:assert/strict'
+import { test } from 'node:test'
+import { FencedBlockParser, parseFencedBlocks } from '../lib/code-parser.js'
+
+const RESPONSE = 'Here you go.\n\n**src/App.jsx**\n```jsx\nexport default function App() {}\n```\nDone.\n'
+
+// Feed `text` in pieces of `size` characters, collecting every event
+function stream(text, size) {
+  const parser = new FencedBlockParser()
+  const events = []
+  for (let i = 0; i < text.length; i += size) events.push(...parser.push(text.slice(i, i + size)))
+  events.push(...parser.end())
+  return { parser, events }
+}
+
+function joined(events, type) {
+  return events.filter(event => event.type === type).map(event => event.text).join('')
+}
+
+test('parses a complete response', () => {
+  const { explanation, blocks } = parseFencedBlocks(RESPONSE)
+  assert.equal(explanation, 'Here you go.\n\n**src/App.jsx**')
+  assert.equal(blocks.length, 1)
+  assert.equal(blocks[0].language, 'jsx')
+  assert.equal(blocks[0].filename, 'src/App.jsx')
+  assert.equal(blocks[0].content, 'export default function App() {}')
+  assert.equal(Buffer.from(RESPONSE).subarray(blocks[0].start, blocks[0].end).toString(), blocks[0].content)
+})
+
+test('handles fences split across chunks at every size', () => {
+  const expected = parseFencedBlocks(RESPONSE)
+  for (let size = 1; size <= 8; size++) {
+    const { parser, events } = stream(RESPONSE, size)
+    assert.deepEqual(parser.result(), expected, `chunk size ${size}`)
+    assert.equal(joined(events, 'code'), 'export default function App() {}\n', `chunk size ${size}`)
+    assert.ok(!joined(events, 'text').includes('```'), `fence leaked as text at chunk size ${size}`)
+  }
+})
+
+test('a fence split between two chunks starts one block', () => {
+  const parser = new FencedBlockParser()
+  const events = [...parser.push('Intro\n``'), ...parser.push('`js\nconst a = 1\n`'), ...parser.push('``\n')]
+  assert.deepEqual(events.map(event => event.type), ['text', 'block_start', 'code', 'block_end'])
+  assert.equal(events[1].language, 'js')
+})
+
+test('backticks inside a line are not fences', () => {
+  const { blocks, explanation } = parseFencedBlocks('Run `npm start` and see ``` inline.\n')
+  assert.equal(blocks.length, 0)
+  assert.equal(explanation, 'Run `npm start` and see ``` inline.')
+})
+
+test('end() closes an unterminated block', () => {
+  const { parser, events } = stream('```python\nprint(1)\n', 4)
+  assert.equal(events[events.length - 1].type, 'block_end')
+  assert.equal(parser.result().blocks[0].content, 'print(1)')
+  assert.equal(parser.result().blocks[0].filename, 'file-1.py')
+})
+
+test('takes filenames from the info string or a first-line comment', () => {
+  const { blocks } = parseFencedBlocks('```js title="server.js"\nlisten()\n```\n```js\n// routes/api.js\nroute()\n```\n')
+  assert.deepEqual(blocks.map(block => block.filename), ['server.js', 'routes/api.js'])
+})
@@ -0,0 +1,48 @@
+import assert from 'node:assert/strict'
+import { test } from 'node:test'
+import { buildContextWindow, estimateTokens, summarizeTurns } from '../lib/context-window.js'
+
+// A turn of exactly `tokens` estimated tokens
+function turn(role, tokens, fill = 'a') {
+  return { role, content: fill.repeat(tokens * 4) }
+}
+
+test('keeps every turn when the history fits the budget', () => {
+  const turns = [turn('user', 10), turn('assistant', 10)]
+  const { messages, dropped, usage } = buildContextWindow(turns, { budget: 100 })
+  assert.deepEqual(messages, turns)
+  assert.deepEqual(dropped, [])
+  assert.equal(usage.contextTokens, 20)
+  assert.equal(usage.verbatimTurns, 2)
+})
+
+test('keeps the newest turns, truncates one and drops the rest', () => {
+  const turns = [turn('user', 50, 'o'), turn('assistant', 50, 'p'), turn('user', 60, 'q'), turn('assistant', 60, 'r')]
+  const { messages, dropped, usage } = buildContextWindow(turns, { budget: 100, minTruncatedTokens: 32 })
+  assert.equal(messages.length, 2)
+  assert.equal(messages[1].content, turns[3].content)
+  assert.ok(messages[0].content.startsWith('q') && messages[0].content.endsWith('…'))
+  assert.deepEqual(dropped, turns.slice(0, 2))
+  assert.deepEqual(
+    { verbatimTurns: usage.verbatimTurns, truncatedTurns: usage.truncatedTurns, droppedTurns: usage.droppedTurns },
+    { verbatimTurns: 1, truncatedTurns: 1, droppedTurns: 2 }
+  )
+})
+
+test('the summary takes at most its share of the budget', () => {
+  const { messages, usage } = buildContextWindow([turn('user', 10)], { budget: 100, summary: 'x'.repeat(1000) })
+  assert.equal(messages[0].role, 'system')
+  assert.ok(usage.summaryTokens <= 26)
+  assert.ok(usage.contextTokens <= 100)
+})
+
+test('summarizeTurns keeps one bullet per user turn, newest first to survive', () => {
+  const summary = summarizeTurns('- earlier request', [
+    { role: 'user', content: 'Build a todo app. Use React.' },
+    { role: 'assistant', content: 'Sure.' }
+  ])
+  assert.equal(summary, '- earlier request\n- Build a todo app.')
+  const trimmed = summarizeTurns(summary, [{ role: 'user', content: 'z'.repeat(400) }], { maxTokens: 30 })
+  assert.ok(estimateTokens(trimmed) <= 30 || trimmed.split('\n').length === 1)
+  assert.ok(trimmed.endsWith('…'))
+})
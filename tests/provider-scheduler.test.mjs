@@ -0,0 +1,112 @@
+import assert from 'node:assert/strict'
+import { test } from 'node:test'
+import { CircuitBreaker } from '../lib/circuit-breaker.js'
+import { ConcurrencyLimiter } from '../lib/admission.js'
+import { LatencyTracker, scheduleProviders } from '../lib/provider-scheduler.js'
+
+function provider(name, options = {}) {
+  return { name, breaker: new CircuitBreaker(name, { minRequests: 1 }), latency: new LatencyTracker(), ...options }
+}
+
+// Resolves with `value` after `ms`, or rejects as soon as `signal` aborts
+function answerAfter(ms, value, signal) {
+  return new Promise((resolve, reject) => {
+    const timer = setTimeout(() => resolve(value), ms)
+    signal.addEventListener('abort', () => {
+      clearTimeout(timer)
+      reject(signal.reason || new Error('aborted'))
+    })
+  })
+}
+
+test('sequential mode only moves on after a failure', async (t) => {
+  t.mock.method(console, 'log', () => {})
+  const started = []
+  const result = await scheduleProviders([provider('a'), provider('b')], (p, signal) => {
+    started.push(p.name)
+    return p.name === 'a' ? Promise.reject(new Error('down')) : answerAfter(1, 'from b', signal)
+  })
+  assert.deepEqual(started, ['a', 'b'])
+  assert.equal(result.provider.name, 'b')
+  assert.equal(result.value, 'from b')
+})
+
+test('hedged mode starts the next provider after the hedge delay and aborts the loser', async () => {
+  const startedAt = {}
+  let slowSignal
+  const begin = Date.now()
+  const result = await scheduleProviders([provider('slow'), provider('fast')], (p, signal) => {
+    startedAt[p.name] = Date.now() - begin
+    if (p.name === 'slow') {
+      slowSignal = signal
+      return answerAfter(1000, 'from slow', signal)
+    }
+    return answerAfter(5, 'from fast', signal)
+  }, { mode: 'hedged', hedgeDelay: () => 30 })
+
+  assert.equal(result.provider.name, 'fast')
+  assert.ok(startedAt.fast >= 25, `hedge fired after ${startedAt.fast}ms`)
+  assert.equal(slowSignal.aborted, true)
+})
+
+test('hedged mode does not hedge when the first provider answers in time', async () => {
+  const started = []
+  const result = await scheduleProviders([provider('a'), provider('b')], (p, signal) => {
+    started.push(p.name)
+    return answerAfter(1, p.name, signal)
+  }, { mode: 'hedged', hedgeDelay: () => 50 })
+  await new Promise(resolve => setTimeout(resolve, 70))
+  assert.equal(result.value, 'a')
+  assert.deepEqual(started, ['a'])
+})
+
+test('an aborted loser does not count against its breaker', async () => {
+  const slow = provider('slow')
+  await scheduleProviders([slow, provider('fast')], (p, signal) => {
+    return answerAfter(p.name === 'slow' ? 1000 : 1, p.name, signal)
+  }, { mode: 'race' })
+  await new Promise(resolve => setImmediate(resolve))
+  assert.equal(slow.breaker.state, 'closed')
+  assert.equal(slow.breaker.outcomes.length, 0)
+})
+
+test('skips providers with an open breaker or no free concurrency', async () => {
+  const open = provider('open')
+  open.breaker.recordFailure()
+  const busy = provider('busy', { limiter: new ConcurrencyLimiter(0) })
+  const started = []
+  const result = await scheduleProviders([open, busy, provider('ok')], (p, signal) => {
+    started.push(p.name)
+    return answerAfter(1, p.name, signal)
+  })
+  assert.deepEqual(started, ['ok'])
+  assert.equal(result.value, 'ok')
+})
+
+test('rejects with every error when all providers fail', async (t) => {
+  t.mock.method(console, 'log', () => {})
+  await assert.rejects(
+    scheduleProviders([provider('a'), provider('b')], p => Promise.reject(new Error(`${p.name} down`))),
+    error => {
+      assert.ok(error instanceof AggregateError)
+      assert.deepEqual(error.errors.map(e => e.message), ['a down', 'b down'])
+      return true
+    }
+  )
+})
+
+test('times out a provider that does not answer', async (t) => {
+  t.mock.method(console, 'log', () => {})
+  await assert.rejects(
+    scheduleProviders([provider('stuck')], (p, signal) => answerAfter(1000, 'late', signal), { timeoutMs: 20 }),
+    error => error.errors[0].name === 'ProviderTimeoutError'
+  )
+})
+
+test('LatencyTracker reports percentiles over its window', () => {
+  const latency = new LatencyTracker(4)
+  assert.equal(latency.percentile(95), null)
+  for (const ms of [100, 10, 20, 30, 40]) latency.record(ms)
+  assert.equal(latency.percentile(50), 20)
+  assert.equal(latency.percentile(95), 40)
+})
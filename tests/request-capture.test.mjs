@@ -0,0 +1,86 @@
+import assert from 'node:assert/strict'
+import { createHash } from 'node:crypto'
+import { test } from 'node:test'
+import { RequestCapture, captureRecord, createRequestCapture } from '../lib/request-capture.js'
+
+const SALT = 'test-salt'
+
+function hash(value) {
+  return createHash('sha256').update(SALT).update(value).digest('hex').slice(0, 16)
+}
+
+function record(route, body, extra = {}) {
+  return captureRecord({
+    arrivedAt: 1000, route, method: 'POST', status: 200, durationMs: 12.345,
+    bodyText: body === undefined ? '' : JSON.stringify(body), salt: SALT, ...extra
+  })
+}
+
+test('records the shape of a generation request, never its text', () => {
+  const body = { message: 'Crie um contador', projectType: 'frontend', conversationId: 'abc', conversationHistory: [{}, {}] }
+  const captured = record('/generate', body)
+  assert.deepEqual(captured, {
+    t: 1000, route: '/generate', method: 'POST', status: 200, durationMs: 12.3,
+    bodyBytes: Buffer.byteLength(JSON.stringify(body)),
+    projectType: 'frontend', messageChars: 16, messageHash: hash('Crie um contador'),
+    historyLength: 2, sessionKey: hash('abc')
+  })
+  assert.ok(!JSON.stringify(captured).includes('contador'))
+})
+
+test('hashes are salted and stable for the same salt', () => {
+  const first = record('/generate', { message: 'same' })
+  const second = record('/generate', { message: 'same' })
+  const otherSalt = captureRecord({ route: '/generate', durationMs: 0, bodyText: '{"message":"same"}', salt: 'other' })
+  assert.equal(first.messageHash, second.messageHash)
+  assert.notEqual(first.messageHash, otherSalt.messageHash)
+  assert.match(first.messageHash, /^[0-9a-f]{16}$/)
+})
+
+test('free-form values are mapped, not copied', () => {
+  const captured = record('/generate/stream', { projectType: 'DROP TABLE', templateId: 'secret-id', newSession: true })
+  assert.equal(captured.projectType, 'other')
+  assert.equal(captured.unknownTemplate, true)
+  assert.equal(captured.templateId, undefined)
+  assert.equal(captured.newSession, true)
+  assert.equal(record('/generate', { templateId: 'todo-app' }).templateId, 'todo-app')
+})
+
+test('records cache options as the route reads them', () => {
+  const captured = record('/generate', { cache: { noStore: true, maxAge: '30', ttl: 'soon', extra: 1 } })
+  assert.deepEqual(captured.cache, { noStore: true, maxAge: 30 })
+})
+
+test('batch items and concurrency are recorded with bounds', () => {
+  const captured = record('/generate/batch', { items: [{ message: 'a' }, 'junk'], concurrency: 10 ** 9 })
+  assert.deepEqual(captured.batchItems, [{ messageChars: 1, messageHash: hash('a') }, {}])
+  assert.equal(captured.concurrency, 64)
+  assert.equal(record('/generate/batch', { items: [], concurrency: 2.5 }).concurrency, undefined)
+})
+
+test('conversation queries keep only known views and bounded limits', () => {
+  const query = params => captureRecord({ route: '/conversations', durationMs: 0, searchParams: new URLSearchParams(params), salt: SALT }).query
+  assert.deepEqual(query('view=summary&limit=20&before=x'), { view: 'summary', limit: 20, paged: true })
+  assert.deepEqual(query('view=<script>&limit=99999'), { view: 'other', limit: 1000 })
+  assert.equal(query('limit=-1'), undefined)
+})
+
+test('invalid bodies are flagged', () => {
+  const captured = captureRecord({ route: '/generate', durationMs: 0, bodyText: '{not json', salt: SALT })
+  assert.equal(captured.invalidBody, true)
+  assert.equal(captured.bodyBytes, 9)
+})
+
+test('record() drops instead of waiting when the buffer is full', () => {
+  const capture = new RequestCapture('/dev/null', { salt: SALT, maxBuffered: 1, flushIntervalMs: 60000 })
+  capture.record({ route: '/templates', method: 'GET', durationMs: 1 })
+  capture.record({ route: '/templates', method: 'GET', durationMs: 1 })
+  assert.equal(capture.snapshot().buffered, 1)
+  assert.equal(capture.snapshot().dropped, 1)
+  clearTimeout(capture.timer)
+})
+
+test('capture is off unless REQUEST_CAPTURE_PATH is set', () => {
+  assert.equal(createRequestCapture({}), null)
+  assert.equal(createRequestCapture({ REQUEST_CAPTURE_PATH: '/tmp/x', REQUEST_CAPTURE_SALT: 's' }).salt, 's')
+})
@@ -0,0 +1,180 @@
+import io
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+import requests
+
+from api_client import APIError, CodeGeneratorClient, RetryPolicy, SSEParser, parse_retry_after, parse_sse
+
+
+def canned_response(status, body=b'', headers=None, encoding='utf-8'):
+    response = requests.models.Response()
+    response.status_code = status
+    response.raw = io.BytesIO(body)
+    response.headers.update(headers or {})
+    response.encoding = encoding
+    return response
+
+
+class CannedSession(requests.Session):
+    """Session that answers from a list of canned responses instead of the network"""
+
+    def __init__(self, responses):
+        super().__init__()
+        self.responses = list(responses)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+# --- Retry-After -------------------------------------------------------------
+
+@pytest.mark.parametrize('value, expected', [
+    ('5', 5.0),
+    ('0.5', 0.5),
+    ('-3', 0.0),
+    ('', None),
+    (None, None),
+    ('soon', None),
+])
+def test_parse_retry_after_seconds(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    future = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 28 <= parse_retry_after(future) <= 30
+    past = format_datetime(datetime.now(timezone.utc) - timedelta(seconds=30), usegmt=True)
+    assert parse_retry_after(past) == 0.0
+
+
+# --- RetryPolicy ----------------------------------------------------------------
+
+def test_retry_statuses_and_attempt_limit():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.should_retry_status(0, 429)
+    assert policy.should_retry_status(1, 503)
+    assert not policy.should_retry_status(2, 503)
+    assert not policy.should_retry_status(0, 500)
+
+
+def test_connection_errors_retry_only_idempotent_methods():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.should_retry_error(0, 'get')
+    assert not policy.should_retry_error(0, 'POST')
+    assert not policy.should_retry_error(2, 'GET')
+
+
+def test_backoff_is_full_jitter_up_to_the_cap():
+    policy = RetryPolicy(backoff_s=0.5, max_backoff_s=3.0)
+    for attempt, ceiling in [(0, 0.5), (1, 1.0), (2, 2.0), (5, 3.0)]:
+        delays = [policy.delay(attempt) for _ in range(200)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        assert max(delays) > ceiling / 2
+        assert len(set(delays)) > 1
+
+
+def test_retry_after_wins_with_up_to_20_percent_jitter():
+    policy = RetryPolicy(max_retry_after_s=60.0)
+    delays = [policy.delay(0, retry_after=10) for _ in range(200)]
+    assert all(10 <= delay <= 12 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_retry_after_is_capped():
+    policy = RetryPolicy(max_retry_after_s=5.0)
+    assert 5 <= policy.delay(0, retry_after=3600) <= 6
+
+
+def test_zero_retry_after_still_jitters_by_the_backoff():
+    policy = RetryPolicy(backoff_s=0.5)
+    assert all(0 <= policy.delay(0, retry_after=0) <= 0.5 for _ in range(50))
+
+
+def test_client_waits_for_retry_after_then_returns_the_success(monkeypatch):
+    waits = []
+    monkeypatch.setattr('api_client.time.sleep', waits.append)
+    session = CannedSession([
+        canned_response(429, b'{"error": "busy"}', {'Retry-After': '2'}),
+        canned_response(503, b'{"error": "busy"}'),
+        canned_response(200, b'{"ok": true}'),
+    ])
+    client = CodeGeneratorClient('http://api.test/api', session=session, retry=RetryPolicy(max_attempts=4))
+    response = client.get('/')
+    assert response.status_code == 200
+    assert len(session.calls) == 3
+    assert 2 <= waits[0] <= 2.4
+    assert 0 <= waits[1] <= 1.0
+    assert client.stats == {'requests': 3, 'retries': 2}
+
+
+def test_client_raises_with_retry_after_once_attempts_run_out(monkeypatch):
+    monkeypatch.setattr('api_client.time.sleep', lambda _: None)
+    session = CannedSession([canned_response(429, b'{"error": "queue full"}', {'Retry-After': '7'}) for _ in range(2)])
+    client = CodeGeneratorClient('http://api.test/api', session=session, retry=RetryPolicy(max_attempts=2))
+    with pytest.raises(APIError) as error:
+        client.health()
+    assert error.value.status == 429
+    assert error.value.message == 'queue full'
+    assert error.value.retry_after == 7.0
+
+
+def test_client_does_not_retry_a_post_after_a_connection_error(monkeypatch):
+    monkeypatch.setattr('api_client.time.sleep', lambda _: None)
+    session = CannedSession([requests.ConnectionError('reset'), canned_response(200, b'{}')])
+    client = CodeGeneratorClient('http://api.test/api', session=session)
+    with pytest.raises(requests.ConnectionError):
+        client.post('/generate', json={})
+    assert len(session.calls) == 1
+
+
+# --- SSE framing -----------------------------------------------------------------
+
+def test_sse_parser_frames_events_on_blank_lines():
+    parser = SSEParser()
+    assert parser.feed('event: model') is None
+    assert parser.feed('data: {"model": "gpt"}') is None
+    assert parser.feed('') == ('model', '{"model": "gpt"}')
+    # The event name resets after each event
+    assert parser.feed('data: 1') is None
+    assert parser.feed('') == ('message', '1')
+
+
+def test_sse_joins_multiline_data_and_skips_comments():
+    lines = [': keep-alive', 'event: code', 'data: line 1', 'data:line 2', '', '', 'event: ignored', '']
+    assert list(parse_sse(lines)) == [('code', 'line 1\nline 2')]
+
+
+def test_sse_flushes_an_unterminated_last_event():
+    assert list(parse_sse(['event: done', 'data: {}'])) == [('done', '{}')]
+
+
+# Framed the way the stream route writes events, split at every byte offset
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64])
+def test_sse_over_a_chunked_byte_stream(chunk_size):
+    body = (
+        'event: model\ndata: {"model": "gemini"}\n\n'
+        ': ping\n\n'
+        'event: code\ndata: {"text": "const ação = 1"}\n\n'
+        'event: done\ndata: {"success": true}\n\n'
+    ).encode('utf-8')
+    response = canned_response(200, body)
+    events = list(parse_sse(response.iter_lines(chunk_size=chunk_size, decode_unicode=True)))
+    assert events == [
+        ('model', '{"model": "gemini"}'),
+        ('code', '{"text": "const ação = 1"}'),
+        ('done', '{"success": true}'),
+    ]
+
+
+def test_generate_stream_decodes_event_data(monkeypatch):
+    body = b'event: explanation\ndata: {"text": "Ok"}\n\nevent: done\ndata: {"success": true}\n\n'
+    session = CannedSession([canned_response(200, body)])
+    client = CodeGeneratorClient('http://api.test/api', session=session)
+    assert list(client.generate_stream('hi')) == [('explanation', {'text': 'Ok'}), ('done', {'success': True})]
@@ -0,0 +1,37 @@
+import pytest
+
+from env_config import env_value, parse_env_line
+
+
+@pytest.mark.parametrize('line, expected', [
+    ('MONGO_URL=mongodb://localhost:27017', ('MONGO_URL', 'mongodb://localhost:27017')),
+    ('DB_NAME="app"\n', ('DB_NAME', 'app')),
+    ("DB_NAME='app'", ('DB_NAME', 'app')),
+    ('export KEY = value ', ('KEY', 'value')),
+    ('URL=https://x.test/?a=1&b=2', ('URL', 'https://x.test/?a=1&b=2')),
+    ('QUOTE="unbalanced', ('QUOTE', '"unbalanced')),
+    ('EMPTY=', ('EMPTY', '')),
+    ('# COMMENT=1', None),
+    ('', None),
+    ('no separator', None),
+])
+def test_parse_env_line(line, expected):
+    assert parse_env_line(line) == expected
+
+
+def test_environment_wins_over_the_file(tmp_path, monkeypatch):
+    path = tmp_path / '.env'
+    path.write_text('DB_NAME="from_file"\n')
+    monkeypatch.setenv('DB_NAME', 'from_env')
+    assert env_value('DB_NAME', path=str(path)) == 'from_env'
+    monkeypatch.delenv('DB_NAME')
+    assert env_value('DB_NAME', path=str(path)) == 'from_file'
+
+
+def test_missing_or_empty_values_fall_back_to_the_default(tmp_path, monkeypatch):
+    path = tmp_path / '.env'
+    path.write_text('# DAYS=5\nRETENTION_PREVIEWS_DAYS=\n')
+    for key in ('DAYS', 'RETENTION_PREVIEWS_DAYS'):
+        monkeypatch.delenv(key, raising=False)
+        assert env_value(key, 0, path=str(path)) == 0
+    assert env_value('DAYS', 'x', path=str(tmp_path / 'missing.env')) == 'x'
@@ -0,0 +1,75 @@
+import assert from 'node:assert/strict'
+import { test } from 'node:test'
+import { WriteBehindQueue } from '../lib/write-behind.js'
+
+test('flushes a full batch immediately', async () => {
+  const batches = []
+  const queue = new WriteBehindQueue('test', { flush: async batch => batches.push(batch), maxBatch: 2, flushIntervalMs: 1000 })
+  await queue.enqueue('a')
+  await queue.enqueue('b')
+  await queue.flushing
+  assert.deepEqual(batches, [['a', 'b']])
+  assert.equal(queue.snapshot().flushed, 2)
+})
+
+test('keeps documents readable until their flush completes', async () => {
+  let finish
+  const queue = new WriteBehindQueue('test', { flush: () => new Promise(resolve => { finish = resolve }), flushIntervalMs: 1000 })
+  await queue.enqueue({ id: 1 })
+  const flushing = queue.runFlush()
+  assert.deepEqual(queue.find(doc => doc.id === 1), { id: 1 })
+  assert.equal(queue.pending().length, 1)
+  finish()
+  await flushing
+  assert.equal(queue.pending().length, 0)
+})
+
+test('retries a failed batch before succeeding', async (t) => {
+  t.mock.method(console, 'error', () => {})
+  let calls = 0
+  const queue = new WriteBehindQueue('test', {
+    flush: async () => { if (++calls === 1) throw new Error('down') },
+    onDrop: () => assert.fail('batch should not be dropped')
+  })
+  await queue.enqueue('x')
+  await queue.drain()
+  assert.equal(calls, 2)
+  assert.equal(queue.snapshot().flushed, 1)
+})
+
+test('calls onDrop with the batch once retries are exhausted', async (t) => {
+  t.mock.method(console, 'error', () => {})
+  const dropped = []
+  const queue = new WriteBehindQueue('test', {
+    flush: async () => { throw new Error('down') },
+    onDrop: batch => dropped.push(batch),
+    maxRetries: 1
+  })
+  await queue.enqueue('x')
+  await queue.enqueue('y')
+  await queue.drain()
+  assert.deepEqual(dropped, [['x', 'y']])
+  assert.equal(queue.snapshot().dropped, 2)
+  assert.equal(queue.pending().length, 0)
+})
+
+test('a full buffer makes enqueue wait for a flush instead of dropping', async () => {
+  let finish
+  const queue = new WriteBehindQueue('test', {
+    flush: () => new Promise(resolve => { finish = resolve }),
+    maxBatch: 10,
+    maxBuffered: 1,
+    flushIntervalMs: 1000
+  })
+  await queue.enqueue('a')
+  let admitted = false
+  const waiting = queue.enqueue('b').then(() => { admitted = true })
+  await new Promise(resolve => setImmediate(resolve))
+  assert.equal(admitted, false)
+  assert.equal(queue.snapshot().backpressureWaits, 1)
+  finish()
+  await waiting
+  assert.deepEqual(queue.pending(), ['b'])
+  assert.equal(queue.snapshot().dropped, 0)
+  clearTimeout(queue.timer)
+})